@@ -0,0 +1,170 @@
+import serializacion
+from datetime import datetime
+
+
+NIVELES_RIESGO = ('bajo', 'medio', 'alto', 'critico')
+
+
+def _sumar_conteos(destino, origen):
+    for clave, valor in origen.items():
+        destino[clave] = destino.get(clave, 0) + valor
+
+
+def _contar(destino, clave, signo):
+    destino[clave] = destino.get(clave, 0) + signo
+    if destino[clave] <= 0:
+        del destino[clave]
+
+
+class AggregateStats:
+    """Estadísticas acumuladas de todo el corpus, actualizables de a una medida y combinables entre corridas"""
+
+    VERSION = 1
+
+    def __init__(self):
+        self.claves = set()
+        self.total_medidas = 0
+        self.con_pdf = 0
+        self.con_considerandos = 0
+        self.analisis_reducido = 0
+        self.niveles_riesgo = {n: 0 for n in NIVELES_RIESGO}
+        self.categorias_emergentes = {}
+        self.organismos = {}
+        self.por_dia = {}
+        self.actualizado = None
+
+    @staticmethod
+    def clave(analisis):
+        return f"{analisis.get('numero_medida')}_{analisis.get('fecha_boletin')}"
+
+    @staticmethod
+    def _dia_vacio():
+        return {'total': 0, 'con_pdf': 0, 'con_considerandos': 0, 'niveles_riesgo': {}, 'categorias_emergentes': {}}
+
+    def agregar_analisis(self, analisis):
+        """Suma un análisis al agregado. Idempotente: una medida ya contada no se vuelve a contar."""
+        clave = self.clave(analisis)
+        if clave in self.claves:
+            return False
+        self.claves.add(clave)
+        self._aplicar(analisis, 1)
+        return True
+
+    def quitar_analisis(self, analisis):
+        """Resta un análisis ya contado (p. ej. el anterior de una medida re-analizada). False si no estaba."""
+        clave = self.clave(analisis)
+        if clave not in self.claves:
+            return False
+        self.claves.discard(clave)
+        self._aplicar(analisis, -1)
+        return True
+
+    def _aplicar(self, analisis, signo):
+        literal = analisis.get('analisis_literal', {})
+        fecha = analisis.get('fecha_boletin') or 'sin_fecha'
+        dia = self.por_dia.setdefault(fecha, self._dia_vacio())
+        self.total_medidas += signo
+        dia['total'] += signo
+
+        if literal.get('tiene_pdfs'):
+            self.con_pdf += signo
+            dia['con_pdf'] += signo
+        if literal.get('estadisticas_texto', {}).get('tiene_considerandos'):
+            self.con_considerandos += signo
+            dia['con_considerandos'] += signo
+
+        elementos_ia = literal.get('elementos_detectados_ia', {})
+        for entidad in set(elementos_ia.get('entidades_mencionadas', []) or []):
+            _contar(self.organismos, entidad, signo)
+
+        categoria = analisis.get('analisis_semantico', {}).get('categoria_emergente', 'sin_clasificar')
+        _contar(self.categorias_emergentes, categoria, signo)
+        _contar(dia['categorias_emergentes'], categoria, signo)
+
+        diablo = analisis.get('analisis_abogado_diablo', {})
+        if diablo.get('omitido_por_triage'):
+            self.analisis_reducido += signo
+        else:
+            riesgo = diablo.get('nivel_riesgo_democratico', 'bajo')
+            if riesgo in self.niveles_riesgo:
+                self.niveles_riesgo[riesgo] += signo
+                _contar(dia['niveles_riesgo'], riesgo, signo)
+
+        if dia['total'] <= 0:
+            del self.por_dia[fecha]
+        self.actualizado = datetime.now().isoformat()
+
+    def merge(self, otro):
+        """Combina otro agregado (p. ej. de un worker o de una corrida paralela) sin duplicar medidas"""
+        if self.claves & otro.claves:
+            raise ValueError("Los agregados comparten medidas; no se pueden combinar sin contar doble")
+        self.claves |= otro.claves
+        self.total_medidas += otro.total_medidas
+        self.con_pdf += otro.con_pdf
+        self.con_considerandos += otro.con_considerandos
+        self.analisis_reducido += otro.analisis_reducido
+        _sumar_conteos(self.niveles_riesgo, otro.niveles_riesgo)
+        _sumar_conteos(self.categorias_emergentes, otro.categorias_emergentes)
+        _sumar_conteos(self.organismos, otro.organismos)
+        for fecha, dia_otro in otro.por_dia.items():
+            dia = self.por_dia.setdefault(fecha, self._dia_vacio())
+            for campo in ('total', 'con_pdf', 'con_considerandos'):
+                dia[campo] += dia_otro[campo]
+            _sumar_conteos(dia['niveles_riesgo'], dia_otro['niveles_riesgo'])
+            _sumar_conteos(dia['categorias_emergentes'], dia_otro['categorias_emergentes'])
+        self.actualizado = max(filter(None, [self.actualizado, otro.actualizado]), default=None)
+        return self
+
+    def resumen(self, top_organismos=50):
+        """Vista compacta para el summary batch y /api/stats"""
+        organismos = sorted(self.organismos.items(), key=lambda x: x[1], reverse=True)
+        return {
+            'total_medidas_analizadas': self.total_medidas,
+            'medidas_con_pdfs': self.con_pdf,
+            'medidas_con_considerandos': self.con_considerandos,
+            'medidas_analisis_reducido': self.analisis_reducido,
+            'niveles_riesgo': self.niveles_riesgo,
+            'temas_emergentes': self.categorias_emergentes,
+            'total_organismos_detectados': len(self.organismos),
+            'organismos_mas_mencionados': dict(organismos[:top_organismos]),
+            'dias_cubiertos': len(self.por_dia),
+            'primer_dia': min(self.por_dia) if self.por_dia else None,
+            'ultimo_dia': max(self.por_dia) if self.por_dia else None,
+            'actualizado': self.actualizado
+        }
+
+    # --- Persistencia ---
+
+    def to_dict(self):
+        return {
+            'version': self.VERSION,
+            'claves': sorted(self.claves),
+            'total_medidas': self.total_medidas,
+            'con_pdf': self.con_pdf,
+            'con_considerandos': self.con_considerandos,
+            'analisis_reducido': self.analisis_reducido,
+            'niveles_riesgo': self.niveles_riesgo,
+            'categorias_emergentes': self.categorias_emergentes,
+            'organismos': self.organismos,
+            'por_dia': self.por_dia,
+            'actualizado': self.actualizado
+        }
+
+    @classmethod
+    def from_dict(cls, datos):
+        agregado = cls()
+        agregado.claves = set(datos.get('claves', []))
+        for campo in ('total_medidas', 'con_pdf', 'con_considerandos', 'analisis_reducido', 'actualizado'):
+            setattr(agregado, campo, datos.get(campo, getattr(agregado, campo)))
+        _sumar_conteos(agregado.niveles_riesgo, datos.get('niveles_riesgo', {}))
+        agregado.categorias_emergentes = datos.get('categorias_emergentes', {})
+        agregado.organismos = datos.get('organismos', {})
+        agregado.por_dia = datos.get('por_dia', {})
+        return agregado
+
+    def guardar(self, path):
+        serializacion.guardar(self.to_dict(), path)
+
+    @classmethod
+    def cargar(cls, path):
+        return cls.from_dict(serializacion.cargar(path))
@@ -1,5 +1,4 @@
 import ftplib
-import json
 import pandas as pd
 from collections import defaultdict
 from datetime import datetime
@@ -8,6 +7,8 @@ from bs4 import BeautifulSoup
 import re
 import os
 import sys
+from lectura_parcial import CAMPOS_METADATOS, leer_campos_ftp
+import serializacion
 
 FTP_HOST = 'ftp.agoraenlared.com'
 FTP_USER = 'u112219758.boria'
@@ -53,6 +54,16 @@ def main():
     total = len(archivos)
     log(f"Total: {total}")
     
+    # Las medidas nuevas traen sidecar de metadatos (data/raw_meta); las viejas se leen en streaming
+    # cortando apenas aparecen los campos del censo, sin cargar el HTML en memoria
+    try:
+        ftp.cwd('../raw_meta')
+        con_sidecar = set(ftp.nlst())
+        ftp.cwd('../raw')
+    except ftplib.error_perm:
+        con_sidecar = set()
+    log(f"Con sidecar de metadatos: {len(con_sidecar)}")
+    
     tipos = defaultdict(int)
     con_pdf = defaultdict(int)
     ejemplos = defaultdict(list)
@@ -69,13 +80,12 @@ def main():
             log("Reconectado")
         
         try:
-            with open('temp.json', 'wb') as f:
-                ftp.retrbinary(f'RETR {archivo}', f.write)
-            
-            with open('temp.json', 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            if archivo in con_sidecar:
+                data = leer_campos_ftp(ftp, f'../raw_meta/{archivo}')
+            else:
+                data = leer_campos_ftp(ftp, archivo, CAMPOS_METADATOS)
             
-            tipo = extraer_tipo_desde_h2(data.get('contenido_html_completo', {}).get('titulo', ''))
+            tipo = extraer_tipo_desde_h2(data.get('contenido_html_completo.titulo', ''))
             tipos[tipo] += 1
             if data.get('tiene_pdf', False):
                 con_pdf[tipo] += 1
@@ -84,7 +94,7 @@ def main():
                 ejemplos[tipo].append({
                     'numero': data.get('numero_medida'),
                     'fecha': data.get('fecha_boletin'),
-                    'titulo': data.get('titulo_raw', '')[:80]
+                    'titulo': (data.get('titulo_raw') or '')[:80]
                 })
         except Exception as e:
             errores += 1
@@ -93,7 +103,7 @@ def main():
             if errores > 100:
                 log("FATAL: Demasiados errores")
                 ftp.quit()
-                return
+                return {'archivos': total, 'errores': errores, 'abortado': True}
         
         if idx % 1000 == 0:
             elapsed = time.time() - start
@@ -109,14 +119,15 @@ def main():
     df.to_csv('tipos_desde_h2.csv', index=False, encoding='utf-8')
     log("CSV generado")
     
-    with open('ejemplos_h2_completos.json', 'w', encoding='utf-8') as f:
-        json.dump(ejemplos, f, ensure_ascii=False, indent=2)
+    # Salida para leer a mano: indentada
+    serializacion.guardar(ejemplos, 'ejemplos_h2_completos.json', pretty=True)
     log("JSON generado")
     
     log("Subiendo a Hostinger...")
     ftp.quit()
     ftp = conectar_ftp()
     
+    # Reportes para leer a mano: se suben planos, sin comprimir
     with open('tipos_desde_h2.csv', 'rb') as f:
         ftp.storbinary('STOR tipos_desde_h2.csv', f)
     log("CSV subido")
@@ -126,11 +137,11 @@ def main():
     log("JSON subido")
     
     ftp.quit()
-    os.remove('temp.json')
     
     log("="*70)
     log("FINALIZADO")
     log("="*70)
+    return {'archivos': total, 'errores': errores}
 
 if __name__ == "__main__":
     main()
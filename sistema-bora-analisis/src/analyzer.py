@@ -3,63 +3,209 @@ load_dotenv()
 import os
 import json
 import re
-import google.generativeai as genai
-from sentence_transformers import SentenceTransformer
+import time
+import threading
 from pathlib import Path
 from datetime import datetime
 import tempfile
+import io
 import ftplib
+from gemini_limiter import obtener_limitador, GeminiReintentosAgotados
+from near_duplicates import NearDuplicateIndex, diff_textos, elementos_presentes
+from triage import TriageModel
+from encoder_backends import crear_encoder
+from aggregate_stats import AggregateStats
+from checkpoints import StageCheckpoint
+from manifest import WorkManifest
+from indice_busqueda import IndiceBusqueda
+from indice_entidades import IndiceEntidades
+from grafo_citas import GrafoCitas
+from rollups import RollupsTemporales
+from patrones import MotorPatrones
+from novedades import FeedNovedades
+from respuestas_json import ParserRespuestas
+from lectura_parcial import leer_campos, CAMPOS_PESADOS
+from metrics import registry, medir_etapa, sumar_bytes, sumar_tokens
+from profiling import MedidaProfiler, perfilado_activo
+from compresion import Descompresor, leer_para_subir
+import serializacion
+
+class EstadoNoDisponible(RuntimeError):
+    """Un estado derivado existe en Hostinger pero no se pudo descargar o leer"""
+
 
 class TripleAnalyzerAgnostic:
-    def __init__(self):
-        # Configurar Gemini
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
+    MODELO_GEMINI = 'gemini-2.0-flash'
+    MODELO_ENCODER = 'paraphrase-multilingual-MiniLM-L12-v2'
+    ETAPAS_GEMINI = ('literal', 'critico', 'abogado_diablo', 'semantico')
+
+    def __init__(self, preload=None, encoder_backend=None):
+        self.encoder_backend = encoder_backend or os.getenv('BORA_ENCODER_BACKEND', 'pytorch')
+        self.limitador = obtener_limitador()
+        self._model = None
+        self._encoder = None
+        self._carga_lock = threading.Lock()
+        self.tiempos_carga = {}
+        self.checkpoints = StageCheckpoint()
+        self.respuestas_json = ParserRespuestas()
+
+        if not os.getenv('GEMINI_API_KEY'):
             print("ERROR: GEMINI_API_KEY no encontrada en variables de entorno")
-            return
-        
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
         
-        # Configurar encoder para embeddings
+        # El cliente de Gemini y el encoder se cargan recién en el primer uso (arranque en frío rápido)
+        if (preload if preload is not None else os.getenv('BORA_PRELOAD') == '1'):
+            self.preload()
+
+    @property
+    def model(self):
+        """Cliente Gemini, configurado en el primer uso"""
+        if self._model is None:
+            with self._carga_lock:
+                if self._model is None:
+                    api_key = os.getenv('GEMINI_API_KEY')
+                    if not api_key:
+                        raise RuntimeError("GEMINI_API_KEY no encontrada en variables de entorno")
+                    inicio = time.perf_counter()
+                    import google.generativeai as genai
+                    genai.configure(api_key=api_key)
+                    self._model = genai.GenerativeModel(self.MODELO_GEMINI)
+                    self.tiempos_carga['gemini'] = round(time.perf_counter() - inicio, 3)
+                    print(f"✓ Cliente Gemini configurado en {self.tiempos_carga['gemini']}s")
+        return self._model
+
+    @property
+    def encoder(self):
+        """Encoder de embeddings (backend pytorch u onnx según config), cargado en el primer uso"""
+        if self._encoder is None:
+            with self._carga_lock:
+                if self._encoder is None:
+                    inicio = time.perf_counter()
+                    self._encoder = crear_encoder(self.encoder_backend, self.MODELO_ENCODER)
+                    self.tiempos_carga['encoder'] = round(time.perf_counter() - inicio, 3)
+                    print(f"✓ Encoder '{self.MODELO_ENCODER}' ({self.encoder_backend}) cargado en {self.tiempos_carga['encoder']}s")
+        return self._encoder
+
+    def preload(self):
+        """Carga anticipada (warm-up) del cliente Gemini y del encoder"""
+        try:
+            self.model
+        except Exception as e:
+            print(f"Error configurando Gemini: {e}")
         try:
-            self.encoder = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-            print("✓ Analyzer agnóstico inicializado correctamente")
+            # Un encode corto deja el modelo listo (pesos en memoria, kernels inicializados)
+            self.encoder.encode("precarga")
         except Exception as e:
             print(f"Error inicializando encoder: {e}")
-    def _extract_json_from_response(self, response):
-        """Extrae JSON de bloques markdown de Gemini"""
-        import re
-        text = response.text.strip()
-        # Buscar JSON dentro de ```json ... ```
-        match = re.search(r'```json\s*(\{.*?\})\s*```', text, re.DOTALL)
-        if match:
-            return json.loads(match.group(1))
+        print(f"✓ Analyzer agnóstico precargado: {self.tiempos_carga}")
+        return self.tiempos_carga
+
+    def _generate(self, prompt, etapa, **kwargs):
+        """Llamada a Gemini pasando por el limitador compartido (RPM/TPM + reintentos), medida por etapa"""
+        with medir_etapa(f'gemini_{etapa}'):
+            response = self.limitador.generate_content(self.model, prompt, **kwargs)
+        uso = getattr(response, 'usage_metadata', None)
+        if uso is not None:
+            sumar_tokens(etapa, 'prompt', getattr(uso, 'prompt_token_count', 0) or 0)
+            sumar_tokens(etapa, 'respuesta', getattr(uso, 'candidates_token_count', 0) or 0)
+        return response
+
+    def _generate_json(self, prompt, etapa):
+        """Llamada en modo JSON con el esquema de la etapa; devuelve el dict validado (reparado o repreguntado)"""
+        config = self.respuestas_json.config(etapa)
+        return self.respuestas_json.obtener(
+            lambda texto: self._generate(texto, etapa, generation_config=config).text, prompt, etapa)
+
+    def analyze_medida(self, medida_data, modo='completo', embeddings=None):
+        """Análisis triple de una medida - ENFOQUE AGNÓSTICO
+
+        modo='reducido' (decidido por el triage) omite el análisis crítico y el abogado del diablo.
+        """
+        print(f"Analizando medida {medida_data['numero_medida']} con enfoque agnóstico ({modo})...")
+        
+        etapas_previas = [e for e in self.checkpoints.etapas_completas(medida_data) if e in self.ETAPAS_GEMINI]
+        if etapas_previas:
+            print(f"Retomando desde checkpoint (etapas ya completas: {', '.join(etapas_previas)})")
+        
+        analisis_literal = self.etapa_con_checkpoint(medida_data, 'literal', self.extract_literal_data_agnostic)
+        if modo == 'reducido':
+            omitido = {'omitido_por_triage': True}
+            analisis_critico = dict(omitido)
+            analisis_abogado_diablo = dict(omitido)
         else:
-            return json.loads(text)
-    def analyze_medida(self, medida_data):
-        """Análisis triple completo de una medida - ENFOQUE AGNÓSTICO"""
-        print(f"Analizando medida {medida_data['numero_medida']} con enfoque agnóstico...")
+            analisis_critico = self.etapa_con_checkpoint(medida_data, 'critico', self.analyze_critical_agnostic)
+            analisis_abogado_diablo = self.etapa_con_checkpoint(medida_data, 'abogado_diablo', self.devil_advocate_agnostic)
+        analisis_semantico = self.etapa_con_checkpoint(medida_data, 'semantico', self.semantic_analysis)
+        if embeddings is None:
+            embeddings = self.etapa_con_checkpoint(medida_data, 'embeddings', self.generate_embeddings_agnostic)
         
         resultado = {
             'numero_medida': medida_data['numero_medida'],
             'fecha_boletin': medida_data['fecha_boletin'],
             'fecha_analisis': datetime.now().isoformat(),
-            'analisis_literal': self.extract_literal_data_agnostic(medida_data),
-            'analisis_critico': self.analyze_critical_agnostic(medida_data),
-            'analisis_abogado_diablo': self.devil_advocate_agnostic(medida_data),
-            'analisis_semantico': self.semantic_analysis(medida_data),
-            'embeddings': self.generate_embeddings_agnostic(medida_data),
+            'analisis_literal': analisis_literal,
+            'analisis_critico': analisis_critico,
+            'analisis_abogado_diablo': analisis_abogado_diablo,
+            'analisis_semantico': analisis_semantico,
+            'embeddings': embeddings,
             'metadatos_analisis': {
                 'enfoque': 'agnostico_sin_presupuestos',
                 'version_analyzer': '2.0_agnostic',
-                'confianza_general': 'pendiente_validacion'
+                'confianza_general': 'pendiente_validacion',
+                'modo_analisis': modo
             }
         }
         
         return resultado
     
-    def extract_literal_data_agnostic(self, medida_data):
+    def etapa_con_checkpoint(self, medida_data, etapa, funcion):
+        """Ejecuta una etapa o la recupera del checkpoint local; sólo se guardan resultados sin error."""
+        previo = self.checkpoints.obtener(medida_data, etapa)
+        if previo is not None:
+            return previo
+        resultado = funcion(medida_data)
+        if not self._tiene_error(resultado):
+            self.checkpoints.guardar(medida_data, etapa, resultado)
+        return resultado
+
+    def _tiene_error(self, resultado):
+        if not isinstance(resultado, dict):
+            return False
+        if 'error' in resultado:
+            return True
+        # El análisis literal anida la detección IA: si falló, conviene reintentarla
+        return any(isinstance(v, dict) and 'error' in v for v in resultado.values())
+
+    def reuse_duplicate_analysis(self, medida_data, analisis_origen, duplicado_info):
+        """Reutiliza el análisis IA de una medida casi idéntica; sólo se recalcula lo local (sin Gemini)"""
+        print(f"Medida {medida_data['numero_medida']} casi idéntica a {duplicado_info['archivo_origen']} "
+              f"(similitud {duplicado_info['similitud']:.2f}), reutilizando análisis...")
+        # Sólo se heredan los elementos que aparecen en el texto de esta medida: en "mismo decreto, otro
+        # designado" el nombre del designado original no debe llegar al índice de entidades ni al grafo
+        elementos_ia, descartados = elementos_presentes(
+            analisis_origen['analisis_literal'].get('elementos_detectados_ia', {}),
+            medida_data.get('texto_completo_limpio', ''))
+        duplicado_info = dict(duplicado_info, elementos_ia_descartados=descartados)
+        analisis_critico = dict(analisis_origen['analisis_critico'])
+        analisis_critico['ratio_justificacion_accion'] = self.calculate_justification_ratio(medida_data)
+
+        return {
+            'numero_medida': medida_data['numero_medida'],
+            'fecha_boletin': medida_data['fecha_boletin'],
+            'fecha_analisis': datetime.now().isoformat(),
+            'analisis_literal': self.extract_literal_data_agnostic(medida_data, elementos_ia=elementos_ia),
+            'analisis_critico': analisis_critico,
+            'analisis_abogado_diablo': analisis_origen['analisis_abogado_diablo'],
+            'analisis_semantico': analisis_origen['analisis_semantico'],
+            'embeddings': self.generate_embeddings_agnostic(medida_data),
+            'metadatos_analisis': {
+                'enfoque': 'agnostico_sin_presupuestos',
+                'version_analyzer': '2.0_agnostic',
+                'confianza_general': 'reutilizado_de_casi_duplicado',
+                'duplicado_de': duplicado_info
+            }
+        }
+
+    def extract_literal_data_agnostic(self, medida_data, elementos_ia=None):
         """Análisis literal agnóstico - sin categorías predefinidas"""
         literal_data = {
             'numero_medida': medida_data['numero_medida'],
@@ -72,7 +218,7 @@ class TripleAnalyzerAgnostic:
             'estructura_detectada': medida_data.get('estructura_detectada', {}),
             'metadatos_scraping': medida_data.get('metadatos_extraidos', {}),
             'elementos_detectados_scraper': medida_data.get('elementos_detectados', []),
-            'elementos_detectados_ia': self.detect_elements_with_ai(medida_data),
+            'elementos_detectados_ia': elementos_ia if elementos_ia is not None else self.detect_elements_with_ai(medida_data),
             'estadisticas_texto': self.calculate_text_stats(medida_data)
         }
         return literal_data
@@ -104,9 +250,11 @@ class TripleAnalyzerAgnostic:
         NO inventes. Solo extrae lo que esté literalmente presente.
         """
         try:
-            response = self.model.generate_content(prompt)
-            result = self._extract_json_from_response(response)
+            result = self._generate_json(prompt, 'literal')
             return result
+        except GeminiReintentosAgotados:
+            # No guardar la medida como analizada con secciones vacías: se reintenta en la próxima corrida
+            raise
         except Exception as e:
             return {"error": f"Error detección IA: {str(e)}"}
     
@@ -179,11 +327,12 @@ class TripleAnalyzerAgnostic:
         }}
         """
         try:
-            response = self.model.generate_content(prompt)
-            result = self._extract_json_from_response(response)
+            result = self._generate_json(prompt, 'critico')
             result['considerandos_analizados_criticamente'] = requiere_critico
             result['ratio_justificacion_accion'] = self.calculate_justification_ratio(medida_data)
             return result
+        except GeminiReintentosAgotados:
+            raise
         except Exception as e:
             return {"error": f"Error análisis crítico: {str(e)}"}
     
@@ -222,9 +371,10 @@ class TripleAnalyzerAgnostic:
         }}
         """
         try:
-            response = self.model.generate_content(prompt)
-            result = self._extract_json_from_response(response)
+            result = self._generate_json(prompt, 'abogado_diablo')
             return result
+        except GeminiReintentosAgotados:
+            raise
         except Exception as e:
             return {"error": f"Error abogado diablo: {str(e)}"}
     
@@ -258,9 +408,10 @@ class TripleAnalyzerAgnostic:
         }}
         """
         try:
-            response = self.model.generate_content(prompt)
-            result = self._extract_json_from_response(response)
+            result = self._generate_json(prompt, 'semantico')
             return result
+        except GeminiReintentosAgotados:
+            raise
         except Exception as e:
             return {"error": f"Error análisis semántico: {str(e)}"}
     
@@ -289,17 +440,18 @@ class TripleAnalyzerAgnostic:
             if not texto_completo:
                 return {"error": "Sin texto para generar embeddings"}
             
-            embedding_completo = self.encoder.encode(texto_completo).tolist()
-            
-            estructura = medida_data.get('estructura_detectada', {})
-            embeddings_secciones = {}
-            for seccion, datos in estructura.items():
-                contenido = datos.get('contenido', '')
-                if contenido and len(contenido) > 20:
-                    embeddings_secciones[f'embedding_{seccion}'] = self.encoder.encode(contenido).tolist()
-            
-            titulo = medida_data.get('titulo_raw', '')
-            embedding_titulo = self.encoder.encode(titulo).tolist() if titulo else []
+            with medir_etapa('encoding'):
+                embedding_completo = self.encoder.encode(texto_completo).tolist()
+                
+                estructura = medida_data.get('estructura_detectada', {})
+                embeddings_secciones = {}
+                for seccion, datos in estructura.items():
+                    contenido = datos.get('contenido', '')
+                    if contenido and len(contenido) > 20:
+                        embeddings_secciones[f'embedding_{seccion}'] = self.encoder.encode(contenido).tolist()
+                
+                titulo = medida_data.get('titulo_raw', '')
+                embedding_titulo = self.encoder.encode(titulo).tolist() if titulo else []
             
             return {
                 'embedding_completo': embedding_completo,
@@ -307,7 +459,8 @@ class TripleAnalyzerAgnostic:
                 'embeddings_por_seccion': embeddings_secciones,
                 'dimension': len(embedding_completo) if embedding_completo else 0,
                 'metadatos_embedding': {
-                    'modelo_usado': 'paraphrase-multilingual-MiniLM-L12-v2',
+                    'modelo_usado': self.MODELO_ENCODER,
+                    'backend_encoder': self.encoder_backend,
                     'secciones_vectorizadas': list(embeddings_secciones.keys()),
                     'fecha_generacion': datetime.now().isoformat()
                 }
@@ -318,18 +471,47 @@ class TripleAnalyzerAgnostic:
 class BatchAnalyzer:
     """Análisis batch de todas las medidas"""
     
+    SECCIONES_IA = ('analisis_critico', 'analisis_abogado_diablo', 'analisis_semantico')
+    INDICE_DUPLICADOS = 'indice_duplicados.npz'
+    HISTORIAL_TRIAGE = 'triage_historial.npz'
+    AGREGADOS = 'agregados.json'
+    INDICE_BUSQUEDA = IndiceBusqueda.ARCHIVO
+    INDICE_ENTIDADES = IndiceEntidades.ARCHIVO
+    GRAFO_CITAS = GrafoCitas.ARCHIVO
+    ROLLUPS = RollupsTemporales.ARCHIVO
+    PATRONES = MotorPatrones.ARCHIVO
+    NOVEDADES = FeedNovedades.ARCHIVO
+
     def __init__(self):
+        inicio = time.perf_counter()
         self.analyzer = TripleAnalyzerAgnostic()
+        print(f"✓ BatchAnalyzer listo en {time.perf_counter() - inicio:.3f}s (modelos con carga diferida)")
+        self.indice_duplicados = None
+        self.triage = None
+        self.agregados = None
+        self.indice_busqueda = None
+        self.indice_entidades = None
+        self.grafo_citas = None
+        self.rollups = None
+        self.patrones = None
+        self.novedades = None
+        self.novedades_publicadas = 0
+        self.manifest = WorkManifest(self.conectar_ftp)
+        self.usar_manifest = os.getenv('BORA_MANIFEST', '1') != '0'
+        self.triage_activo = os.getenv('BORA_TRIAGE', '1') != '0'
+        self.analisis_por_archivo = {}
+        # Medidas ya subidas cuyo aporte a los estados derivados todavía no se guardó: recién se marcan
+        # 'analizada' en el manifest cuando un guardado de estado las incluye (cada BORA_ESTADO_CADA medidas)
+        self.sin_confirmar = []
+        self.estado_cada = max(1, int(os.getenv('BORA_ESTADO_CADA', 20)))
+        # Perfilado opt-in por medida (BORA_PROFILE=1): cProfile + tracemalloc, ranking de las peores
+        self.profiler = MedidaProfiler('analyzer') if perfilado_activo() else None
         
     def analyze_all_measures_in_directory(self):
         """Descarga, analiza y vuelve a subir las medidas desde Hostinger."""
         print("Iniciando análisis batch desde Hostinger...")
         
-        raw_files = self.list_hostinger_files('raw')
-        analyzed_files = self.list_hostinger_files('analyzed')
-        
-        analyzed_stems = {Path(f).stem.replace('_analysis_agnostic', '') for f in analyzed_files}
-        files_to_analyze = [f for f in raw_files if Path(f).stem not in analyzed_stems]
+        files_to_analyze = self.descubrir_pendientes()
         
         if not files_to_analyze:
             print("No hay nuevas medidas para analizar. Todo está al día.")
@@ -337,55 +519,357 @@ class BatchAnalyzer:
             
         print(f"Se encontraron {len(files_to_analyze)} nuevas medidas para analizar.")
         
+        try:
+            self.cargar_estados()
+        except EstadoNoDisponible as e:
+            # Nada analizado todavía: abortar no deja medidas a medio registrar ni pisa el estado existente
+            print(f"✗ Batch abortado antes de analizar: {e}")
+            return {'total_analizadas': 0, 'total_errores': 1, 'error': str(e)}
+        self.novedades_publicadas = time.monotonic()
         resultados = []
         errores = []
+        reutilizadas = 0
+        reducidas = 0
         
-        for i, filename in enumerate(files_to_analyze, 1):
-            local_raw_path = None
-            try:
-                print(f"Procesando {i}/{len(files_to_analyze)}: {filename}")
-                local_raw_path = self.download_from_hostinger(f'raw/{filename}')
-                with open(local_raw_path, 'r', encoding='utf-8') as f:
-                    medida_data = json.load(f)
+        try:
+            for i, filename in enumerate(files_to_analyze, 1):
+                local_raw_path = None
+                perfil = self.profiler.iniciar(Path(filename).stem) if self.profiler else None
+                try:
+                    print(f"Procesando {i}/{len(files_to_analyze)}: {filename}")
+                    inicio_medida = time.perf_counter()
+                    local_raw_path = self.download_from_hostinger(f'raw/{filename}')
+                    with medir_etapa('json_parseo'):
+                        # El HTML crudo no se usa en el análisis (el texto limpio sí): se saltea sin decodificarlo,
+                        # salvo al perfilar, que mide su largo
+                        medida_data = leer_campos(local_raw_path, excluir=() if perfil else CAMPOS_PESADOS)
+                    if perfil:
+                        perfil['medida'] = medida_data
                 
-                analysis = self.analyzer.analyze_medida(medida_data)
-                resultados.append(analysis)
+                    stem = Path(filename).stem
+                    firma = self.indice_duplicados.firma(medida_data.get('texto_completo_limpio', ''))
+                    analysis = None
+                    duplicado = self.indice_duplicados.buscar(firma, excluir=stem)
+                    if duplicado:
+                        analysis = self.reutilizar_analisis_duplicado(medida_data, *duplicado)
+                    if analysis is None:
+                        analysis = self.analizar_con_triage(medida_data)
+                        if analysis['metadatos_analisis']['modo_analisis'] == 'reducido':
+                            reducidas += 1
+                    else:
+                        reutilizadas += 1
+                    resultados.append(analysis)
                 
-                analysis_filename = Path(filename).stem + "_analysis_agnostic.json"
-                temp_dir = tempfile.gettempdir()
-                local_analysis_path = os.path.join(temp_dir, analysis_filename)
+                    analysis_filename = stem + "_analysis_agnostic.json"
+                    temp_dir = tempfile.gettempdir()
+                    local_analysis_path = os.path.join(temp_dir, analysis_filename)
                 
-                with open(local_analysis_path, 'w', encoding='utf-8') as f:
-                    json.dump(analysis, f, ensure_ascii=False, indent=2)
+                    with medir_etapa('json_serializacion'):
+                        tamanio = serializacion.guardar(analysis, local_analysis_path)
+                    sumar_bytes('json_serializacion', tamanio)
                 
-                self.upload_analysis_to_hostinger(local_analysis_path)
+                    self.upload_analysis_to_hostinger(local_analysis_path)
+                    self.incorporar_analisis(filename, medida_data, firma, analysis)
+                    self.publicar_novedades()
+                    registry.observar('bora_medida_segundos', time.perf_counter() - inicio_medida,
+                                      'Duración total por medida en el batch', resultado='ok')
                 
+                except Exception as e:
+                    error_info = f"Error procesando {filename}: {e}"
+                    errores.append(error_info)
+                    print(f"✗ {error_info}")
+                    self.registrar_en_manifest(filename, 'error', detalle=str(e)[:200])
+                    if perfil:
+                        perfil['error'] = str(e)[:200]
+                finally:
+                    if perfil:
+                        self.profiler.terminar(perfil)
+                    if local_raw_path and os.path.exists(local_raw_path):
+                        os.remove(local_raw_path)
+
+                if len(self.sin_confirmar) >= self.estado_cada:
+                    self.confirmar_analizadas()
+        finally:
+            # También si la corrida se corta con una excepción: lo ya subido queda en el estado y en el manifest
+            self.confirmar_analizadas()
+        if self.etiquetar_patrones():
+            self.guardar_estado(self.PATRONES, self.patrones.guardar)
+        self.publicar_novedades(forzar=True)
+        if self.usar_manifest:
+            try:
+                print(f"✓ Manifest compactado ({self.manifest.compactar()} eventos).")
             except Exception as e:
-                error_info = f"Error procesando {filename}: {e}"
-                errores.append(error_info)
-                print(f"✗ {error_info}")
-            finally:
-                if local_raw_path and os.path.exists(local_raw_path):
-                    os.remove(local_raw_path)
-        
+                print(f"✗ Error compactando el manifest: {e}")
         self.save_batch_summary(resultados, errores)
+        metricas = self.save_metrics_report()
+        if self.profiler:
+            self.profiler.finalizar()
         
         return {
             'total_analizadas': len(resultados),
-            'total_errores': len(errores)
+            'total_reutilizadas_por_duplicado': reutilizadas,
+            'total_reducidas_por_triage': reducidas,
+            'total_errores': len(errores),
+            'limitador_gemini': self.analyzer.limitador.estadisticas(),
+            'respuestas_json_gemini': self.analyzer.respuestas_json.estadisticas(),
+            'metricas': metricas
         }
 
-    def list_hostinger_files(self, remote_dir):
-        """Lista archivos en un directorio de Hostinger."""
+    def incorporar_analisis(self, filename, medida_data, firma, analysis):
+        """Suma un análisis ya subido a los estados derivados; queda por confirmar en el manifest."""
+        stem = Path(filename).stem
+        self.indice_duplicados.agregar(stem, firma)
+        self.agregados.agregar_analisis(analysis)
+        self.rollups.agregar_analisis(stem, analysis)
+        self.patrones.agregar(stem, analysis)
+        self.indice_entidades.agregar_analisis(stem, analysis)
+        self.grafo_citas.agregar_medida(stem, medida_data, analysis)
+        self.indexar_busqueda(stem, medida_data)
+        self.analisis_por_archivo[stem] = analysis
+        self.sin_confirmar.append((filename, medida_data))
+        self.novedades.agregar(stem, analysis)
+
+    def reanalizar_medida(self, clave):
+        """Re-análisis completo (con Gemini) de una medida, pedido desde la API.
+
+        Reemplaza el análisis en Hostinger y su aporte a todos los estados derivados (los agregados restan el
+        análisis anterior) y lo registra en el manifest, igual que una medida del batch. Carga y sube el estado
+        completo: un batch que corra en paralelo puede pisar el resultado en los estados (no el análisis).
+        """
+        self.cargar_estados()
+        filename = f'{clave}.json'
+        local_raw_path = self.download_from_hostinger(f'raw/{filename}')
+        try:
+            medida_data = leer_campos(local_raw_path, excluir=CAMPOS_PESADOS)
+        finally:
+            os.remove(local_raw_path)
+        anterior = self.download_json_from_hostinger(f'analyzed/{clave}_analysis_agnostic.json')
+
+        analysis = self.analyzer.analyze_medida(medida_data, modo='completo')
+        local_analysis_path = os.path.join(tempfile.gettempdir(), f'{clave}_analysis_agnostic.json')
+        try:
+            serializacion.guardar(analysis, local_analysis_path)
+            self.upload_analysis_to_hostinger(local_analysis_path)
+        finally:
+            if os.path.exists(local_analysis_path):
+                os.remove(local_analysis_path)
+
+        if anterior:
+            self.agregados.quitar_analisis(anterior)
+        firma = self.indice_duplicados.firma(medida_data.get('texto_completo_limpio', ''))
+        self.incorporar_analisis(filename, medida_data, firma, analysis)
+        if not self.confirmar_analizadas():
+            raise RuntimeError(f"Análisis de '{clave}' subido, pero no se pudieron guardar los estados derivados")
+        self.publicar_novedades(forzar=True)
+        return analysis
+
+    def cargar_estados(self):
+        self.indice_duplicados = self.cargar_estado(self.INDICE_DUPLICADOS, NearDuplicateIndex.cargar, NearDuplicateIndex)
+        self.triage = self.cargar_estado(self.HISTORIAL_TRIAGE, TriageModel.cargar, TriageModel)
+        self.agregados = self.cargar_estado(self.AGREGADOS, AggregateStats.cargar, AggregateStats)
+        self.indice_busqueda = self.cargar_estado(self.INDICE_BUSQUEDA, IndiceBusqueda.cargar, IndiceBusqueda)
+        self.indice_entidades = self.cargar_estado(self.INDICE_ENTIDADES, IndiceEntidades.cargar, IndiceEntidades)
+        self.grafo_citas = self.cargar_estado(self.GRAFO_CITAS, GrafoCitas.cargar, GrafoCitas)
+        self.rollups = self.cargar_estado(self.ROLLUPS, RollupsTemporales.cargar, RollupsTemporales)
+        self.patrones = self.cargar_estado(self.PATRONES, MotorPatrones.cargar, MotorPatrones)
+        self.novedades = self.cargar_estado(self.NOVEDADES, FeedNovedades.cargar, FeedNovedades)
+
+    def guardar_estados(self):
+        """Sube todos los estados derivados; True si se subieron todos."""
+        return all([
+            self.guardar_estado(self.INDICE_DUPLICADOS, self.indice_duplicados.guardar),
+            self.guardar_estado(self.HISTORIAL_TRIAGE, self.triage.guardar),
+            self.guardar_estado(self.AGREGADOS, self.agregados.guardar),
+            self.guardar_estado(self.INDICE_BUSQUEDA, self.indice_busqueda.guardar),
+            self.guardar_estado(self.INDICE_ENTIDADES, self.indice_entidades.guardar),
+            self.guardar_estado(self.GRAFO_CITAS, self.grafo_citas.guardar),
+            self.guardar_estado(self.ROLLUPS, self.rollups.guardar),
+            self.guardar_estado(self.PATRONES, self.patrones.guardar),
+        ])
+
+    def confirmar_analizadas(self):
+        """Guarda los estados derivados y recién entonces marca como analizadas las medidas que incluyen.
+
+        Si la corrida muere antes, esas medidas siguen pendientes en el manifest: la próxima las vuelve a
+        procesar (retomando de los checkpoints de etapas, sin repetir llamadas a Gemini) y los estados, que
+        son idempotentes por medida, no las cuentan dos veces.
+        """
+        if not self.guardar_estados():
+            print(f"✗ Estado derivado sin guardar: {len(self.sin_confirmar)} medidas siguen pendientes en el manifest.")
+            return False
+        for filename, medida_data in self.sin_confirmar:
+            self.registrar_en_manifest(filename, 'analizada')
+            # Ya subida y registrada: los checkpoints de etapas no hacen falta
+            self.analyzer.checkpoints.limpiar(medida_data)
+        self.sin_confirmar = []
+        return True
+
+    def descubrir_pendientes(self):
+        """Medidas raw sin analizar: desde el manifest (sin listar directorios) o, si no existe, por listado."""
+        if self.usar_manifest:
+            try:
+                if self.manifest.existe():
+                    return self.manifest.pendientes()
+                print("Manifest inexistente: se construye una vez a partir del listado completo...")
+            except Exception as e:
+                print(f"✗ Error leyendo el manifest, se usa el listado completo: {e}")
+        
+        raw_files = [f for f in self.list_hostinger_files('raw') if f.endswith('.json')]
+        analyzed_files = self.list_hostinger_files('analyzed')
+        
+        if self.usar_manifest:
+            try:
+                self.manifest.reconstruir(raw_files, analyzed_files)
+            except Exception as e:
+                print(f"✗ Error construyendo el manifest: {e}")
+        
+        analyzed_stems = {f.replace('_analysis_agnostic.json', '') for f in analyzed_files
+                          if f.endswith('_analysis_agnostic.json')}
+        return [f for f in raw_files if Path(f).stem not in analyzed_stems]
+
+    def indexar_busqueda(self, stem, medida_data):
+        """Agrega la medida al índice de texto completo; un fallo acá no invalida el análisis ya subido."""
+        try:
+            with medir_etapa('indexado_busqueda'):
+                self.indice_busqueda.agregar(stem, medida_data)
+        except Exception as e:
+            print(f"✗ Error indexando '{stem}' para búsqueda: {e}")
+
+    def publicar_novedades(self, forzar=False):
+        """Sube el feed de novedades como mucho cada BORA_NOVEDADES_INTERVALO segundos (y siempre al terminar).
+
+        El resto del estado se sube al final del batch; el feed no, para que el dashboard vea las medidas
+        a medida que se analizan.
+        """
+        if not forzar and time.monotonic() - self.novedades_publicadas < float(os.getenv('BORA_NOVEDADES_INTERVALO', 30)):
+            return
+        self.guardar_estado(self.NOVEDADES, self.novedades.guardar)
+        self.novedades_publicadas = time.monotonic()
+
+    def etiquetar_patrones(self):
+        """Opcional (BORA_PATRONES_ETIQUETAS=1): pide a Gemini un nombre para los clusters nuevos o que crecieron.
+        Devuelve cuántos etiquetó."""
+        if os.getenv('BORA_PATRONES_ETIQUETAS') != '1':
+            return 0
+        etiquetados = 0
+        for cluster in self.patrones.clusters_sin_etiqueta():
+            try:
+                self.patrones.etiquetar(cluster, self.analyzer._generate_json(self.patrones.prompt_etiqueta(cluster), 'patrones'))
+                etiquetados += 1
+            except Exception as e:
+                print(f"✗ Error etiquetando el patrón {cluster}: {e}")
+        print(f"✓ Patrones etiquetados con Gemini: {etiquetados}")
+        return etiquetados
+
+    def registrar_en_manifest(self, filename, estado, **extra):
+        if not self.usar_manifest:
+            return
+        try:
+            self.manifest.registrar(filename, estado, **extra)
+        except Exception as e:
+            print(f"✗ Error registrando '{filename}' en el manifest: {e}")
+
+    def analizar_con_triage(self, medida_data):
+        """Calcula embeddings y estadísticas locales, decide el modo de análisis y alimenta el historial."""
+        embeddings = self.analyzer.etapa_con_checkpoint(
+            medida_data, 'embeddings', self.analyzer.generate_embeddings_agnostic)
+        if not self.triage_activo:
+            return self.analyzer.analyze_medida(medida_data, embeddings=embeddings)
+
+        stats = self.analyzer.calculate_text_stats(medida_data)
+        # La decisión también se fija en checkpoint: al retomar no debe cambiar de modo (exploración aleatoria)
+        decision = self.analyzer.etapa_con_checkpoint(
+            medida_data, 'triage', lambda m: self.triage.decidir(embeddings, stats))
+        analysis = self.analyzer.analyze_medida(medida_data, modo=decision['modo'], embeddings=embeddings)
+        analysis['metadatos_analisis']['triage'] = decision
+        if decision['modo'] == 'completo':
+            self.triage.registrar(embeddings, stats, analysis)
+        return analysis
+
+    def reutilizar_analisis_duplicado(self, medida_data, stem_origen, similitud):
+        """Arma el análisis a partir del de una medida casi idéntica; None si no es reutilizable."""
+        analisis_origen = self.analisis_por_archivo.get(stem_origen)
+        if analisis_origen is None:
+            analisis_origen = self.download_json_from_hostinger(f'analyzed/{stem_origen}_analysis_agnostic.json')
+        if not analisis_origen:
+            return None
+        secciones = [analisis_origen.get(s) for s in self.SECCIONES_IA]
+        secciones.append(analisis_origen.get('analisis_literal', {}).get('elementos_detectados_ia'))
+        if any(not isinstance(sec, dict) or 'error' in sec or 'omitido_por_triage' in sec for sec in secciones):
+            return None
+
+        # Diff barato del texto para dejar registrado qué cambia respecto de la medida origen
+        texto_origen = self.leer_texto_raw(stem_origen)
+        cambios = None
+        if texto_origen is not None:
+            cambios = diff_textos(texto_origen, medida_data.get('texto_completo_limpio', ''))
+
+        duplicado_info = {
+            'archivo_origen': f'{stem_origen}_analysis_agnostic.json',
+            'numero_medida_origen': analisis_origen.get('numero_medida'),
+            'fecha_boletin_origen': analisis_origen.get('fecha_boletin'),
+            'similitud': round(similitud, 4),
+            'diferencias_texto': cambios
+        }
+        return self.analyzer.reuse_duplicate_analysis(medida_data, analisis_origen, duplicado_info)
+
+    def cargar_estado(self, nombre, cargador, crear_vacio):
+        """Descarga un archivo de estado desde 'data/estado' en Hostinger (o crea uno vacío si no existe).
+
+        Sólo un 550 (archivo inexistente) da un estado vacío. Cualquier otro fallo (FTP caído, timeout,
+        formato que no se puede leer) lanza EstadoNoDisponible: seguir con un estado vacío terminaría
+        subiéndolo encima del de todo el corpus al final del batch.
+        """
+        local_path = os.path.join(tempfile.gettempdir(), nombre)
+        try:
+            local_path = self.download_from_hostinger(f'estado/{nombre}')
+            estado = cargador(local_path)
+            print(f"✓ Estado '{nombre}' cargado desde Hostinger.")
+            return estado
+        except ftplib.error_perm as e:
+            if not str(e).startswith('550'):
+                raise EstadoNoDisponible(f"Estado '{nombre}' ilegible en Hostinger: {e}") from e
+            print(f"Estado '{nombre}' inexistente en Hostinger, se crea uno nuevo.")
+            return crear_vacio()
+        except Exception as e:
+            raise EstadoNoDisponible(f"Estado '{nombre}' ilegible en Hostinger: {e}") from e
+        finally:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+
+    def guardar_estado(self, nombre, guardador):
+        """Serializa un estado con `guardador(path)` y lo sube a 'data/estado' en Hostinger. True si se subió."""
+        local_path = os.path.join(tempfile.gettempdir(), nombre)
+        try:
+            guardador(local_path)
+            self.upload_to_hostinger(local_path, 'data/estado')
+            print(f"✓ Estado '{nombre}' subido a Hostinger.")
+            return True
+        except Exception as e:
+            print(f"✗ Error al subir el estado '{nombre}': {e}")
+            return False
+        finally:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+
+    def conectar_ftp(self):
+        """Conexión FTP logueada a Hostinger, en la raíz del sitio."""
         FTP_HOST = "ftp.agoraenlared.com"
         FTP_USER = "u112219758.boria"
         FTP_PASS = os.getenv('HOSTINGER_FTP_PASSWORD', "Marta1664?")
         
-        try:
+        with medir_etapa('ftp_connect'):
             ftp = ftplib.FTP(FTP_HOST)
             ftp.login(FTP_USER, FTP_PASS)
-            ftp.cwd(f'data/{remote_dir}')
-            files = ftp.nlst()
+        return ftp
+
+    def list_hostinger_files(self, remote_dir):
+        """Lista archivos en un directorio de Hostinger."""
+        try:
+            ftp = self.conectar_ftp()
+            with medir_etapa('ftp_list'):
+                ftp.cwd(f'data/{remote_dir}')
+                files = ftp.nlst()
             ftp.quit()
             return [f for f in files if f not in ('.', '..')]
         except Exception as e:
@@ -393,43 +877,71 @@ class BatchAnalyzer:
             return []
 
     def download_from_hostinger(self, remote_path):
-        """Descarga un archivo desde Hostinger a una carpeta temporal."""
-        FTP_HOST = "ftp.agoraenlared.com"
-        FTP_USER = "u112219758.boria"
-        FTP_PASS = os.getenv('HOSTINGER_FTP_PASSWORD', "Marta1664?")
-        
+        """Descarga un archivo desde Hostinger a una carpeta temporal (descomprime gzip/zstd si corresponde)."""
         temp_dir = tempfile.gettempdir()
         local_filepath = os.path.join(temp_dir, Path(remote_path).name)
         
-        ftp = ftplib.FTP(FTP_HOST)
-        ftp.login(FTP_USER, FTP_PASS)
+        ftp = self.conectar_ftp()
         
         full_remote_path = f'data/{remote_path}'
-        with open(local_filepath, 'wb') as f:
-            ftp.retrbinary(f'RETR {full_remote_path}', f.write)
+        with medir_etapa('ftp_download'), open(local_filepath, 'wb') as f:
+            descompresor = Descompresor(f.write)
+            ftp.retrbinary(f'RETR {full_remote_path}', descompresor)
+            descompresor.cerrar()
+        sumar_bytes('ftp_download', descompresor.bytes_recibidos)
         
         ftp.quit()
         print(f"✓ Archivo '{Path(remote_path).name}' descargado a temporal.")
         return local_filepath
 
+    def leer_texto_raw(self, stem):
+        """Sólo el texto limpio de una medida cruda (el HTML no se decodifica); None si no existe o falla."""
+        local_path = None
+        try:
+            local_path = self.download_from_hostinger(f'raw/{stem}.json')
+            return leer_campos(local_path, campos=['texto_completo_limpio']).get('texto_completo_limpio', '')
+        except Exception as e:
+            print(f"No se pudo leer el texto de 'raw/{stem}.json' desde Hostinger: {e}")
+            return None
+        finally:
+            if local_path and os.path.exists(local_path):
+                os.remove(local_path)
+
+    def download_json_from_hostinger(self, remote_path):
+        """Descarga y parsea un JSON de Hostinger; None si no existe o falla."""
+        local_path = None
+        try:
+            local_path = self.download_from_hostinger(remote_path)
+            return serializacion.cargar(local_path)
+        except Exception as e:
+            print(f"No se pudo leer '{remote_path}' desde Hostinger: {e}")
+            return None
+        finally:
+            if local_path and os.path.exists(local_path):
+                os.remove(local_path)
+
     def upload_analysis_to_hostinger(self, local_filepath):
         """Sube un archivo de análisis a la carpeta 'analyzed' en Hostinger."""
-        FTP_HOST = "ftp.agoraenlared.com"
-        FTP_USER = "u112219758.boria"
-        FTP_PASS = os.getenv('HOSTINGER_FTP_PASSWORD', "Marta1664?")
-        
-        ftp = ftplib.FTP(FTP_HOST)
-        ftp.login(FTP_USER, FTP_PASS)
+        self.upload_to_hostinger(local_filepath, 'data/analyzed')
+        print(f"✓ Análisis '{Path(local_filepath).name}' subido a Hostinger.")
+
+    def upload_to_hostinger(self, local_filepath, target_dir):
+        """Sube un archivo a un directorio de Hostinger, creándolo si no existe (JSON comprimido según BORA_COMPRESION)."""
+        ftp = self.conectar_ftp()
         
-        target_dir = 'data/analyzed'
-        ftp.cwd(target_dir)
+        try:
+            ftp.cwd(target_dir)
+        except ftplib.error_perm:
+            ftp.mkd(target_dir)
+            ftp.cwd(target_dir)
         
         filename = Path(local_filepath).name
-        with open(local_filepath, 'rb') as f:
-            ftp.storbinary(f'STOR {filename}', f)
+        datos = leer_para_subir(local_filepath)
+        with medir_etapa('ftp_upload'):
+            ftp.storbinary(f'STOR {filename}', io.BytesIO(datos))
+        sumar_bytes('ftp_upload', len(datos))
         
         ftp.quit()
-        print(f"✓ Análisis '{filename}' subido a Hostinger.")
     
     def save_batch_summary(self, resultados, errores):
         """Crea el resumen del análisis y lo sube a Hostinger."""
@@ -442,32 +954,39 @@ class BatchAnalyzer:
             'total_medidas_analizadas': len(resultados),
             'total_errores': len(errores),
             'estadisticas_generales': self.calculate_batch_stats(resultados),
+            'estadisticas_corpus': self.agregados.resumen() if self.agregados else {},
+            'limitador_gemini': self.analyzer.limitador.estadisticas(),
+            'respuestas_json_gemini': self.analyzer.respuestas_json.estadisticas(),
             'errores_detalle': errores
         }
         
         temp_dir = tempfile.gettempdir()
         summary_path = os.path.join(temp_dir, "batch_analysis_summary_agnostic.json")
 
-        with open(summary_path, 'w', encoding='utf-8') as f:
-            json.dump(summary, f, ensure_ascii=False, indent=2)
+        serializacion.guardar(summary, summary_path)
             
         print("Subiendo resumen del análisis a Hostinger...")
         try:
-            FTP_HOST = "ftp.agoraenlared.com"
-            FTP_USER = "u112219758.boria"
-            FTP_PASS = os.getenv('HOSTINGER_FTP_PASSWORD', "Marta1664?")
-
-            ftp = ftplib.FTP(FTP_HOST)
-            ftp.login(FTP_USER, FTP_PASS)
-            ftp.cwd('data/analyzed')
-            
-            with open(summary_path, 'rb') as f:
-                ftp.storbinary(f'STOR {Path(summary_path).name}', f)
-            
-            ftp.quit()
+            self.upload_to_hostinger(summary_path, 'data/analyzed')
             print(f"✓ Resumen batch subido a Hostinger.")
         except Exception as e:
             print(f"✗ Error al subir el resumen batch: {e}")
+
+    def save_metrics_report(self):
+        """Vuelca las métricas de la corrida (latencias por etapa, tokens, bytes) en un reporte JSON."""
+        reporte = {
+            'fecha_reporte': datetime.now().isoformat(),
+            'metricas': registry.reporte()
+        }
+        nombre = f"batch_metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        local_path = os.path.join(os.getenv('BORA_METRICAS_DIR', tempfile.gettempdir()), nombre)
+        try:
+            serializacion.guardar(reporte, local_path)
+            self.upload_to_hostinger(local_path, 'data/metricas')
+            print(f"✓ Reporte de métricas '{nombre}' guardado y subido a Hostinger.")
+        except Exception as e:
+            print(f"✗ Error guardando el reporte de métricas: {e}")
+        return reporte['metricas']
     
     def calculate_batch_stats(self, resultados):
         """Estadísticas generales del batch"""
@@ -477,6 +996,7 @@ class BatchAnalyzer:
         stats = {
             'medidas_con_considerandos': 0,
             'medidas_con_pdfs': 0,
+            'medidas_analisis_reducido': 0,
             'organismos_detectados': set(),
             'temas_emergentes': {},
             'niveles_riesgo': {'bajo': 0, 'medio': 0, 'alto': 0, 'critico': 0}
@@ -499,6 +1019,9 @@ class BatchAnalyzer:
             stats['temas_emergentes'][categoria] = stats['temas_emergentes'].get(categoria, 0) + 1
             
             diablo = resultado.get('analisis_abogado_diablo', {})
+            if diablo.get('omitido_por_triage'):
+                stats['medidas_analisis_reducido'] += 1
+                continue
             riesgo = diablo.get('nivel_riesgo_democratico', 'bajo')
             if riesgo in stats['niveles_riesgo']:
                 stats['niveles_riesgo'][riesgo] += 1
@@ -507,6 +1030,17 @@ class BatchAnalyzer:
         
         return stats
 
+def reanalizar(clave):
+    """Punto de entrada del trabajo 'reanalisis' de la API, que lo corre en un proceso aparte (spawn):
+    Gemini, el encoder y los estados se cargan acá y se liberan al terminar, no en el worker web."""
+    analisis = BatchAnalyzer().reanalizar_medida(clave)
+    return {
+        'clave': clave,
+        'categoria_emergente': analisis.get('analisis_semantico', {}).get('categoria_emergente'),
+        'nivel_riesgo_democratico': analisis.get('analisis_abogado_diablo', {}).get('nivel_riesgo_democratico'),
+        'nivel_transparencia': analisis.get('analisis_critico', {}).get('nivel_transparencia'),
+    }
+
 def main():
     print("=== ANÁLISIS TRIPLE AGNÓSTICO DE MEDIDAS ===")
     print("Enfoque: Sin categorías predefinidas, detección semántica con IA")
@@ -517,6 +1051,14 @@ def main():
     print(f"\n=== ANÁLISIS COMPLETADO ===")
     print(f"Medidas analizadas: {resultado.get('total_analizadas', 0)}")
     print(f"Errores: {resultado.get('total_errores', 0)}")
+    if resultado.get('total_reutilizadas_por_duplicado'):
+        print(f"Reutilizadas por casi-duplicado (sin llamadas a Gemini): {resultado['total_reutilizadas_por_duplicado']}")
+    if resultado.get('total_reducidas_por_triage'):
+        print(f"Análisis reducido por triage: {resultado['total_reducidas_por_triage']}")
+    limitador = resultado.get('limitador_gemini')
+    if limitador:
+        print(f"Llamadas Gemini: {limitador['llamadas']} (reintentos: {limitador['reintentos']})")
+        print(f"Tiempo en espera por límites/backoff: {limitador['segundos_throttled']}s")
     print("Revisá los archivos *_analysis_agnostic.json para ver resultados detallados")
 
 if __name__ == "__main__":
@@ -1,28 +1,90 @@
+import time
+_INICIO_ARRANQUE = time.perf_counter()
+
 import os
-import json
+import re
 import ftplib
+import io
+import threading
 from pathlib import Path
-from flask import Flask, jsonify, request
+from contextlib import contextmanager
+from flask import Flask, jsonify, request, g, Response
 from flask_cors import CORS
-import google.generativeai as genai
 import tempfile
+from metrics import registry, medir_etapa, sumar_bytes
+from compresion import Descompresor, leer_para_subir
+from flask.json.provider import DefaultJSONProvider
+import serializacion
 
 # --- Inicialización y Configuración ---
+class JsonProviderBora(DefaultJSONProvider):
+    """jsonify con el serializador del proyecto (orjson si está instalado): /api/medidas devuelve embeddings"""
+    def dumps(self, obj, **kwargs):
+        return serializacion.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return serializacion.loads(s)
+
 app = Flask(__name__)
+app.json = JsonProviderBora(app)
 CORS(app)  # Permite que el dashboard web se conecte a esta API
 
-# Configurar Gemini (necesario para el endpoint de patrones)
-try:
-    genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    print("✓ API: Conexión con Gemini configurada.")
-except Exception as e:
-    print(f"ADVERTENCIA API: No se pudo configurar Gemini. El endpoint de patrones fallará. Error: {e}")
+@app.before_request
+def _iniciar_medicion():
+    g.inicio_request = time.perf_counter()
+
+@app.after_request
+def _registrar_medicion(response):
+    """Latencia y conteo por endpoint (regla de la ruta, no la URL: evita cardinalidad sin límite)"""
+    endpoint = request.url_rule.rule if request.url_rule else 'sin_ruta'
+    if hasattr(g, 'inicio_request'):
+        registry.observar('bora_api_request_segundos', time.perf_counter() - g.inicio_request,
+                          'Latencia de los endpoints de la API', endpoint=endpoint, metodo=request.method)
+    registry.sumar('bora_api_requests_total', 1, 'Requests atendidos por endpoint y status',
+                   endpoint=endpoint, status=response.status_code)
+    try:
+        volcar_metricas(forzar=False)
+    except OSError as e:
+        print(f"✗ API: no se pudieron volcar las métricas del worker: {e}")
+    return response
+
+# Gemini (ningún endpoint lo llama por request; las etiquetas de patrones las genera el batch) se configura en el primer uso:
+# importar google.generativeai al arrancar encarece el cold start en Render.
+_gemini_model = None
+_gemini_lock = threading.Lock()
+
+def get_gemini_model():
+    """Devuelve el cliente Gemini, configurándolo la primera vez que se necesita."""
+    global _gemini_model
+    if _gemini_model is None:
+        with _gemini_lock:
+            if _gemini_model is None:
+                inicio = time.perf_counter()
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+                _gemini_model = genai.GenerativeModel('gemini-1.5-flash')
+                print(f"✓ API: Conexión con Gemini configurada en {time.perf_counter() - inicio:.3f}s.")
+    return _gemini_model
+
+def preload():
+    """Warm-up opcional (BORA_PRELOAD=1): configura Gemini antes de recibir requests."""
+    try:
+        get_gemini_model()
+    except Exception as e:
+        print(f"ADVERTENCIA API: No se pudo configurar Gemini. Error: {e}")
+
+def arranque():
+    """Preload opcional y log del tiempo de arranque; lo llaman `python api.py` y wsgi.py (cada worker de gunicorn)"""
+    if os.getenv('BORA_PRELOAD') == '1':
+        preload()
+    print(f"✓ API lista en {time.perf_counter() - _INICIO_ARRANQUE:.3f}s desde el arranque del proceso "
+          f"(pid {os.getpid()}).", flush=True)
 
 # Configuración FTP (la leemos una vez)
 FTP_HOST = "ftp.agoraenlared.com"
 FTP_USER = "u112219758.boria"
 FTP_PASS = os.getenv('HOSTINGER_FTP_PASSWORD', "Marta1664?")
+FTP_TIMEOUT = int(os.getenv('BORA_FTP_TIMEOUT', 30))
 
 
 # --- Funciones de Ayuda para FTP ---
@@ -30,10 +92,10 @@ FTP_PASS = os.getenv('HOSTINGER_FTP_PASSWORD', "Marta1664?")
 def list_hostinger_files(remote_dir):
     """Lista archivos en un directorio de Hostinger."""
     try:
-        ftp = ftplib.FTP(FTP_HOST)
-        ftp.login(FTP_USER, FTP_PASS)
-        ftp.cwd(f'data/{remote_dir}')
-        files = ftp.nlst()
+        ftp = conectar_ftp()
+        with medir_etapa('ftp_list'):
+            ftp.cwd(f'data/{remote_dir}')
+            files = ftp.nlst()
         ftp.quit()
         return [f for f in files if f not in ('.', '..')]
     except Exception as e:
@@ -41,23 +103,264 @@ def list_hostinger_files(remote_dir):
         return []
 
 def download_from_hostinger(remote_path):
-    """Descarga un archivo desde Hostinger a una carpeta temporal."""
+    """Descarga un archivo desde Hostinger a un temporal propio (requests concurrentes no se pisan)."""
+    local_filepath = None
     try:
-        temp_dir = tempfile.gettempdir()
-        local_filepath = os.path.join(temp_dir, Path(remote_path).name)
+        descriptor, local_filepath = tempfile.mkstemp(prefix='bora_', suffix=f'_{Path(remote_path).name}')
+        os.close(descriptor)
         
-        ftp = ftplib.FTP(FTP_HOST)
-        ftp.login(FTP_USER, FTP_PASS)
+        ftp = conectar_ftp()
         
         full_remote_path = f'data/{remote_path}'
-        with open(local_filepath, 'wb') as f:
-            ftp.retrbinary(f'RETR {full_remote_path}', f.write)
+        with medir_etapa('ftp_download'), open(local_filepath, 'wb') as f:
+            # Los archivos pueden estar comprimidos (gzip/zstd) o no: se detecta por los primeros bytes
+            descompresor = Descompresor(f.write)
+            ftp.retrbinary(f'RETR {full_remote_path}', descompresor)
+            descompresor.cerrar()
+        sumar_bytes('ftp_download', descompresor.bytes_recibidos)
         
         ftp.quit()
         return local_filepath
     except Exception as e:
         print(f"API Error (download_from_hostinger): {e}")
+        if local_filepath and os.path.exists(local_filepath):
+            os.remove(local_filepath)
+        return None
+
+def download_json_from_hostinger(remote_path):
+    """Descarga y parsea un JSON de Hostinger; None si no existe o falla."""
+    local_path = download_from_hostinger(remote_path)
+    if not local_path:
+        return None
+    try:
+        return serializacion.cargar(local_path)
+    except Exception as e:
+        print(f"API Error (download_json_from_hostinger): {e}")
         return None
+    finally:
+        os.remove(local_path)
+
+def upload_to_hostinger(local_filepath, target_dir, formato=None):
+    """Sube un archivo a un directorio de Hostinger, creándolo si no existe (JSON comprimido según BORA_COMPRESION)."""
+    ftp = conectar_ftp()
+    try:
+        ftp.cwd(target_dir)
+    except ftplib.error_perm:
+        ftp.mkd(target_dir)
+        ftp.cwd(target_dir)
+    datos = leer_para_subir(local_filepath, formato)
+    with medir_etapa('ftp_upload'):
+        ftp.storbinary(f'STOR {Path(local_filepath).name}', io.BytesIO(datos))
+    sumar_bytes('ftp_upload', len(datos))
+    ftp.quit()
+
+def conectar_ftp():
+    # Con timeout: un Hostinger colgado no debe retener un thread del servidor indefinidamente
+    with medir_etapa('ftp_connect'):
+        ftp = ftplib.FTP(FTP_HOST, timeout=FTP_TIMEOUT)
+        ftp.login(FTP_USER, FTP_PASS)
+    return ftp
+
+def contar_medidas():
+    """Totales raw/analizadas/pendientes desde el manifest; si no existe, por listado de directorios."""
+    try:
+        from manifest import WorkManifest
+        manifest = WorkManifest(conectar_ftp)
+        if manifest.existe():
+            estado = manifest.leer_estado()
+            return {
+                'total_medidas_raw': estado['totales']['recibida'],
+                'total_medidas_analizadas': estado['totales']['analizada'],
+                'medidas_pendientes_analisis': len(estado['pendientes']),
+                'fuente': 'manifest'
+            }
+    except Exception as e:
+        print(f"API Error (contar_medidas): {e}")
+    
+    raw_stems = {f[:-len('.json')] for f in list_hostinger_files('raw') if f.endswith('.json')}
+    # Sólo cuentan los análisis de medidas (el resumen batch también vive en 'analyzed')
+    analyzed_stems = {f[:-len('_analysis_agnostic.json')] for f in list_hostinger_files('analyzed')
+                      if f.endswith('_analysis_agnostic.json')}
+    return {
+        'total_medidas_raw': len(raw_stems),
+        'total_medidas_analizadas': len(analyzed_stems),
+        'medidas_pendientes_analisis': len(raw_stems - analyzed_stems),
+        'fuente': 'listado'
+    }
+
+# --- Caché en disco compartida entre workers ---
+# Con varios procesos (gunicorn) la caché no puede vivir en memoria: los archivos de estado (p. ej. el índice
+# SQLite de búsqueda) y las respuestas caras se guardan en BORA_API_CACHE_DIR y la frescura se decide por el
+# mtime del archivo. Un lock de archivo por entrada hace que sólo un worker refresque; los demás siguen
+# sirviendo la copia anterior. Los reemplazos son con os.replace: quien ya tiene el archivo abierto no se entera.
+CACHE_DIR = os.getenv('BORA_API_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'bora_api_cache'))
+ESTADO_TTL = int(os.getenv('BORA_ESTADO_TTL', 600))
+RESPUESTAS_TTL = int(os.getenv('BORA_API_CACHE_TTL', 60))
+AUSENTE_TTL = 60  # un estado que todavía no existe en Hostinger no se vuelve a pedir en cada request
+os.makedirs(os.path.join(CACHE_DIR, 'respuestas'), exist_ok=True)
+
+try:
+    import fcntl
+except ImportError:  # Windows (desarrollo): sólo hay un proceso, alcanza con un lock entre hilos
+    fcntl = None
+_locks_hilos = {}
+
+@contextmanager
+def bloqueo_cache(nombre, bloqueante=True):
+    """Lock exclusivo entre procesos sobre CACHE_DIR/<nombre>.lock; devuelve si se obtuvo"""
+    if fcntl is None:
+        lock = _locks_hilos.setdefault(nombre, threading.Lock())
+        obtenido = lock.acquire(blocking=bloqueante)
+        try:
+            yield obtenido
+        finally:
+            if obtenido:
+                lock.release()
+        return
+    with open(os.path.join(CACHE_DIR, f'{nombre}.lock'), 'a') as archivo:
+        try:
+            fcntl.flock(archivo, fcntl.LOCK_EX | (0 if bloqueante else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+def _fresco(path, ttl):
+    try:
+        return time.time() - os.path.getmtime(path) < ttl
+    except OSError:
+        return False
+
+def estado_local(nombre, ttl=None):
+    """Path local de data/estado/<nombre>, descargado como mucho cada `ttl` (ESTADO_TTL) segundos; None si no existe."""
+    destino = os.path.join(CACHE_DIR, nombre)
+    ausente = destino + '.ausente'
+    ttl = ESTADO_TTL if ttl is None else ttl
+    if _fresco(destino, ttl):
+        return destino
+    if _fresco(ausente, min(AUSENTE_TTL, ttl)):
+        return None
+    # Si otro worker ya está refrescando y hay copia anterior, se sirve esa en lugar de esperar
+    with bloqueo_cache(nombre, bloqueante=not os.path.exists(destino)) as obtenido:
+        if not obtenido or _fresco(destino, ttl):
+            return destino
+        descargado = download_from_hostinger(f'estado/{nombre}')
+        if not descargado:
+            if os.path.exists(destino):
+                return destino
+            open(ausente, 'w').close()
+            return None
+        os.replace(descargado, destino)
+        return destino
+
+_estado_objetos = {}
+
+def estado_cargado(nombre, cargador, ttl=None):
+    """Objeto construido con cargador(path) a partir de estado_local; cada worker lo reconstruye sólo cuando cambia el archivo."""
+    path = estado_local(nombre, ttl)
+    if not path:
+        return None
+    version = os.stat(path).st_mtime_ns
+    cacheado = _estado_objetos.get(nombre)
+    if cacheado and cacheado[0] == version:
+        return cacheado[1]
+    objeto = cargador(path)
+    _estado_objetos[nombre] = (version, objeto)
+    return objeto
+
+def respuesta_cacheada(clave, generar, ttl=None):
+    """Respuesta JSON de generar() cacheada en disco por `ttl` segundos y compartida entre workers"""
+    path = os.path.join(CACHE_DIR, 'respuestas', f'{clave}.json')
+    ttl = RESPUESTAS_TTL if ttl is None else ttl
+    if not _fresco(path, ttl):
+        with bloqueo_cache(f'respuesta_{clave}', bloqueante=not os.path.exists(path)) as obtenido:
+            if obtenido and not _fresco(path, ttl):
+                temporal = f'{path}.{os.getpid()}.{threading.get_ident()}'
+                datos = generar()
+                with medir_etapa('json_serializacion'):
+                    sumar_bytes('json_serializacion', serializacion.guardar(datos, temporal))
+                os.replace(temporal, path)
+    with open(path, 'rb') as f:
+        return Response(f.read(), mimetype='application/json')
+
+# --- Métricas compartidas entre workers ---
+# Cada worker tiene su registry en memoria; para que /metrics no dependa de qué worker atiende el scrape (y los
+# contadores no salten), cada uno vuelca su instantánea en METRICAS_DIR/<pid>_<id>.json y /metrics suma todas.
+# Las de workers que ya terminaron (reciclados por max_requests o reiniciados) se acumulan en finalizados.json
+# para que los contadores no retrocedan. El directorio se vacía al arrancar el servidor (gunicorn.conf.py).
+METRICAS_DIR = os.path.join(CACHE_DIR, 'metricas')
+METRICAS_INTERVALO = 5  # segundos entre volcados de cada worker
+os.makedirs(METRICAS_DIR, exist_ok=True)
+_metricas_proceso = {}
+
+def _archivo_metricas():
+    """Archivo de este proceso (el id distingue a un worker nuevo que reutiliza el pid de uno terminado)"""
+    pid = os.getpid()
+    if pid not in _metricas_proceso:
+        import uuid
+        _metricas_proceso.clear()
+        _metricas_proceso[pid] = {'path': os.path.join(METRICAS_DIR, f'{pid}_{uuid.uuid4().hex[:8]}.json'), 'volcado': 0.0}
+    return _metricas_proceso[pid]
+
+def volcar_metricas(forzar=True):
+    """Escribe la instantánea del registry de este worker (sin forzar, como mucho cada METRICAS_INTERVALO)"""
+    archivo = _archivo_metricas()
+    if not forzar and time.monotonic() - archivo['volcado'] < METRICAS_INTERVALO:
+        return
+    archivo['volcado'] = time.monotonic()
+    temporal = f"{archivo['path']}.{threading.get_ident()}.tmp"
+    serializacion.guardar(registry.instantanea(), temporal)
+    os.replace(temporal, archivo['path'])
+
+def _proceso_vivo(pid):
+    if pid == os.getpid():
+        return True
+    if fcntl is None:  # Windows: os.kill(pid, 0) no es una consulta; en desarrollo hay un solo proceso
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def metricas_combinadas():
+    """Registry con la suma de todos los workers (vivos y terminados)"""
+    from metrics import MetricsRegistry
+    volcar_metricas()
+    combinado = MetricsRegistry()
+    finalizados = os.path.join(METRICAS_DIR, 'finalizados.json')
+    with bloqueo_cache('metricas'):
+        terminados = []
+        for nombre in os.listdir(METRICAS_DIR):
+            if not re.fullmatch(r'\d+_[0-9a-f]+\.json', nombre):
+                continue
+            path = os.path.join(METRICAS_DIR, nombre)
+            try:
+                instantanea = serializacion.cargar(path)
+            except (OSError, ValueError):
+                continue
+            combinado.combinar(instantanea)
+            if not _proceso_vivo(int(nombre.split('_')[0])):
+                terminados.append((path, instantanea))
+        acumulado = serializacion.cargar(finalizados) if os.path.exists(finalizados) else {}
+        combinado.combinar(acumulado)
+        if terminados:
+            # Se pliegan en finalizados.json bajo el mismo lock: ningún lector los cuenta dos veces
+            compactado = MetricsRegistry()
+            compactado.combinar(acumulado)
+            for _, instantanea in terminados:
+                compactado.combinar(instantanea)
+            temporal = f'{finalizados}.{os.getpid()}.tmp'
+            serializacion.guardar(compactado.instantanea(), temporal)
+            os.replace(temporal, finalizados)
+            for path, _ in terminados:
+                os.remove(path)
+    return combinado
 
 # --- Endpoints de la API ---
 
@@ -67,21 +370,25 @@ def home():
     return jsonify({
         'status': 'ok',
         'service': 'BORA Analysis API',
-        'endpoints_disponibles': ['/api/stats', '/api/medidas', '/api/patrones']
+        'endpoints_disponibles': ['/api/stats', '/api/medidas', '/api/buscar', '/api/entidades', '/api/entidades/medidas', '/api/citas', '/api/series', '/api/patrones', '/api/novedades', '/api/novedades/stream', '/api/trabajos', '/metrics']
     })
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
-    """Devuelve estadísticas básicas del almacenamiento."""
-    try:
-        raw_files = list_hostinger_files('raw')
-        analyzed_files = list_hostinger_files('analyzed')
+    """Devuelve estadísticas básicas del almacenamiento (cacheadas BORA_API_CACHE_TTL segundos)."""
+    def generar():
+        conteos = contar_medidas()
         
-        return jsonify({
-            'total_medidas_raw': len(raw_files),
-            'total_medidas_analizadas': len(analyzed_files),
-            'medidas_pendientes_analisis': len(raw_files) - len(analyzed_files)
-        })
+        # Estadísticas de todo el corpus, mantenidas incrementalmente por el BatchAnalyzer
+        agregados = download_json_from_hostinger('estado/agregados.json')
+        estadisticas_corpus = None
+        if agregados:
+            from aggregate_stats import AggregateStats
+            estadisticas_corpus = AggregateStats.from_dict(agregados).resumen()
+        
+        return dict(conteos, estadisticas_corpus=estadisticas_corpus)
+    try:
+        return respuesta_cacheada('stats', generar)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -89,40 +396,475 @@ def get_stats():
 def get_medidas():
     """Devuelve una lista de las últimas medidas analizadas."""
     try:
-        # El parámetro 'limit' permite que el dashboard pida, por ej., solo las 50 más nuevas
-        limit = int(request.args.get('limit', 50))
-        
-        files = list_hostinger_files('analyzed')
-        # Ordenamos para devolver las más recientes primero (asumiendo nombres de archivo secuenciales)
-        files.sort(reverse=True)
-        files_to_fetch = files[:limit]
+        # El parámetro 'limit' permite que el dashboard pida, por ej., solo las 50 más nuevas. Acotado como en
+        # _parametros_paginado: cada valor distinto es un archivo de caché y una tanda de descargas FTP
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+    except ValueError:
+        return jsonify({'error': "'limit' debe ser un entero"}), 400
+    try:
+        def generar():
+            files = list_hostinger_files('analyzed')
+            # Ordenamos para devolver las más recientes primero (asumiendo nombres de archivo secuenciales)
+            files.sort(reverse=True)
+            files_to_fetch = files[:limit]
+            
+            medidas = []
+            for filename in files_to_fetch:
+                if filename.endswith(".json"): # Ignorar otros posibles archivos
+                    local_path = download_from_hostinger(f'analyzed/{filename}')
+                    if local_path:
+                        medidas.append(serializacion.cargar(local_path))
+                        os.remove(local_path) # Limpiar el temporal
+            return {'total_encontrado': len(medidas), 'medidas': medidas}
         
-        medidas = []
-        for filename in files_to_fetch:
-            if filename.endswith(".json"): # Ignorar otros posibles archivos
-                local_path = download_from_hostinger(f'analyzed/{filename}')
-                if local_path:
-                    with open(local_path, 'r', encoding='utf-8') as f:
-                        medidas.append(json.load(f))
-                    os.remove(local_path) # Limpiar el temporal
-
-        return jsonify({'total_encontrado': len(medidas), 'medidas': medidas})
+        # Todos los workers comparten la misma respuesta por `limit` durante BORA_API_CACHE_TTL segundos
+        return respuesta_cacheada(f'medidas_{limit}', generar)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/buscar', methods=['GET'])
+def buscar_medidas():
+    """Búsqueda de texto completo rankeada: ?q=...&desde=AAAA-MM-DD&hasta=AAAA-MM-DD&pagina=1&por_pagina=20
+
+    q admite "frases exactas", prefijos (design*) y OR; los términos sueltos se combinan con AND.
+    """
+    from indice_busqueda import IndiceBusqueda
+    consulta = request.args.get('q', '').strip()
+    if not consulta:
+        return jsonify({'error': "Falta el parámetro 'q'"}), 400
+    try:
+        pagina = max(int(request.args.get('pagina', 1)), 1)
+        por_pagina = min(max(int(request.args.get('por_pagina', 20)), 1), 100)
+    except ValueError:
+        return jsonify({'error': "'pagina' y 'por_pagina' deben ser enteros"}), 400
+
+    path = estado_local(IndiceBusqueda.ARCHIVO)
+    if not path:
+        return jsonify({'error': 'El índice de búsqueda todavía no fue generado'}), 503
+    try:
+        conn = IndiceBusqueda.solo_lectura(path)
+        try:
+            with medir_etapa('busqueda'):
+                resultado = IndiceBusqueda.buscar(conn, consulta, request.args.get('desde'),
+                                                  request.args.get('hasta'), pagina, por_pagina)
+        finally:
+            conn.close()
+        return jsonify(resultado)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Este endpoint es más avanzado y lo usaremos en el futuro.
-# Inicia un análisis de patrones a demanda.
-@app.route('/api/patrones', methods=['POST'])
+def _parametros_paginado(limite_por_defecto=50, maximo=500):
+    pagina = max(int(request.args.get('pagina', 1)), 1)
+    limite = min(max(int(request.args.get('limite', limite_por_defecto)), 1), maximo)
+    return pagina, limite
+
+@app.route('/api/entidades', methods=['GET'])
+def listar_entidades():
+    """Organismos, referencias normativas o autoridades más mencionados: ?tipo=entidad&q=prefijo&limite=50"""
+    from indice_entidades import IndiceEntidades, TIPOS
+    tipo = request.args.get('tipo')
+    if tipo and tipo not in TIPOS:
+        return jsonify({'error': f"'tipo' debe ser uno de: {', '.join(TIPOS)}"}), 400
+    try:
+        _, limite = _parametros_paginado()
+        indice = estado_cargado(IndiceEntidades.ARCHIVO, IndiceEntidades.cargar)
+        if indice is None:
+            return jsonify({'error': 'El índice de entidades todavía no fue generado'}), 503
+        return jsonify({'terminos': indice.terminos_frecuentes(tipo, request.args.get('q', ''), limite),
+                        'indice': indice.resumen()})
+    except ValueError:
+        return jsonify({'error': "'limite' debe ser un entero"}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/entidades/medidas', methods=['GET'])
+def medidas_por_entidad():
+    """Medidas que mencionan un término: ?tipo=entidad&nombre=Ministerio de Economía&desde=&hasta=&pagina=&limite="""
+    from indice_entidades import IndiceEntidades, TIPOS
+    tipo = request.args.get('tipo', 'entidad')
+    nombre = request.args.get('nombre', '').strip()
+    if tipo not in TIPOS or not nombre:
+        return jsonify({'error': f"Se requiere 'nombre' y un 'tipo' válido ({', '.join(TIPOS)})"}), 400
+    try:
+        pagina, limite = _parametros_paginado()
+        indice = estado_cargado(IndiceEntidades.ARCHIVO, IndiceEntidades.cargar)
+        if indice is None:
+            return jsonify({'error': 'El índice de entidades todavía no fue generado'}), 503
+        with medir_etapa('consulta_entidades'):
+            resultado = indice.medidas(tipo, nombre, request.args.get('desde'), request.args.get('hasta'),
+                                       limite, pagina)
+        if resultado is None:
+            return jsonify({'tipo': tipo, 'termino': nombre, 'total': 0, 'pagina': pagina, 'medidas': []})
+        return jsonify(resultado)
+    except ValueError:
+        return jsonify({'error': "'pagina' y 'limite' deben ser enteros"}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/citas', methods=['GET'])
+def citas_normativas():
+    """Recorrido del grafo de citas: ?norma=Decreto 50/2019&direccion=entrantes|salientes&profundidad=1&relacion=modifica
+
+    'entrantes' = qué medidas citan a la norma (con profundidad N, también las que citan a esas);
+    'salientes' = qué normas cita / modifica / deroga / prorroga. 'relacion' admite varias separadas por coma.
+    """
+    from grafo_citas import GrafoCitas, RELACIONES, PROFUNDIDAD_MAXIMA
+    norma = request.args.get('norma', '').strip()
+    direccion = request.args.get('direccion', 'entrantes')
+    relaciones = [r for r in request.args.get('relacion', '').split(',') if r]
+    if not norma or direccion not in ('entrantes', 'salientes') or any(r not in RELACIONES for r in relaciones):
+        return jsonify({'error': "Se requiere 'norma'; 'direccion' es entrantes o salientes y "
+                                 f"'relacion' una de: {', '.join(RELACIONES)}"}), 400
+    try:
+        profundidad = int(request.args.get('profundidad', 1))
+        _, limite = _parametros_paginado(limite_por_defecto=500, maximo=5000)
+    except ValueError:
+        return jsonify({'error': "'profundidad' y 'limite' deben ser enteros"}), 400
+    if not 1 <= profundidad <= PROFUNDIDAD_MAXIMA:
+        return jsonify({'error': f"'profundidad' debe estar entre 1 y {PROFUNDIDAD_MAXIMA}"}), 400
+    try:
+        grafo = estado_cargado(GrafoCitas.ARCHIVO, GrafoCitas.cargar)
+        if grafo is None:
+            return jsonify({'error': 'El grafo de citas todavía no fue generado'}), 503
+        with medir_etapa('consulta_citas'):
+            resultado = grafo.recorrer(norma, direccion, profundidad, relaciones or None, limite)
+        if resultado is None:
+            return jsonify({'error': f"La norma '{norma}' no aparece en el grafo"}), 404
+        return jsonify(resultado)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/series', methods=['GET'])
+def series_temporales():
+    """Series materializadas para los gráficos: ?granularidad=dia|semana|mes&desde=&hasta=&metricas=riesgo,categoria,transparencia"""
+    from rollups import RollupsTemporales, GRANULARIDADES, METRICAS
+    granularidad = request.args.get('granularidad', 'dia')
+    metricas = [m for m in request.args.get('metricas', '').split(',') if m]
+    if granularidad not in GRANULARIDADES or any(m not in METRICAS for m in metricas):
+        return jsonify({'error': f"'granularidad' es una de: {', '.join(GRANULARIDADES)}; "
+                                 f"'metricas' una o más de: {', '.join(METRICAS)}"}), 400
+    try:
+        rollups = estado_cargado(RollupsTemporales.ARCHIVO, RollupsTemporales.cargar)
+        if rollups is None:
+            return jsonify({'error': 'Las series temporales todavía no fueron generadas'}), 503
+        periodos = rollups.serie(granularidad, request.args.get('desde'), request.args.get('hasta'), metricas or None)
+        return jsonify({'granularidad': granularidad, 'actualizado': rollups.actualizado, 'periodos': periodos})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# --- Novedades en vivo ---
+# El BatchAnalyzer publica en data/estado/novedades.json un evento por medida analizada (cada
+# BORA_NOVEDADES_INTERVALO segundos). Los workers lo refrescan de Hostinger como mucho cada BORA_NOVEDADES_TTL
+# segundos a través de la caché en disco: con cualquier cantidad de dashboards conectados, Hostinger ve una
+# descarga chica por TTL en lugar de un listado + N descargas por cada sondeo a /api/medidas.
+# Cada conexión SSE ocupa un thread de gunicorn durante BORA_SSE_DURACION segundos: BORA_API_THREADS debe
+# alcanzar para los dashboards abiertos. Al cortarse, el navegador reconecta solo con Last-Event-ID.
+NOVEDADES_TTL = int(os.getenv('BORA_NOVEDADES_TTL', 15))
+SSE_DURACION = int(os.getenv('BORA_SSE_DURACION', 300))
+SSE_SONDEO = 2
+SSE_LATIDO = 15
+SSE_LOTE = 500
+
+def _feed_novedades():
+    from novedades import FeedNovedades
+    return estado_cargado(FeedNovedades.ARCHIVO, FeedNovedades.cargar, ttl=NOVEDADES_TTL)
+
+def _ultimo_id_visto():
+    """Id del último evento recibido: header Last-Event-ID (reconexión de EventSource) o ?ultimo_id= (None si no vino)"""
+    valor = request.headers.get('Last-Event-ID') or request.args.get('ultimo_id')
+    return int(valor) if valor not in (None, '') else None
+
+def _evento_sse(tipo, datos, id_evento=None):
+    lineas = [f'id: {id_evento}'] if id_evento is not None else []
+    lineas += [f'event: {tipo}', f"data: {serializacion.dumps(datos, pretty=False).decode('utf-8')}"]
+    return '\n'.join(lineas) + '\n\n'
+
+@app.route('/api/novedades', methods=['GET'])
+def listar_novedades():
+    """Medidas analizadas después de un evento: ?ultimo_id=123&limite=100 (sin ultimo_id, las más recientes)"""
+    try:
+        ultimo_visto = _ultimo_id_visto()
+        _, limite = _parametros_paginado(limite_por_defecto=100, maximo=500)
+    except ValueError:
+        return jsonify({'error': "'ultimo_id' y 'limite' deben ser enteros"}), 400
+    try:
+        feed = _feed_novedades()
+        if feed is None:
+            return jsonify({'ultimo_id': 0, 'perdidos': False, 'eventos': []})
+        eventos, perdidos = feed.posteriores(ultimo_visto, limite)
+        return jsonify({'ultimo_id': feed.ultimo_id, 'perdidos': perdidos, 'actualizado': feed.actualizado,
+                        'eventos': eventos})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/novedades/stream', methods=['GET'])
+def stream_novedades():
+    """Server-Sent Events con cada medida nueva (event: medida, id = id del evento).
+
+    Al conectar se envía 'conectado' con el id actual; con Last-Event-ID (o ?ultimo_id=) se reenvía lo que
+    faltó. Si el feed ya descartó eventos posteriores a ese id se envía 'resincronizar' antes de los
+    retenidos: el cliente debe recargar /api/medidas.
+    """
+    try:
+        ultimo_visto = _ultimo_id_visto()
+    except ValueError:
+        return jsonify({'error': "'Last-Event-ID' / 'ultimo_id' debe ser un entero"}), 400
+
+    def generar():
+        ultimo = ultimo_visto
+        fin = time.monotonic() + SSE_DURACION
+        yield f'retry: {int(SSE_SONDEO * 1000)}\n\n'
+        ultimo_envio = time.monotonic()
+        while time.monotonic() < fin:
+            try:
+                feed = _feed_novedades()
+            except Exception as e:
+                print(f"API Error (stream_novedades): {e}")
+                feed = None
+            if ultimo is None:
+                # Conexión nueva: se arranca desde el presente, pero con un id para poder retomar
+                ultimo = feed.ultimo_id if feed else 0
+                yield _evento_sse('conectado', {'ultimo_id': ultimo}, ultimo)
+                ultimo_envio = time.monotonic()
+            elif feed is not None:
+                eventos, perdidos = feed.posteriores(ultimo, SSE_LOTE)
+                if perdidos:
+                    registry.sumar('bora_sse_resincronizaciones_total', 1, 'Clientes SSE que perdieron eventos')
+                    yield _evento_sse('resincronizar', {'ultimo_id': feed.ultimo_id,
+                                                        'primer_id_retenido': eventos[0]['id'] if eventos else None})
+                for evento in eventos:
+                    yield _evento_sse('medida', evento, evento['id'])
+                if eventos:
+                    ultimo = eventos[-1]['id']
+                    ultimo_envio = time.monotonic()
+                    registry.sumar('bora_sse_eventos_total', len(eventos), 'Eventos de novedades enviados por SSE')
+                elif perdidos:
+                    ultimo = feed.ultimo_id
+                if len(eventos) >= SSE_LOTE:
+                    continue
+            if time.monotonic() - ultimo_envio >= SSE_LATIDO:
+                yield ': latido\n\n'  # comentario SSE: mantiene viva la conexión a través de proxies
+                ultimo_envio = time.monotonic()
+            time.sleep(SSE_SONDEO)
+
+    return Response(generar(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- Trabajos en segundo plano ---
+# Lo que tarda más que un listado (exportaciones, re-análisis con Gemini) se encola: el POST responde 202
+# con el id del trabajo y el cliente consulta /api/trabajos/<id> hasta que termina.
+
+_cola = None
+_cola_lock = threading.Lock()
+
+def get_cola():
+    """Cola de trabajos con sus workers, creada en el primer uso."""
+    global _cola
+    if _cola is None:
+        with _cola_lock:
+            if _cola is None:
+                from trabajos import ColaTrabajos
+                cola = ColaTrabajos()
+                cola.registrar('exportar', trabajo_exportar)
+                cola.registrar('reanalisis', trabajo_reanalisis)
+                _cola = cola.iniciar()
+    return _cola
+
+CAMPOS_EXPORTACION = ('clave', 'numero_medida', 'fecha_boletin', 'titulo', 'categoria_emergente',
+                      'nivel_riesgo_democratico', 'nivel_transparencia', 'modo_analisis')
+
+def trabajo_exportar(parametros, avance):
+    """Exporta los análisis de un rango de fechas (sin embeddings) a JSONL o CSV en data/exportaciones."""
+    import csv
+    from rollups import RollupsTemporales
+    desde, hasta, formato = parametros.get('desde') or '', parametros.get('hasta') or '9999', parametros['formato']
+    avance(0, 'Buscando medidas del rango')
+    rollups = download_json_from_hostinger(f'estado/{RollupsTemporales.ARCHIVO}')
+    if rollups is None:
+        raise RuntimeError('No hay series temporales: no se puede resolver el rango de fechas')
+    claves = sorted(c for c, aporte in rollups.get('aportes', {}).items() if desde <= aporte[0][:10] <= hasta)
+
+    nombre = f"exportacion_{parametros['id_exportacion']}.{formato}"
+    local_path = os.path.join(tempfile.gettempdir(), nombre)
+    exportadas = 0
+    try:
+        with open(local_path, 'w', encoding='utf-8', newline='') as f:
+            escritor = csv.DictWriter(f, fieldnames=CAMPOS_EXPORTACION) if formato == 'csv' else None
+            if escritor:
+                escritor.writeheader()
+            for i, clave in enumerate(claves, 1):
+                analisis = download_json_from_hostinger(f'analyzed/{clave}_analysis_agnostic.json')
+                if analisis:
+                    analisis.pop('embeddings', None)
+                    if escritor:
+                        escritor.writerow({
+                            'clave': clave,
+                            'numero_medida': analisis.get('numero_medida'),
+                            'fecha_boletin': analisis.get('fecha_boletin'),
+                            'titulo': analisis.get('analisis_literal', {}).get('titulo_raw'),
+                            'categoria_emergente': analisis.get('analisis_semantico', {}).get('categoria_emergente'),
+                            'nivel_riesgo_democratico': analisis.get('analisis_abogado_diablo', {}).get('nivel_riesgo_democratico'),
+                            'nivel_transparencia': analisis.get('analisis_critico', {}).get('nivel_transparencia'),
+                            'modo_analisis': analisis.get('metadatos_analisis', {}).get('modo_analisis'),
+                        })
+                    else:
+                        f.write(serializacion.dumps(dict(analisis, clave=clave), pretty=False).decode('utf-8') + '\n')
+                    exportadas += 1
+                if i % 20 == 0 or i == len(claves):
+                    avance(0.95 * i / len(claves), f'{i}/{len(claves)} análisis leídos')
+        avance(0.95, 'Subiendo la exportación')
+        # Plana: se descarga y abre fuera del pipeline
+        upload_to_hostinger(local_path, 'data/exportaciones', formato='none')
+    finally:
+        if os.path.exists(local_path):
+            os.remove(local_path)
+    return {'archivo': nombre, 'url': f'/api/exportaciones/{nombre}', 'medidas': exportadas,
+            'desde': parametros.get('desde'), 'hasta': parametros.get('hasta')}
+
+REANALISIS_LATIDO = 30
+
+def trabajo_reanalisis(parametros, avance):
+    """Re-analiza una medida completa (Gemini + embeddings) en un proceso aparte (analyzer.reanalizar).
+
+    El proceso reemplaza el análisis en Hostinger, actualiza los estados derivados (búsqueda, entidades, citas,
+    agregados...) y el manifest, y termina: el worker web no carga torch ni el encoder. Los workers ven los
+    estados nuevos al vencer su copia local (BORA_ESTADO_TTL), como después de un batch.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, TimeoutError as TimeoutFuturo
+    from analyzer import reanalizar
+    avance(0.05, 'Re-analizando en un proceso aparte')
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futuro = pool.submit(reanalizar, parametros['clave'])
+        while True:
+            try:
+                resultado = futuro.result(timeout=REANALISIS_LATIDO)
+                break
+            except TimeoutFuturo:
+                avance(0.1)  # latido: el trabajo sigue vivo mientras el proceso trabaja
+    return resultado
+
+def _respuesta_encolado(id_trabajo):
+    respuesta = jsonify({'id': id_trabajo, 'estado': 'pendiente', 'url_estado': f'/api/trabajos/{id_trabajo}'})
+    respuesta.status_code = 202
+    respuesta.headers['Location'] = f'/api/trabajos/{id_trabajo}'
+    return respuesta
+
+@app.route('/api/trabajos/exportar', methods=['POST'])
+def encolar_exportacion():
+    """Body JSON: {"desde": "AAAA-MM-DD", "hasta": "AAAA-MM-DD", "formato": "jsonl"|"csv"} -> 202 + id"""
+    import uuid
+    datos = request.get_json(silent=True) or {}
+    formato = datos.get('formato', 'jsonl')
+    if formato not in ('jsonl', 'csv'):
+        return jsonify({'error': "'formato' debe ser jsonl o csv"}), 400
+    parametros = {'desde': datos.get('desde'), 'hasta': datos.get('hasta'), 'formato': formato,
+                  'id_exportacion': uuid.uuid4().hex[:12]}
+    return _respuesta_encolado(get_cola().encolar('exportar', parametros))
+
+@app.route('/api/trabajos/reanalisis', methods=['POST'])
+def encolar_reanalisis():
+    """Body JSON: {"clave": "medida_300720_20231211"} -> 202 + id"""
+    clave = str((request.get_json(silent=True) or {}).get('clave', '')).strip()
+    if not re.fullmatch(r'medida_\d+_\d{8}', clave):
+        return jsonify({'error': "'clave' debe tener la forma medida_<numero>_<AAAAMMDD>"}), 400
+    return _respuesta_encolado(get_cola().encolar('reanalisis', {'clave': clave}))
+
+@app.route('/api/trabajos', methods=['GET'])
+def listar_trabajos():
+    """Trabajos recientes: ?estado=pendiente|en_curso|completado|error&limite=50"""
+    from trabajos import ESTADOS
+    estado = request.args.get('estado')
+    if estado and estado not in ESTADOS:
+        return jsonify({'error': f"'estado' debe ser uno de: {', '.join(ESTADOS)}"}), 400
+    try:
+        _, limite = _parametros_paginado(limite_por_defecto=50, maximo=500)
+    except ValueError:
+        return jsonify({'error': "'limite' debe ser un entero"}), 400
+    return jsonify({'trabajos': get_cola().listar(estado, limite)})
+
+@app.route('/api/trabajos/<id_trabajo>', methods=['GET'])
+def estado_trabajo(id_trabajo):
+    trabajo = get_cola().estado(id_trabajo)
+    if trabajo is None:
+        return jsonify({'error': 'Trabajo inexistente'}), 404
+    return jsonify(trabajo)
+
+@app.route('/api/trabajos/<id_trabajo>/resultado', methods=['GET'])
+def resultado_trabajo(id_trabajo):
+    """200 con el resultado si terminó, 202 si sigue en cola o en curso, 500 si falló"""
+    trabajo = get_cola().estado(id_trabajo, con_resultado=True)
+    if trabajo is None:
+        return jsonify({'error': 'Trabajo inexistente'}), 404
+    if trabajo['estado'] == 'error':
+        return jsonify({'id': id_trabajo, 'estado': 'error', 'error': trabajo['error']}), 500
+    if trabajo['estado'] != 'completado':
+        return jsonify({'id': id_trabajo, 'estado': trabajo['estado'], 'progreso': trabajo['progreso']}), 202
+    return jsonify({'id': id_trabajo, 'estado': 'completado', 'resultado': trabajo['resultado']})
+
+@app.route('/api/exportaciones/<nombre>', methods=['GET'])
+def descargar_exportacion(nombre):
+    """Descarga un archivo generado por un trabajo 'exportar'"""
+    if not re.fullmatch(r'exportacion_[0-9a-f]{12}\.(jsonl|csv)', nombre):
+        return jsonify({'error': 'Nombre de exportación inválido'}), 400
+    local_path = download_from_hostinger(f'exportaciones/{nombre}')
+    if not local_path:
+        return jsonify({'error': 'Exportación inexistente'}), 404
+    try:
+        with open(local_path, 'rb') as f:
+            contenido = f.read()
+    finally:
+        os.remove(local_path)
+    mimetype = 'text/csv' if nombre.endswith('.csv') else 'application/x-ndjson'
+    return Response(contenido, mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename={nombre}'})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas de todos los workers (latencias por etapa y endpoint, bytes) en formato de texto Prometheus."""
+    return Response(metricas_combinadas().prometheus(), mimetype='text/plain; version=0.0.4')
+
+# Los patrones los calcula el BatchAnalyzer (k-means incremental sobre los embeddings y, opcionalmente,
+# etiquetas de Gemini cacheadas): el endpoint sólo lee ese estado, nunca llama a Gemini por request.
+@app.route('/api/patrones', methods=['GET', 'POST'])
 def detectar_patrones():
-    # Por ahora, devolvemos una respuesta de ejemplo
-    # En el futuro, este endpoint ejecutará la lógica de IA para detectar patrones
-    return jsonify({
-        "status": "endpoint_en_desarrollo",
-        "descripcion": "Este endpoint activará el análisis de patrones con IA en el futuro."
-    })
+    """Patrones detectados: ?tamanio_minimo=5&ejemplos=5&limite=50 (también acepta esos campos en un body JSON)"""
+    from patrones import MotorPatrones
+    parametros = dict(request.args)
+    if request.method == 'POST':
+        parametros.update(request.get_json(silent=True) or {})
+    try:
+        tamanio_minimo = int(parametros.get('tamanio_minimo', 1))
+        ejemplos = min(int(parametros.get('ejemplos', 5)), 50)
+        limite = min(int(parametros.get('limite', 50)), 500)
+    except (TypeError, ValueError):
+        return jsonify({'error': "'tamanio_minimo', 'ejemplos' y 'limite' deben ser enteros"}), 400
+    try:
+        motor = estado_cargado(MotorPatrones.ARCHIVO, MotorPatrones.cargar)
+        if motor is None:
+            return jsonify({'error': 'Los patrones todavía no fueron calculados'}), 503
+        resumen = motor.resumen(tamanio_minimo, ejemplos)
+        resumen['patrones'] = resumen['patrones'][:limite]
+        return jsonify(resumen)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def cerrar_recursos(espera=None):
+    """Apagado ordenado del worker: los trabajos en curso terminan (o vuelven a la cola por abandono)."""
+    if _cola is not None:
+        _cola.cerrar(espera if espera is not None else int(os.getenv('BORA_API_GRACEFUL_TIMEOUT', 30)))
+        print("✓ API: cola de trabajos detenida.")
+    try:
+        volcar_metricas()
+    except OSError as e:
+        print(f"✗ API: no se pudieron volcar las métricas del worker: {e}")
 
 # --- Ejecución del Servidor ---
+# `python api.py` levanta el servidor de desarrollo de Flask. En producción: gunicorn -c src/gunicorn.conf.py wsgi:app
 if __name__ == '__main__':
+    import shutil
+    shutil.rmtree(METRICAS_DIR, ignore_errors=True)  # las de corridas anteriores no son de este servidor
+    os.makedirs(METRICAS_DIR, exist_ok=True)
+    arranque()
     # Render usa la variable de entorno PORT para saber en qué puerto ejecutar la app
     port = int(os.environ.get('PORT', 10000))
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+import ftplib
+import argparse
+import multiprocessing
+from datetime import datetime
+import serializacion
+
+FTP_HOST = "ftp.agoraenlared.com"
+FTP_USER = "u112219758.boria"
+FTP_PASS = os.getenv('HOSTINGER_FTP_PASSWORD', "Marta1664?")
+
+# Estado por worker (un modelo y una conexión FTP por proceso)
+_analyzer = None
+_ftp = None
+_origen_dir = None
+
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
+    sys.stdout.flush()
+
+
+def conectar_ftp():
+    ftp = ftplib.FTP()
+    ftp.connect(FTP_HOST, 21, timeout=120)
+    ftp.login(FTP_USER, FTP_PASS)
+    ftp.set_pasv(True)
+    ftp.cwd('data/raw')
+    return ftp
+
+
+def listar_medidas(origen_dir=None):
+    if origen_dir:
+        return sorted(f for f in os.listdir(origen_dir) if f.endswith('.json'))
+    ftp = conectar_ftp()
+    archivos = sorted(f for f in ftp.nlst() if f.endswith('.json'))
+    ftp.quit()
+    return archivos
+
+
+def _inicializar_worker(backend, hilos, origen_dir):
+    """Limita hilos ANTES de cargar torch/onnxruntime para no sobresuscribir la CPU entre procesos"""
+    global _analyzer, _origen_dir
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'BORA_ONNX_HILOS'):
+        os.environ[var] = str(hilos)
+    os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+    if backend == 'pytorch':
+        import torch
+        torch.set_num_threads(hilos)
+        torch.set_num_interop_threads(1)
+
+    from analyzer import TripleAnalyzerAgnostic
+    _analyzer = TripleAnalyzerAgnostic(encoder_backend=backend)
+    _analyzer.encoder
+    _origen_dir = origen_dir
+
+
+def _leer_medida(archivo):
+    global _ftp
+    if _origen_dir:
+        return serializacion.cargar(os.path.join(_origen_dir, archivo))
+
+    for intento in range(3):
+        try:
+            if _ftp is None:
+                _ftp = conectar_ftp()
+            partes = []
+            _ftp.retrbinary(f'RETR {archivo}', partes.append)
+            return serializacion.loads(b''.join(partes))
+        except (ftplib.error_temp, ftplib.error_reply, OSError, EOFError):
+            # Conexión caída: reconectar y reintentar
+            _ftp = None
+            if intento == 2:
+                raise
+
+
+def _embeber(archivo):
+    try:
+        medida_data = _leer_medida(archivo)
+        return archivo, _analyzer.generate_embeddings_agnostic(medida_data)
+    except Exception as e:
+        return archivo, {'error': f"Error leyendo medida: {e}"}
+
+
+def cargar_hechos(salida):
+    """Archivos ya embebidos en el store; descarta una última línea truncada por una corrida interrumpida"""
+    hechos = set()
+    if not os.path.exists(salida):
+        return hechos
+    valido = 0
+    with open(salida, 'rb') as f:
+        for linea in f:
+            try:
+                hechos.add(serializacion.loads(linea)['archivo'])
+            except (ValueError, KeyError):
+                break
+            valido += len(linea)
+    if valido < os.path.getsize(salida):
+        with open(salida, 'r+b') as f:
+            f.truncate(valido)
+    return hechos
+
+
+def backfill(salida, workers=None, hilos=None, backend=None, origen_dir=None, chunksize=4, limite=None):
+    """Re-embebe el corpus con un pool de procesos; escribe en orden en un JSONL y permite reanudar"""
+    workers = workers or os.cpu_count() or 1
+    hilos = hilos or max(1, (os.cpu_count() or 1) // workers)
+    backend = backend or os.getenv('BORA_ENCODER_BACKEND', 'pytorch')
+
+    archivos = listar_medidas(origen_dir)
+    hechos = cargar_hechos(salida)
+    pendientes = [a for a in archivos if a not in hechos]
+    if limite:
+        pendientes = pendientes[:limite]
+    log(f"Total: {len(archivos)} | Ya embebidas: {len(hechos)} | Pendientes: {len(pendientes)}")
+    log(f"Workers: {workers} x {hilos} hilos | Backend: {backend}")
+    if not pendientes:
+        return {'procesadas': 0, 'errores': 0}
+
+    contexto = multiprocessing.get_context('spawn')
+    procesadas = errores = 0
+    inicio = time.time()
+    with contexto.Pool(workers, initializer=_inicializar_worker, initargs=(backend, hilos, origen_dir)) as pool, \
+            open(salida, 'ab') as out:
+        # imap conserva el orden de entrada: el store queda ordenado igual que el listado
+        for archivo, embeddings in pool.imap(_embeber, pendientes, chunksize=chunksize):
+            if 'error' in embeddings:
+                # No se escribe: se reintenta en la próxima corrida
+                errores += 1
+                log(f"Error {archivo}: {str(embeddings['error'])[:80]}")
+            else:
+                out.write(serializacion.dumps({'archivo': archivo, 'embeddings': embeddings}, pretty=False) + b'\n')
+                procesadas += 1
+
+            if (procesadas + errores) % 100 == 0:
+                out.flush()
+                os.fsync(out.fileno())
+                elapsed = time.time() - inicio
+                log(f"{procesadas + errores}/{len(pendientes)} ({(procesadas + errores) / elapsed:.1f} medidas/s) Err:{errores}")
+
+    elapsed = time.time() - inicio
+    log(f"Completado: {procesadas} embebidas, {errores} errores en {elapsed:.1f}s "
+        f"({procesadas / elapsed if elapsed else 0:.1f} medidas/s)")
+    return {'procesadas': procesadas, 'errores': errores, 'segundos': round(elapsed, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill de embeddings del corpus con un pool de procesos')
+    parser.add_argument('--salida', default='embeddings_backfill.jsonl', help='Store JSONL de salida (se reanuda si existe)')
+    parser.add_argument('--workers', type=int, help='Procesos (default: cantidad de CPUs)')
+    parser.add_argument('--hilos', type=int, help='Hilos por worker (default: CPUs / workers)')
+    parser.add_argument('--backend', choices=['pytorch', 'onnx'], help='Backend del encoder')
+    parser.add_argument('--origen-dir', help='Leer medidas raw de un directorio local en vez de Hostinger')
+    parser.add_argument('--chunksize', type=int, default=4)
+    parser.add_argument('--limite', type=int, help='Máximo de medidas a procesar en esta corrida')
+    args = parser.parse_args()
+
+    backfill(args.salida, args.workers, args.hilos, args.backend, args.origen_dir, args.chunksize, args.limite)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import os
+import sys
+import time
+import glob
+import random
+import resource
+import argparse
+import multiprocessing
+
+import serializacion
+from encoder_backends import crear_encoder, exportar_onnx, verificar_paridad, ONNX_DIR_DEFAULT
+
+FRASES = [
+    "VISTO el Expediente y CONSIDERANDO que resulta necesario adecuar la normativa vigente",
+    "Desígnase con carácter transitorio al titular de la Dirección Nacional de Administración",
+    "Prorrógase por CIENTO OCHENTA días hábiles la designación transitoria",
+    "El gasto que demande el cumplimiento de la presente medida será atendido con las partidas específicas",
+    "Apruébase el reglamento que como Anexo forma parte integrante de la presente resolución",
+    "Comuníquese, publíquese, dése a la DIRECCIÓN NACIONAL DEL REGISTRO OFICIAL y archívese",
+]
+
+
+def textos_de_prueba(cantidad, medidas_dir=None):
+    """Textos reales (texto_completo_limpio de JSON locales) o sintéticos con longitudes variadas"""
+    textos = []
+    if medidas_dir:
+        for path in sorted(glob.glob(os.path.join(medidas_dir, '*.json')))[:cantidad]:
+            texto = serializacion.cargar(path).get('texto_completo_limpio', '')
+            if texto:
+                textos.append(texto)
+    rng = random.Random(42)
+    while len(textos) < cantidad:
+        textos.append(' '.join(rng.choice(FRASES) for _ in range(rng.randint(1, 30))))
+    return textos
+
+
+def _medir_backend(backend, textos, batch_size, hilos, cola):
+    inicio = time.perf_counter()
+    kwargs = {'hilos': hilos} if backend == 'onnx' and hilos else {}
+    encoder = crear_encoder(backend, **kwargs)
+    carga = time.perf_counter() - inicio
+
+    encoder.encode(textos[:2])  # warm-up
+    inicio = time.perf_counter()
+    encoder.encode(textos, batch_size=batch_size)
+    duracion = time.perf_counter() - inicio
+
+    cola.put({
+        'backend': backend,
+        'segundos_carga': round(carga, 3),
+        'segundos_encode': round(duracion, 3),
+        'textos_por_segundo': round(len(textos) / duracion, 2),
+        'rss_max_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    })
+
+
+def benchmark(backends, textos, batch_size=32, hilos=None):
+    """Corre cada backend en un proceso nuevo para que el RSS medido no se contamine entre backends"""
+    contexto = multiprocessing.get_context('spawn')
+    resultados = []
+    for backend in backends:
+        cola = contexto.Queue()
+        proceso = contexto.Process(target=_medir_backend, args=(backend, textos, batch_size, hilos, cola))
+        proceso.start()
+        resultados.append(cola.get())
+        proceso.join()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Paridad y benchmark de backends del encoder')
+    parser.add_argument('--exportar', action='store_true', help='Exportar el modelo a ONNX (+int8) antes de medir')
+    parser.add_argument('--onnx-dir', default=os.getenv('BORA_ONNX_DIR', ONNX_DIR_DEFAULT))
+    parser.add_argument('--textos', type=int, default=256, help='Cantidad de textos a codificar')
+    parser.add_argument('--medidas-dir', help='Directorio con medidas raw JSON para usar textos reales')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--hilos', type=int, help='intra_op_num_threads para onnxruntime')
+    parser.add_argument('--tolerancia', type=float, default=0.99, help='Coseno mínimo aceptado en la paridad')
+    args = parser.parse_args()
+
+    os.environ['BORA_ONNX_DIR'] = args.onnx_dir
+    if args.exportar:
+        exportar_onnx(args.onnx_dir)
+
+    textos = textos_de_prueba(args.textos, args.medidas_dir)
+
+    print("=== PARIDAD (coseno vs PyTorch) ===")
+    referencia = crear_encoder('pytorch')
+    paridad_ok = True
+    for cuantizado in (False, True):
+        candidato = crear_encoder('onnx', cuantizado=cuantizado)
+        resultado = verificar_paridad(referencia, candidato, textos[:64], args.tolerancia)
+        paridad_ok = paridad_ok and resultado['ok']
+        print(f"{'onnx-int8' if cuantizado else 'onnx-fp32'}: {serializacion.dumps(resultado).decode('utf-8')}")
+    del referencia
+
+    print("\n=== BENCHMARK ===")
+    for cuantizado in ('0', '1'):
+        os.environ['BORA_ONNX_CUANTIZADO'] = cuantizado
+        backends = ['pytorch', 'onnx'] if cuantizado == '0' else ['onnx']
+        for r in benchmark(backends, textos, args.batch_size, args.hilos):
+            if r['backend'] == 'onnx':
+                r['backend'] = 'onnx-int8' if cuantizado == '1' else 'onnx-fp32'
+            print(serializacion.dumps(r).decode('utf-8'))
+
+    return 0 if paridad_ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,533 @@
+import os
+import sys
+import json
+import time
+import ftplib
+import random
+import shutil
+import hashlib
+import tempfile
+import resource
+import argparse
+import threading
+import contextlib
+import tracemalloc
+import multiprocessing
+from datetime import date, timedelta
+
+import serializacion
+
+ESCENARIOS = ('batch', 'censo', 'api')
+
+TIPOS = [
+    ('Resolución', 'MINISTERIO DE ECONOMÍA'),
+    ('Resolución', 'MINISTERIO DE SALUD'),
+    ('Decreto', 'PODER EJECUTIVO NACIONAL'),
+    ('Disposición', 'ADMINISTRACIÓN NACIONAL DE AVIACIÓN CIVIL'),
+    ('Resolución General', 'AGENCIA DE RECAUDACIÓN Y CONTROL ADUANERO'),
+    ('Decisión Administrativa', 'JEFATURA DE GABINETE DE MINISTROS'),
+]
+
+CONSIDERANDOS = [
+    "Que resulta necesario adecuar la normativa vigente a las nuevas necesidades de gestión.",
+    "Que la presente medida no implica erogación presupuestaria adicional.",
+    "Que el servicio jurídico permanente ha tomado la intervención de su competencia.",
+    "Que razones operativas hacen necesario cubrir transitoriamente el cargo vacante.",
+    "Que la Ley de Presupuesto autoriza las modificaciones de créditos correspondientes.",
+]
+
+ARTICULOS = [
+    "Desígnase con carácter transitorio por CIENTO OCHENTA días hábiles al titular de la Dirección.",
+    "Prorrógase la designación transitoria en los mismos términos que la original.",
+    "Apruébase el reglamento que como Anexo forma parte integrante de la presente.",
+    "El gasto que demande el cumplimiento de la presente será atendido con las partidas específicas.",
+    "Modifícase el artículo 3 del Decreto N° 50/2019 conforme el texto que se detalla.",
+]
+
+
+# --- Corpus sintético ---
+
+def medida_sintetica(numero, fecha, rng):
+    """Medida raw con la misma forma que produce el scraper (BoraScraperCore)"""
+    tipo, organismo = rng.choice(TIPOS)
+    considerandos = ' '.join(rng.choice(CONSIDERANDOS) for _ in range(rng.randint(2, 12)))
+    dispositivo = ' '.join(f"ARTÍCULO {i}° - {rng.choice(ARTICULOS)}" for i in range(1, rng.randint(2, 8)))
+    titulo = f"{organismo} {tipo} {rng.randint(1, 3000)}/{fecha.year}"
+    texto = f"{titulo} VISTO el Expediente N° EX-{fecha.year}-{numero} y CONSIDERANDO: {considerandos} " \
+            f"Por ello, RESUELVE: {dispositivo} Comuníquese, publíquese y archívese."
+    return {
+        'numero_medida': numero,
+        'fecha_boletin': fecha.isoformat(),
+        'url': f"https://www.boletinoficial.gob.ar/detalleAviso/primera/{numero}/{fecha.strftime('%Y%m%d')}",
+        'titulo_raw': titulo,
+        'texto_completo_limpio': texto,
+        'estructura_detectada': {
+            'considerandos': {'contenido': considerandos, 'longitud_caracteres': len(considerandos),
+                              'requiere_analisis_critico': True},
+            'dispositivo': {'contenido': dispositivo, 'longitud_caracteres': len(dispositivo)}
+        },
+        'contenido_html_completo': {
+            'titulo': f"<div><h1>{organismo}</h1><h2>{tipo} {rng.randint(1, 3000)}/{fecha.year}</h2></div>",
+            'cuerpo': f"<div><p>{considerandos}</p><p>{dispositivo}</p></div>"
+        },
+        'tiene_pdf': rng.random() < 0.2,
+        'pdf_urls': [],
+        'metadatos_extraidos': {'numeros_referencia': ['N° 50/2019']},
+        'elementos_detectados': [],
+        'timestamp_scraping': fecha.isoformat()
+    }
+
+
+def generar_corpus(raiz, cantidad, proporcion_duplicados=0.1, semilla=42):
+    """Escribe `cantidad` medidas en raiz/data/raw; una fracción son casi-duplicados de medidas anteriores"""
+    rng = random.Random(semilla)
+    raw_dir = os.path.join(raiz, 'data', 'raw')
+    os.makedirs(raw_dir, exist_ok=True)
+    os.makedirs(os.path.join(raiz, 'data', 'analyzed'), exist_ok=True)
+    fecha = date(2024, 1, 2)
+    medidas = []
+    for i in range(cantidad):
+        if i % 40 == 39:
+            fecha += timedelta(days=1)
+        numero = 300000 + i
+        if medidas and rng.random() < proporcion_duplicados:
+            medida = json.loads(json.dumps(rng.choice(medidas)))
+            medida['numero_medida'] = numero
+            medida['fecha_boletin'] = fecha.isoformat()
+            medida['texto_completo_limpio'] = medida['texto_completo_limpio'].replace('Expediente N°', 'Expte. N°')
+        else:
+            medida = medida_sintetica(numero, fecha, rng)
+        medidas.append(medida)
+        serializacion.guardar(medida, os.path.join(raw_dir, f"medida_{numero}_{fecha.strftime('%Y%m%d')}.json"))
+    return cantidad
+
+
+# --- Dobles de Hostinger y Gemini ---
+
+class _ConexionDatosLocal:
+    """Conexión de datos de LocalFTP.transfercmd: recv/close sobre el archivo local"""
+
+    def __init__(self, ruta):
+        self.archivo = open(ruta, 'rb')
+
+    def recv(self, cantidad):
+        return self.archivo.read(cantidad)
+
+    def close(self):
+        self.archivo.close()
+
+
+class LocalFTP:
+    """Reemplazo de ftplib.FTP sobre un directorio local, con latencia fija por comando"""
+
+    raiz = None
+    latencia = 0.0
+
+    def __init__(self, host=None, user=None, passwd=None, *args, **kwargs):
+        self.actual = self.raiz
+        if host:
+            self._esperar()
+
+    def _esperar(self):
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def _ruta(self, path):
+        base = self.raiz if path.startswith('/') else self.actual
+        ruta = os.path.normpath(os.path.join(base, path.lstrip('/')))
+        if not ruta.startswith(self.raiz):
+            raise ftplib.error_perm('550 Fuera del directorio raíz')
+        return ruta
+
+    def connect(self, *args, **kwargs):
+        self._esperar()
+
+    def login(self, *args, **kwargs):
+        self._esperar()
+
+    def set_pasv(self, valor):
+        pass
+
+    def cwd(self, path):
+        self._esperar()
+        ruta = self._ruta(path)
+        if not os.path.isdir(ruta):
+            raise ftplib.error_perm(f'550 {path}: No such directory')
+        self.actual = ruta
+
+    def pwd(self):
+        return '/' + os.path.relpath(self.actual, self.raiz).replace(os.sep, '/').lstrip('.')
+
+    def mkd(self, path):
+        self._esperar()
+        ruta = self._ruta(path)
+        if os.path.exists(ruta):
+            raise ftplib.error_perm(f'550 {path}: File exists')
+        os.makedirs(ruta)
+        return path
+
+    def nlst(self, *args):
+        self._esperar()
+        return sorted(os.listdir(self.actual))
+
+    def retrbinary(self, cmd, callback, blocksize=8192, rest=None):
+        self._esperar()
+        ruta = self._ruta(cmd.split(' ', 1)[1])
+        if not os.path.isfile(ruta):
+            raise ftplib.error_perm(f'550 {cmd}: No such file')
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(blocksize), b''):
+                callback(bloque)
+        return '226 Transfer complete'
+
+    def transfercmd(self, cmd, rest=None):
+        """Sólo RETR (lo que usa lectura_parcial.bloques_ftp para leer en streaming)"""
+        self._esperar()
+        verbo, nombre = cmd.split(' ', 1)
+        if verbo != 'RETR':
+            raise ftplib.error_perm(f'502 {verbo}: no implementado en LocalFTP')
+        ruta = self._ruta(nombre)
+        if not os.path.isfile(ruta):
+            raise ftplib.error_perm(f'550 {cmd}: No such file')
+        return _ConexionDatosLocal(ruta)
+
+    def voidresp(self):
+        return '226 Transfer complete'
+
+    def storbinary(self, cmd, fp, blocksize=8192, callback=None, rest=None):
+        self._esperar()
+        verbo, nombre = cmd.split(' ', 1)
+        with open(self._ruta(nombre), 'ab' if verbo == 'APPE' else 'wb') as f:
+            shutil.copyfileobj(fp, f, blocksize)
+        return '226 Transfer complete'
+
+    def delete(self, path):
+        self._esperar()
+        ruta = self._ruta(path)
+        if not os.path.isfile(ruta):
+            raise ftplib.error_perm(f'550 {path}: No such file')
+        os.remove(ruta)
+
+    def rename(self, origen, destino):
+        self._esperar()
+        if not os.path.exists(self._ruta(origen)):
+            raise ftplib.error_perm(f'550 {origen}: No such file')
+        os.replace(self._ruta(origen), self._ruta(destino))
+
+    def voidcmd(self, cmd):
+        self._esperar()
+        return '200 OK'
+
+    def quit(self):
+        self._esperar()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ErrorGeminiSimulado(Exception):
+    def __init__(self, code, mensaje):
+        super().__init__(f"{code} {mensaje}")
+        self.code = code
+
+
+class UsoSimulado:
+    def __init__(self, prompt_tokens, respuesta_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = respuesta_tokens
+        self.total_token_count = prompt_tokens + respuesta_tokens
+
+
+class RespuestaSimulada:
+    def __init__(self, texto, uso):
+        self.text = texto
+        self.usage_metadata = uso
+
+
+class FakeGenerativeModel:
+    """GenerativeModel determinístico: latencia configurable, errores 429/500 y JSON inválido a tasas fijas"""
+
+    def __init__(self, latencia=0.0, tasa_429=0.0, tasa_500=0.0, tasa_json_invalido=0.0, semilla=42):
+        self.latencia = latencia
+        self.tasas = (tasa_429, tasa_500, tasa_json_invalido)
+        self.rng = random.Random(semilla)
+        self.lock = threading.Lock()
+        self.llamadas = 0
+
+    def _respuesta(self, prompt):
+        # El contenido depende sólo del prompt: mismas medidas -> mismos análisis en cada corrida
+        h = int(hashlib.md5(prompt.encode('utf-8')).hexdigest(), 16)
+        if 'abogado del diablo' in prompt:
+            return {'usos_no_declarados': [], 'nivel_riesgo_democratico': ('bajo', 'medio', 'alto', 'critico')[h % 4],
+                    'red_flags_principales': []}
+        if 'semántico' in prompt:
+            return {'tema_central_real': 'designaciones', 'complejidad_semantica': 'media',
+                    'categoria_emergente': ('designacion_transitoria', 'presupuesto', 'regulacion')[h % 3]}
+        if 'crítico' in prompt:
+            return {'proporcionalidad_justificacion_accion': 'media', 'nivel_transparencia': 'medio',
+                    'señales_alerta': []}
+        organismo = TIPOS[h % len(TIPOS)][1]
+        return {'entidades_mencionadas': [organismo], 'referencias_normativas': ['Decreto 50/2019'],
+                'autoridades_involucradas': [], 'acciones_principales': ['designar']}
+
+    def generate_content(self, prompt, **kwargs):
+        with self.lock:
+            self.llamadas += 1
+            sorteo = self.rng.random()
+            demora = self.latencia * self.rng.uniform(0.5, 1.5)
+        if demora:
+            time.sleep(demora)
+        tasa_429, tasa_500, tasa_json_invalido = self.tasas
+        if sorteo < tasa_429:
+            raise ErrorGeminiSimulado(429, 'Resource has been exhausted (e.g. check quota).')
+        if sorteo < tasa_429 + tasa_500:
+            raise ErrorGeminiSimulado(500, 'Internal error encountered.')
+        texto = json.dumps(self._respuesta(prompt), ensure_ascii=False)
+        if sorteo < tasa_429 + tasa_500 + tasa_json_invalido:
+            texto = texto[:len(texto) // 2]
+        uso = UsoSimulado(len(prompt) // 4, len(texto) // 4)
+        return RespuestaSimulada(f"```json\n{texto}\n```", uso)
+
+
+class HashEncoder:
+    """Encoder falso (vectores pseudoaleatorios por hash del texto) para medir el pipeline sin el modelo"""
+
+    dimension = 384
+
+    def encode(self, textos, batch_size=32, **kwargs):
+        import numpy as np
+        def uno(texto):
+            semilla = int(hashlib.md5(texto.encode('utf-8')).hexdigest()[:8], 16)
+            return np.random.RandomState(semilla).randn(self.dimension).astype(np.float32)
+        if isinstance(textos, str):
+            return uno(textos)
+        return np.stack([uno(t) for t in textos])
+
+
+# --- Medición ---
+
+def percentiles(valores, ps=(50, 95, 99)):
+    if not valores:
+        return {f'p{p}': None for p in ps}
+    ordenados = sorted(valores)
+    return {f'p{p}': round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))], 4) for p in ps}
+
+
+def _preparar_entorno(config, raiz):
+    """Variables de entorno y dobles ANTES de importar analyzer/api (leen la config al importarse)"""
+    os.environ.update({
+        'GEMINI_API_KEY': 'benchmark',
+        'GEMINI_RPM': str(config['rpm']),
+        'GEMINI_TPM': str(10 ** 9),
+        'GEMINI_BACKOFF_BASE': str(config['backoff_base']),
+        'GEMINI_MAX_REINTENTOS': '3',
+        'BORA_CHECKPOINT_DIR': os.path.join(raiz, 'checkpoints'),
+        'BORA_METRICAS_DIR': config['trabajo'],
+        'BORA_PRELOAD': '0',
+    })
+    LocalFTP.raiz = raiz
+    LocalFTP.latencia = config['latencia_ftp']
+    ftplib.FTP = LocalFTP
+    os.chdir(config['trabajo'])
+
+
+def _fake_model(config):
+    return FakeGenerativeModel(config['latencia_gemini'], config['tasa_429'], config['tasa_500'],
+                               config['tasa_json_invalido'], config['semilla'])
+
+
+def _escenario_batch(config, raiz):
+    from analyzer import BatchAnalyzer
+
+    class BatchMedido(BatchAnalyzer):
+        """Latencia por medida: desde la descarga del raw hasta su registro en el manifest"""
+        def __init__(self):
+            super().__init__()
+            self.inicios = {}
+            self.latencias = []
+
+        def download_from_hostinger(self, remote_path):
+            if remote_path.startswith('raw/'):
+                self.inicios.setdefault(remote_path[len('raw/'):], time.perf_counter())
+            return super().download_from_hostinger(remote_path)
+
+        def registrar_en_manifest(self, filename, estado, **extra):
+            if filename in self.inicios and estado != 'recibida':
+                self.latencias.append(time.perf_counter() - self.inicios[filename])
+            super().registrar_en_manifest(filename, estado, **extra)
+
+    batch = BatchMedido()
+    batch.usar_manifest = True
+    batch.analyzer._model = _fake_model(config)
+    if config['encoder'] == 'falso':
+        batch.analyzer._encoder = HashEncoder()
+    else:
+        batch.analyzer.encoder_backend = config['encoder']
+
+    inicio = time.perf_counter()
+    resultado = batch.analyze_all_measures_in_directory()
+    segundos = time.perf_counter() - inicio
+    procesadas = resultado.get('total_analizadas', 0) + resultado.get('total_errores', 0)
+    return {
+        'medidas': procesadas,
+        'analizadas': resultado.get('total_analizadas', 0),
+        'errores': resultado.get('total_errores', 0),
+        'reutilizadas_por_duplicado': resultado.get('total_reutilizadas_por_duplicado', 0),
+        'reducidas_por_triage': resultado.get('total_reducidas_por_triage', 0),
+        'llamadas_gemini': batch.analyzer.model.llamadas,
+        'segundos': round(segundos, 3),
+        'medidas_por_segundo': round(procesadas / segundos, 2) if segundos else None,
+        'latencia_medida_segundos': percentiles(batch.latencias),
+        'etapas': resultado.get('metricas', {}).get('bora_etapa_segundos', {})
+    }
+
+
+def _escenario_censo(config, raiz):
+    import analizar_tipos_existentes as censo
+    total = len([f for f in os.listdir(os.path.join(raiz, 'data', 'raw')) if f.endswith('.json')])
+    inicio = time.perf_counter()
+    censo_resultado = censo.main() or {}
+    segundos = time.perf_counter() - inicio
+    # El censo sigue ante errores por archivo: sin contarlos, un escenario roto reportaría buen throughput
+    errores = censo_resultado.get('errores', total)
+    leidos = total - errores
+    resultado = {
+        'archivos': total,
+        'errores': errores,
+        'segundos': round(segundos, 3),
+        'archivos_por_segundo': round(leidos / segundos, 2) if segundos else None,
+        'csv_generado': os.path.exists(os.path.join(raiz, 'tipos_desde_h2.csv'))
+    }
+    if errores:
+        resultado['error'] = f"{errores} de {total} archivos fallaron en el censo"
+    return resultado
+
+
+def _escenario_api(config, raiz):
+    import api
+    api._gemini_model = _fake_model(config)
+    cliente = api.app.test_client()
+    endpoints = ['/', '/api/stats', '/api/medidas?limit=20', '/metrics']
+    resultados = {}
+    for endpoint in endpoints:
+        latencias, errores = [], 0
+        for _ in range(config['requests_api']):
+            inicio = time.perf_counter()
+            respuesta = cliente.get(endpoint)
+            latencias.append(time.perf_counter() - inicio)
+            errores += respuesta.status_code >= 400
+        total = sum(latencias)
+        resultados[endpoint] = dict(percentiles(latencias), requests=len(latencias), errores=errores,
+                                    requests_por_segundo=round(len(latencias) / total, 2) if total else None)
+    return resultados
+
+
+def _correr_escenario(nombre, config, raiz, cola):
+    _preparar_entorno(config, raiz)
+    if config['tracemalloc']:
+        tracemalloc.start()
+    salida = sys.stdout if config['verbose'] else open(os.devnull, 'w')
+    try:
+        with contextlib.redirect_stdout(salida):
+            resultado = {'batch': _escenario_batch, 'censo': _escenario_censo, 'api': _escenario_api}[nombre](config, raiz)
+    except Exception as e:
+        resultado = {'error': f"{type(e).__name__}: {e}"}
+    resultado['rss_max_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    if config['tracemalloc']:
+        resultado['tracemalloc_pico_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+    cola.put(resultado)
+
+
+def benchmark(config, escenarios=ESCENARIOS):
+    """Genera el corpus y corre cada escenario en un proceso nuevo (RSS por escenario, sin estado compartido)"""
+    raiz = tempfile.mkdtemp(prefix='bora_bench_')
+    config = dict(config, trabajo=os.path.join(raiz, 'trabajo'))
+    os.makedirs(config['trabajo'])
+    try:
+        generar_corpus(raiz, config['medidas'], config['duplicados'], config['semilla'])
+        contexto = multiprocessing.get_context('spawn')
+        reporte = {'config': {k: v for k, v in config.items() if k != 'trabajo'}, 'escenarios': {}}
+        for nombre in escenarios:
+            cola = contexto.Queue()
+            proceso = contexto.Process(target=_correr_escenario, args=(nombre, config, raiz, cola))
+            proceso.start()
+            reporte['escenarios'][nombre] = cola.get()
+            proceso.join()
+        return reporte
+    finally:
+        if not config.get('conservar'):
+            shutil.rmtree(raiz, ignore_errors=True)
+
+
+def comparar(reporte, baseline):
+    """Cambio relativo de throughput, p95 y memoria contra un reporte anterior"""
+    filas = []
+    def fila(nombre, actual, previo, mayor_es_mejor):
+        if actual is None or not previo:
+            return
+        cambio = (actual - previo) / previo * 100
+        mejora = cambio > 0 if mayor_es_mejor else cambio < 0
+        filas.append(f"  {nombre:<45} {previo:>10} -> {actual:<10} ({cambio:+.1f}% {'✓' if mejora else '✗'})")
+
+    actual, previo = reporte['escenarios'], baseline.get('escenarios', {})
+    for escenario in actual:
+        a, b = actual[escenario], previo.get(escenario, {})
+        if escenario == 'batch':
+            fila('batch medidas/s', a.get('medidas_por_segundo'), b.get('medidas_por_segundo'), True)
+            fila('batch p95 por medida (s)', a.get('latencia_medida_segundos', {}).get('p95'),
+                 b.get('latencia_medida_segundos', {}).get('p95'), False)
+        elif escenario == 'censo':
+            fila('censo archivos/s', a.get('archivos_por_segundo'), b.get('archivos_por_segundo'), True)
+            if a.get('errores'):
+                filas.append(f"  ✗ censo con {a['errores']} archivos con error: el throughput no es comparable")
+        elif escenario == 'api':
+            for endpoint, datos in a.items():
+                if isinstance(datos, dict):
+                    fila(f'api {endpoint} p95 (s)', datos.get('p95'), b.get(endpoint, {}).get('p95'), False)
+        fila(f'{escenario} RSS máx (MB)', a.get('rss_max_mb'), b.get('rss_max_mb'), False)
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark offline del pipeline (FTP local + Gemini simulado)')
+    parser.add_argument('--medidas', type=int, default=200, help='Tamaño del corpus sintético')
+    parser.add_argument('--duplicados', type=float, default=0.1, help='Proporción de casi-duplicados en el corpus')
+    parser.add_argument('--escenarios', nargs='+', choices=ESCENARIOS, default=list(ESCENARIOS))
+    parser.add_argument('--latencia-gemini', type=float, default=0.0, help='Latencia media por llamada (s)')
+    parser.add_argument('--latencia-ftp', type=float, default=0.0, help='Latencia por comando FTP (s)')
+    parser.add_argument('--tasa-429', type=float, default=0.0)
+    parser.add_argument('--tasa-500', type=float, default=0.0)
+    parser.add_argument('--tasa-json-invalido', type=float, default=0.0)
+    parser.add_argument('--rpm', type=int, default=100000, help='GEMINI_RPM del limitador (15 = límite real)')
+    parser.add_argument('--backoff-base', type=float, default=0.01)
+    parser.add_argument('--encoder', choices=['falso', 'pytorch', 'onnx'], default='falso')
+    parser.add_argument('--requests-api', type=int, default=20, help='Requests por endpoint')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--tracemalloc', action='store_true', help='Pico de memoria Python (agrega overhead)')
+    parser.add_argument('--salida', help='Guardar el reporte JSON (para usarlo luego como baseline)')
+    parser.add_argument('--baseline', help='Reporte JSON anterior contra el cual comparar')
+    parser.add_argument('--conservar', action='store_true', help='No borrar el directorio temporal del corpus')
+    parser.add_argument('--verbose', action='store_true', help='Mostrar la salida de analyzer/censo/api')
+    args = parser.parse_args()
+
+    config = {k: v for k, v in vars(args).items() if k not in ('escenarios', 'salida', 'baseline')}
+    reporte = benchmark(config, args.escenarios)
+    print(serializacion.dumps(reporte, pretty=True).decode('utf-8'))
+
+    if args.salida:
+        serializacion.guardar(reporte, args.salida, pretty=True)
+        print(f"✓ Reporte guardado en {args.salida}")
+    if args.baseline:
+        baseline = serializacion.cargar(args.baseline)
+        print("\n=== COMPARACIÓN CONTRA BASELINE ===")
+        print('\n'.join(comparar(reporte, baseline)) or "Sin métricas comparables")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import os
+import json
+import glob
+import gzip
+import time
+import random
+import argparse
+from datetime import date
+
+import serializacion
+from benchmark_pipeline import medida_sintetica
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def analisis_sintetico(medida, rng, dimension=384):
+    """Documento de análisis con la forma real: secciones IA + embeddings float32 pasados a lista"""
+    import numpy as np
+    def vector():
+        return np.random.RandomState(rng.randint(0, 2 ** 31)).randn(dimension).astype(np.float32).tolist()
+    secciones = {f'embedding_{s}': vector() for s in medida['estructura_detectada']}
+    return {
+        'numero_medida': medida['numero_medida'],
+        'fecha_boletin': medida['fecha_boletin'],
+        'analisis_literal': {'titulo_raw': medida['titulo_raw'], 'estructura_detectada': medida['estructura_detectada'],
+                             'elementos_detectados_ia': {'entidades_mencionadas': ['MINISTERIO DE ECONOMÍA'] * 5}},
+        'analisis_critico': {'señales_alerta': ['Delegación amplia de facultades sin plazo'] * 4},
+        'analisis_abogado_diablo': {'nivel_riesgo_democratico': 'medio', 'red_flags_principales': ['Ambigüedad'] * 4},
+        'analisis_semantico': {'categoria_emergente': 'designacion_transitoria', 'subtemas_detectados': ['empleo'] * 3},
+        'embeddings': {'embedding_completo': vector(), 'embedding_titulo': vector(),
+                       'embeddings_por_seccion': secciones, 'dimension': dimension},
+    }
+
+
+def documentos(cantidad, medidas_dir=None, semilla=42):
+    """Análisis/medidas reales de un directorio (comprimidos o no) o sintéticos de tamaño real"""
+    docs = []
+    if medidas_dir:
+        for path in sorted(glob.glob(os.path.join(medidas_dir, '*.json')))[:cantidad]:
+            docs.append(serializacion.cargar(path))
+    rng = random.Random(semilla)
+    while len(docs) < cantidad:
+        medida = medida_sintetica(300000 + len(docs), date(2024, 1, 2), rng)
+        medida['contenido_html_completo']['cuerpo'] *= 20  # el HTML real pesa decenas de KB
+        docs.append(analisis_sintetico(medida, rng) if len(docs) % 2 else medida)
+    return docs
+
+
+def variantes():
+    v = {
+        'stdlib_indent2 (histórico)': (lambda d: json.dumps(d, ensure_ascii=False, indent=2).encode('utf-8'), json.loads),
+        'stdlib_compacto': (lambda d: json.dumps(d, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), json.loads),
+    }
+    if orjson is not None:
+        v['orjson_compacto'] = (orjson.dumps, orjson.loads)
+        v['orjson_indent2'] = (lambda d: orjson.dumps(d, option=orjson.OPT_INDENT_2), orjson.loads)
+    return v
+
+
+def medir(docs, repeticiones=5):
+    resultados = []
+    for nombre, (dumps, loads) in variantes().items():
+        serializados = [dumps(d) for d in docs]
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            for d in docs:
+                dumps(d)
+        t_dumps = (time.perf_counter() - inicio) / (repeticiones * len(docs))
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            for s in serializados:
+                loads(s)
+        t_loads = (time.perf_counter() - inicio) / (repeticiones * len(docs))
+        total = sum(len(s) for s in serializados)
+        resultados.append({
+            'variante': nombre,
+            'ms_dumps_por_doc': round(t_dumps * 1000, 3),
+            'ms_loads_por_doc': round(t_loads * 1000, 3),
+            'kb_por_doc': round(total / len(docs) / 1024, 1),
+            'kb_gzip_por_doc': round(sum(len(gzip.compress(s, 6)) for s in serializados) / len(docs) / 1024, 1)
+        })
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark de serialización JSON (stdlib vs orjson)')
+    parser.add_argument('--documentos', type=int, default=100, help='Cantidad de documentos (mitad raw, mitad análisis)')
+    parser.add_argument('--medidas-dir', help='Directorio con medidas raw / análisis JSON reales')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    docs = documentos(args.documentos, args.medidas_dir)
+    print(f"Backend activo de serializacion: {serializacion.backend()} | {len(docs)} documentos")
+    base = None
+    for r in medir(docs, args.repeticiones):
+        base = base or r
+        print(f"{r['variante']:<28} dumps {r['ms_dumps_por_doc']:>8.3f} ms  loads {r['ms_loads_por_doc']:>8.3f} ms  "
+              f"{r['kb_por_doc']:>7.1f} KB ({r['kb_gzip_por_doc']:.1f} KB gzip)  "
+              f"x{base['ms_dumps_por_doc'] / r['ms_dumps_por_doc']:.1f} dumps vs histórico")
+
+
+if __name__ == '__main__':
+    main()
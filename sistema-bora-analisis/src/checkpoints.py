@@ -0,0 +1,46 @@
+import os
+import serializacion
+import shutil
+import tempfile
+
+
+class StageCheckpoint:
+    """Checkpoints locales por etapa de análisis: si el proceso muere, la próxima corrida retoma desde
+    la primera etapa faltante sin volver a pagar las llamadas a Gemini ya completadas."""
+
+    def __init__(self, directorio=None):
+        self.directorio = directorio or os.getenv(
+            'BORA_CHECKPOINT_DIR', os.path.join(tempfile.gettempdir(), 'bora_checkpoints'))
+        os.makedirs(self.directorio, exist_ok=True)
+
+    @staticmethod
+    def clave(medida_data):
+        return f"{medida_data['numero_medida']}_{str(medida_data['fecha_boletin']).replace('-', '')}"
+
+    def _dir_medida(self, medida_data):
+        return os.path.join(self.directorio, self.clave(medida_data))
+
+    def obtener(self, medida_data, etapa):
+        path = os.path.join(self._dir_medida(medida_data), f'{etapa}.json')
+        try:
+            return serializacion.cargar(path)
+        except (OSError, ValueError):
+            return None
+
+    def guardar(self, medida_data, etapa, resultado):
+        """Escritura atómica (archivo temporal + rename) para no dejar checkpoints a medio escribir"""
+        directorio = self._dir_medida(medida_data)
+        os.makedirs(directorio, exist_ok=True)
+        path = os.path.join(directorio, f'{etapa}.json')
+        temporal = path + '.tmp'
+        serializacion.guardar(resultado, temporal)
+        os.replace(temporal, path)
+
+    def etapas_completas(self, medida_data):
+        directorio = self._dir_medida(medida_data)
+        if not os.path.isdir(directorio):
+            return []
+        return sorted(f[:-5] for f in os.listdir(directorio) if f.endswith('.json'))
+
+    def limpiar(self, medida_data):
+        shutil.rmtree(self._dir_medida(medida_data), ignore_errors=True)
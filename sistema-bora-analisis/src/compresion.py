@@ -0,0 +1,104 @@
+import os
+import gzip
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIA_GZIP = b'\x1f\x8b'
+MAGIA_ZSTD = b'\x28\xb5\x2f\xfd'
+FORMATOS = ('gzip', 'zstd', 'none')
+EXTENSIONES_COMPRIMIBLES = ('.json', '.jsonl', '.sqlite')
+
+# Sólo se comprimen los archivos internos del pipeline (raw, análisis, estado), que se leen siempre con
+# descomprimir/Descompresor. Conservan su nombre (.json): el manifest, los listados y los stems no cambian
+# y los lectores distinguen por los bytes mágicos, así conviven archivos viejos (planos) y nuevos.
+# Lo que se baja a mano o lee otra herramienta (censo, exportaciones) se sube plano: formato='none'.
+
+
+def formato_configurado():
+    formato = os.getenv('BORA_COMPRESION', 'gzip').lower()
+    if formato not in FORMATOS:
+        raise ValueError(f"BORA_COMPRESION desconocido: {formato} (opciones: {', '.join(FORMATOS)})")
+    if formato == 'zstd' and zstandard is None:
+        print("ADVERTENCIA: zstandard no está instalado, se comprime con gzip.")
+        return 'gzip'
+    return formato
+
+
+def detectar_formato(datos):
+    if datos[:2] == MAGIA_GZIP:
+        return 'gzip'
+    if datos[:4] == MAGIA_ZSTD:
+        return 'zstd'
+    return 'none'
+
+
+def comprimir(datos, formato=None):
+    formato = formato or formato_configurado()
+    if formato == 'gzip':
+        return gzip.compress(datos, compresslevel=int(os.getenv('BORA_COMPRESION_NIVEL', 6)), mtime=0)
+    if formato == 'zstd':
+        return zstandard.ZstdCompressor(level=int(os.getenv('BORA_COMPRESION_NIVEL', 10))).compress(datos)
+    return datos
+
+
+def descomprimir(datos):
+    """Devuelve los bytes originales, estén comprimidos (gzip/zstd) o no"""
+    formato = detectar_formato(datos)
+    if formato == 'gzip':
+        return gzip.decompress(datos)
+    if formato == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Archivo comprimido con zstd pero zstandard no está instalado")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(datos)
+    return datos
+
+
+def leer_para_subir(path, formato=None):
+    """Contenido de un archivo local listo para subir: comprimido si es JSON y todavía no lo está"""
+    with open(path, 'rb') as f:
+        datos = f.read()
+    if not path.endswith(EXTENSIONES_COMPRIMIBLES) or detectar_formato(datos) != 'none':
+        return datos
+    return comprimir(datos, formato)
+
+
+class Descompresor:
+    """Callback para retrbinary que descomprime al vuelo según los primeros bytes recibidos"""
+
+    def __init__(self, escribir):
+        self.escribir = escribir
+        self.pendiente = b''
+        self.decodificador = None
+        self.bytes_recibidos = 0
+
+    def __call__(self, bloque):
+        self.bytes_recibidos += len(bloque)
+        if self.decodificador is None:
+            self.pendiente += bloque
+            if len(self.pendiente) < 4:
+                return
+            bloque, self.pendiente = self.pendiente, b''
+            formato = detectar_formato(bloque)
+            if formato == 'gzip':
+                self.decodificador = zlib.decompressobj(wbits=31)
+            elif formato == 'zstd':
+                if zstandard is None:
+                    raise RuntimeError("Archivo comprimido con zstd pero zstandard no está instalado")
+                self.decodificador = zstandard.ZstdDecompressor().decompressobj()
+            else:
+                self.decodificador = False
+        self.escribir(self.decodificador.decompress(bloque) if self.decodificador else bloque)
+
+    def cerrar(self):
+        """Vacía lo que quedó pendiente (archivos de menos de 4 bytes o fin del stream gzip)"""
+        if self.decodificador is None and self.pendiente:
+            self.decodificador = False
+            self.escribir(self.pendiente)
+        elif self.decodificador and hasattr(self.decodificador, 'flush'):
+            resto = self.decodificador.flush()
+            if resto:
+                self.escribir(resto)
@@ -0,0 +1,155 @@
+# Backends intercambiables para el encoder de embeddings: 'pytorch' (SentenceTransformer, default)
+# u 'onnx' (mismo modelo exportado a ONNX, opcionalmente int8, con onnxruntime en CPU).
+# Selección: BORA_ENCODER_BACKEND=pytorch|onnx, BORA_ONNX_DIR, BORA_ONNX_CUANTIZADO=1|0, BORA_ONNX_HILOS.
+import os
+
+import numpy as np
+
+
+MODELO_DEFAULT = 'paraphrase-multilingual-MiniLM-L12-v2'
+ONNX_DIR_DEFAULT = 'models/minilm-onnx'
+MAX_LONGITUD = 128  # max_seq_length del modelo original
+
+
+class SentenceTransformerBackend:
+    """Backend PyTorch (SentenceTransformer)"""
+
+    nombre = 'pytorch'
+
+    def __init__(self, modelo=MODELO_DEFAULT):
+        from sentence_transformers import SentenceTransformer
+        self.modelo = modelo
+        self._st = SentenceTransformer(modelo)
+
+    def encode(self, textos, batch_size=32):
+        return self._st.encode(textos, batch_size=batch_size)
+
+
+class OnnxBackend:
+    """Backend ONNX Runtime en CPU con mean pooling (equivalente al pooling del modelo original)"""
+
+    nombre = 'onnx'
+
+    def __init__(self, modelo=MODELO_DEFAULT, directorio=None, cuantizado=None, hilos=None,
+                 max_longitud=MAX_LONGITUD):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError(f"El backend 'onnx' requiere onnxruntime y tokenizers "
+                              f"(pip install -r config/requirements.txt): {e}") from e
+
+        directorio = directorio or os.getenv('BORA_ONNX_DIR', ONNX_DIR_DEFAULT)
+        exportado = modelo_exportado(directorio)
+        if exportado != modelo:
+            raise ValueError(f"{directorio} contiene una exportación de '{exportado}', no de '{modelo}' "
+                             f"(exportar con exportar_onnx(destino, modelo='{modelo}'))")
+        self.nombre_modelo = modelo
+        if cuantizado is None:
+            cuantizado = os.getenv('BORA_ONNX_CUANTIZADO', '1') == '1'
+        archivo = 'model_int8.onnx' if cuantizado else 'model.onnx'
+        self.modelo = os.path.join(directorio, archivo)
+        self.cuantizado = cuantizado
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(directorio, 'tokenizer.json'))
+        pad_id = self.tokenizer.token_to_id('<pad>') or 0
+        self.tokenizer.enable_truncation(max_length=max_longitud)
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token='<pad>')
+
+        opciones = ort.SessionOptions()
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        hilos = hilos or os.getenv('BORA_ONNX_HILOS')
+        if hilos:
+            opciones.intra_op_num_threads = int(hilos)
+            opciones.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(self.modelo, sess_options=opciones, providers=['CPUExecutionProvider'])
+        self.entradas = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, textos, batch_size=32):
+        unico = isinstance(textos, str)
+        lista = [textos] if unico else list(textos)
+        salidas = []
+        for i in range(0, len(lista), batch_size):
+            codificados = self.tokenizer.encode_batch(lista[i:i + batch_size])
+            input_ids = np.array([c.ids for c in codificados], dtype=np.int64)
+            mascara = np.array([c.attention_mask for c in codificados], dtype=np.int64)
+            feed = {'input_ids': input_ids, 'attention_mask': mascara}
+            if 'token_type_ids' in self.entradas:
+                feed['token_type_ids'] = np.zeros_like(input_ids)
+            ultimo_estado = self.session.run(None, feed)[0]
+            mascara_f = mascara[:, :, None].astype(np.float32)
+            salidas.append((ultimo_estado * mascara_f).sum(axis=1) / np.clip(mascara_f.sum(axis=1), 1e-9, None))
+        vectores = np.concatenate(salidas) if salidas else np.zeros((0, 0), dtype=np.float32)
+        return vectores[0] if unico else vectores
+
+
+def crear_encoder(backend=None, modelo=MODELO_DEFAULT, **kwargs):
+    """Instancia el backend configurado (BORA_ENCODER_BACKEND, default 'pytorch')"""
+    backend = backend or os.getenv('BORA_ENCODER_BACKEND', 'pytorch')
+    if backend == 'onnx':
+        return OnnxBackend(modelo, **kwargs)
+    if backend == 'pytorch':
+        return SentenceTransformerBackend(modelo)
+    raise ValueError(f"Backend de encoder desconocido: {backend}")
+
+
+def modelo_exportado(directorio):
+    """Modelo de origen de una exportación ONNX (las exportaciones sin MODELO son del modelo default)"""
+    try:
+        with open(os.path.join(directorio, 'MODELO'), encoding='utf-8') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return MODELO_DEFAULT
+
+
+def exportar_onnx(destino=ONNX_DIR_DEFAULT, modelo=MODELO_DEFAULT, cuantizar=True):
+    """Exporta el transformer del SentenceTransformer a ONNX (+ versión int8 con cuantización dinámica)"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(destino, exist_ok=True)
+    st = SentenceTransformer(modelo, device='cpu')
+    transformer = st[0].auto_model.eval()
+    tokenizer = st[0].tokenizer
+    tokenizer.save_pretrained(destino)
+    with open(os.path.join(destino, 'MODELO'), 'w', encoding='utf-8') as f:
+        f.write(modelo + '\n')
+
+    ejemplo = tokenizer(['Texto de ejemplo para exportar el modelo'], return_tensors='pt')
+    ruta = os.path.join(destino, 'model.onnx')
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            (ejemplo['input_ids'], ejemplo['attention_mask']),
+            ruta,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['last_hidden_state'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'secuencia'},
+                'attention_mask': {0: 'batch', 1: 'secuencia'},
+                'last_hidden_state': {0: 'batch', 1: 'secuencia'}
+            },
+            opset_version=14
+        )
+    print(f"✓ Modelo ONNX exportado a {ruta}")
+
+    if cuantizar:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        ruta_int8 = os.path.join(destino, 'model_int8.onnx')
+        quantize_dynamic(ruta, ruta_int8, weight_type=QuantType.QInt8)
+        print(f"✓ Modelo cuantizado int8 exportado a {ruta_int8}")
+    return destino
+
+
+def verificar_paridad(encoder_ref, encoder_candidato, textos, tolerancia=0.99):
+    """Compara vectores de dos backends por similitud coseno; ok si la mínima supera la tolerancia"""
+    ref = np.asarray(encoder_ref.encode(textos), dtype=np.float32)
+    cand = np.asarray(encoder_candidato.encode(textos), dtype=np.float32)
+    cosenos = (ref * cand).sum(axis=1) / (np.linalg.norm(ref, axis=1) * np.linalg.norm(cand, axis=1) + 1e-12)
+    return {
+        'textos': len(textos),
+        'coseno_minimo': float(cosenos.min()),
+        'coseno_promedio': float(cosenos.mean()),
+        'tolerancia': tolerancia,
+        'ok': bool(cosenos.min() >= tolerancia)
+    }
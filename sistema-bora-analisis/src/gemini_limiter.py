@@ -0,0 +1,295 @@
+import os
+import time
+import random
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+
+class GeminiReintentosAgotados(Exception):
+    """Error transitorio de Gemini (429, cuota, 5xx) que persistió tras todos los reintentos"""
+
+
+class TokenBucket:
+    """Balde de tokens con recarga continua, seguro entre hilos"""
+
+    def __init__(self, capacidad, recarga_por_segundo):
+        self.capacidad = float(capacidad)
+        self.recarga_por_segundo = float(recarga_por_segundo)
+        self.tokens = float(capacidad)
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.recarga_por_segundo)
+        self.ultimo = ahora
+
+    def consumir(self, cantidad):
+        """Bloquea hasta poder consumir `cantidad` tokens. Devuelve los segundos esperados."""
+        cantidad = min(float(cantidad), self.capacidad)
+        esperado = 0.0
+        while True:
+            with self.lock:
+                self._recargar()
+                if self.tokens >= cantidad:
+                    self.tokens -= cantidad
+                    return esperado
+                espera = (cantidad - self.tokens) / self.recarga_por_segundo
+            time.sleep(espera)
+            esperado += espera
+
+    def ajustar(self, delta):
+        """Corrige el saldo cuando el consumo real difiere de la estimación (puede quedar negativo)"""
+        with self.lock:
+            self._recargar()
+            self.tokens = min(self.capacidad, self.tokens - delta)
+
+    def vaciar(self):
+        with self.lock:
+            self._recargar()
+            self.tokens = 0.0
+
+
+class EstadoCompartido:
+    """Baldes y pausa global del limitador en un SQLite local, compartidos por todos los procesos del host.
+
+    Con varios workers de gunicorn (más el BatchAnalyzer en la misma máquina) cada proceso tendría su propio
+    balde y la cuota de Gemini se excedería N veces. Cada operación es una transacción IMMEDIATE corta (leer,
+    recargar, descontar), así que el saldo es uno solo. Los tiempos son de reloj (time.time), comunes a
+    todos los procesos. Procesos en otras máquinas no comparten el archivo: ahí hay que repartir
+    GEMINI_RPM/GEMINI_TPM entre servicios.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('GEMINI_LIMITE_DB', os.path.join(tempfile.gettempdir(), 'bora_gemini_limite.sqlite'))
+        self.local = threading.local()
+        self._conexion().executescript('''
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS baldes (nombre TEXT PRIMARY KEY, tokens REAL NOT NULL, ultimo REAL NOT NULL);
+        ''')
+
+    def _conexion(self):
+        """Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return conn
+
+    @contextmanager
+    def transaccion(self):
+        conn = self._conexion()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    @staticmethod
+    def leer(conn, nombre, tokens_iniciales):
+        fila = conn.execute('SELECT tokens, ultimo FROM baldes WHERE nombre = ?', (nombre,)).fetchone()
+        return fila if fila else (float(tokens_iniciales), time.time())
+
+    @staticmethod
+    def escribir(conn, nombre, tokens, ultimo):
+        conn.execute('INSERT OR REPLACE INTO baldes (nombre, tokens, ultimo) VALUES (?, ?, ?)', (nombre, tokens, ultimo))
+
+
+class TokenBucketCompartido:
+    """TokenBucket con el saldo en EstadoCompartido (misma interfaz)"""
+
+    def __init__(self, estado, nombre, capacidad, recarga_por_segundo):
+        self.estado = estado
+        self.nombre = nombre
+        self.capacidad = float(capacidad)
+        self.recarga_por_segundo = float(recarga_por_segundo)
+
+    @contextmanager
+    def _saldo(self):
+        """Saldo recargado hasta ahora, dentro de una transacción; lo que se asigne a saldo[0] se guarda"""
+        with self.estado.transaccion() as conn:
+            tokens, ultimo = self.estado.leer(conn, self.nombre, self.capacidad)
+            ahora = time.time()
+            saldo = [min(self.capacidad, tokens + max(ahora - ultimo, 0.0) * self.recarga_por_segundo)]
+            yield saldo
+            self.estado.escribir(conn, self.nombre, saldo[0], ahora)
+
+    def consumir(self, cantidad):
+        """Bloquea hasta poder consumir `cantidad` tokens. Devuelve los segundos esperados."""
+        cantidad = min(float(cantidad), self.capacidad)
+        esperado = 0.0
+        while True:
+            with self._saldo() as saldo:
+                if saldo[0] >= cantidad:
+                    saldo[0] -= cantidad
+                    return esperado
+                espera = (cantidad - saldo[0]) / self.recarga_por_segundo
+            time.sleep(espera)
+            esperado += espera
+
+    def ajustar(self, delta):
+        with self._saldo() as saldo:
+            saldo[0] = min(self.capacidad, saldo[0] - delta)
+
+    def vaciar(self):
+        with self._saldo() as saldo:
+            saldo[0] = 0.0
+
+
+class GeminiRateLimiter:
+    """Limitador compartido (requests/min y tokens/min) con reintentos y backoff con jitter"""
+
+    CODIGOS_TRANSITORIOS = (429, 500, 502, 503, 504)
+    MENSAJES_TRANSITORIOS = ('429', 'quota', 'resource has been exhausted', 'rate limit',
+                             'unavailable', 'deadline exceeded', 'internal error')
+
+    def __init__(self, rpm=None, tpm=None, max_reintentos=None, backoff_base=None, backoff_max=None, compartido=None):
+        self.rpm = int(rpm or os.getenv('GEMINI_RPM', 15))
+        self.tpm = int(tpm or os.getenv('GEMINI_TPM', 1000000))
+        self.max_reintentos = int(max_reintentos if max_reintentos is not None else os.getenv('GEMINI_MAX_REINTENTOS', 5))
+        self.backoff_base = float(backoff_base or os.getenv('GEMINI_BACKOFF_BASE', 2.0))
+        self.backoff_max = float(backoff_max or os.getenv('GEMINI_BACKOFF_MAX', 60.0))
+
+        # Por defecto el saldo se comparte entre los procesos del host (GEMINI_LIMITE_COMPARTIDO=0: por proceso)
+        if compartido is None:
+            compartido = os.getenv('GEMINI_LIMITE_COMPARTIDO', '1') != '0'
+        self.estado = None
+        if compartido:
+            try:
+                self.estado = EstadoCompartido()
+            except sqlite3.Error as e:
+                print(f"✗ Limitador Gemini: sin estado compartido ({e}), se limita sólo este proceso")
+        if self.estado:
+            self.bucket_requests = TokenBucketCompartido(self.estado, 'requests', self.rpm, self.rpm / 60.0)
+            self.bucket_tokens = TokenBucketCompartido(self.estado, 'tokens', self.tpm, self.tpm / 60.0)
+        else:
+            self.bucket_requests = TokenBucket(self.rpm, self.rpm / 60.0)
+            self.bucket_tokens = TokenBucket(self.tpm, self.tpm / 60.0)
+
+        # Pausa global (reloj de pared, común a los procesos): cuando un hilo recibe un 429, todos esperan
+        self._pausa_hasta = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            'llamadas': 0,
+            'reintentos': 0,
+            'errores_transitorios': 0,
+            'reintentos_agotados': 0,
+            'tokens_estimados': 0,
+            'tokens_reales': 0,
+            'segundos_espera_limite': 0.0,
+            'segundos_espera_backoff': 0.0
+        }
+
+    def estimar_tokens(self, prompt, salida_esperada=1024):
+        """Estimación conservadora (~4 caracteres por token) de entrada + salida"""
+        return len(str(prompt)) // 4 + salida_esperada
+
+    def es_transitorio(self, error):
+        codigo = getattr(error, 'code', None)
+        if isinstance(codigo, int) and codigo in self.CODIGOS_TRANSITORIOS:
+            return True
+        if type(error).__name__ in ('ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable',
+                                    'InternalServerError', 'DeadlineExceeded'):
+            return True
+        mensaje = str(error).lower()
+        return any(m in mensaje for m in self.MENSAJES_TRANSITORIOS)
+
+    def _sumar(self, clave, valor=1):
+        with self._lock:
+            self._stats[clave] += valor
+
+    def _pausa_global(self):
+        if self.estado:
+            with self.estado.transaccion() as conn:
+                return self.estado.leer(conn, 'pausa', 0.0)[0]
+        with self._lock:
+            return self._pausa_hasta
+
+    def _extender_pausa(self, hasta):
+        if self.estado:
+            with self.estado.transaccion() as conn:
+                actual = self.estado.leer(conn, 'pausa', 0.0)[0]
+                self.estado.escribir(conn, 'pausa', max(actual, hasta), time.time())
+            return
+        with self._lock:
+            self._pausa_hasta = max(self._pausa_hasta, hasta)
+
+    def _esperar_pausa_global(self):
+        espera = self._pausa_global() - time.time()
+        if espera > 0:
+            time.sleep(espera)
+            self._sumar('segundos_espera_backoff', espera)
+
+    def _adquirir(self, tokens_estimados):
+        self._esperar_pausa_global()
+        espera = self.bucket_requests.consumir(1)
+        espera += self.bucket_tokens.consumir(tokens_estimados)
+        if espera:
+            self._sumar('segundos_espera_limite', espera)
+
+    def _tokens_reales(self, response):
+        uso = getattr(response, 'usage_metadata', None)
+        total = getattr(uso, 'total_token_count', None) if uso is not None else None
+        return total if isinstance(total, int) else None
+
+    def generate_content(self, model, prompt, **kwargs):
+        """Llama a model.generate_content respetando los límites y reintentando errores transitorios"""
+        tokens_estimados = self.estimar_tokens(prompt)
+        intento = 0
+        while True:
+            self._adquirir(tokens_estimados)
+            self._sumar('llamadas')
+            self._sumar('tokens_estimados', tokens_estimados)
+            try:
+                response = model.generate_content(prompt, **kwargs)
+            except Exception as e:
+                if not self.es_transitorio(e):
+                    raise
+                self._sumar('errores_transitorios')
+                if intento >= self.max_reintentos:
+                    self._sumar('reintentos_agotados')
+                    raise GeminiReintentosAgotados(f"{type(e).__name__}: {e}") from e
+
+                # Backoff exponencial con "full jitter"; un 429 pausa a todos los hilos
+                espera = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** intento)))
+                if getattr(e, 'code', None) == 429 or 'quota' in str(e).lower() or '429' in str(e):
+                    self.bucket_requests.vaciar()
+                    self._extender_pausa(time.time() + espera)
+                    self._esperar_pausa_global()
+                else:
+                    time.sleep(espera)
+                    self._sumar('segundos_espera_backoff', espera)
+                intento += 1
+                self._sumar('reintentos')
+                continue
+
+            reales = self._tokens_reales(response)
+            if reales is not None:
+                self._sumar('tokens_reales', reales)
+                self.bucket_tokens.ajustar(reales - tokens_estimados)
+            return response
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['segundos_throttled'] = round(stats['segundos_espera_limite'] + stats['segundos_espera_backoff'], 3)
+        stats['segundos_espera_limite'] = round(stats['segundos_espera_limite'], 3)
+        stats['segundos_espera_backoff'] = round(stats['segundos_espera_backoff'], 3)
+        stats['limites'] = {'rpm': self.rpm, 'tpm': self.tpm, 'compartido_entre_procesos': self.estado is not None}
+        return stats
+
+
+_limitador = None
+_limitador_lock = threading.Lock()
+
+
+def obtener_limitador():
+    """Devuelve el limitador del proceso; su saldo se comparte con los demás procesos del host (EstadoCompartido)"""
+    global _limitador
+    with _limitador_lock:
+        if _limitador is None:
+            _limitador = GeminiRateLimiter()
+        return _limitador
@@ -0,0 +1,316 @@
+import re
+import unicodedata
+from collections import deque
+
+import numpy as np
+
+from indice_entidades import anio_completo, fecha_entera, normalizar_referencia, referencias_en_texto
+
+
+RELACIONES = ('cita', 'modifica', 'deroga', 'prorroga')
+PROFUNDIDAD_MAXIMA = 10
+
+# Verbos de la parte dispositiva que convierten una cita en una relación más fuerte
+VERBOS_RELACION = (
+    (re.compile(r'derog|dejase sin efecto|dejanse sin efecto|dejar sin efecto'), 'deroga'),
+    (re.compile(r'prorrog'), 'prorroga'),
+    (re.compile(r'modific|sustitu|reemplaz|incorpora'), 'modifica'),
+)
+_INICIO_DISPOSITIVO = re.compile(r'\b(?:RESUELVE|RESUELVEN|DECRETA|DISPONE|DISPONEN|DECIDE)\s*:', re.IGNORECASE)
+_CORTE_ORACION = re.compile(r'[.;:]\s|\bARTICULO\b')  # los artículos de la parte dispositiva van en mayúsculas
+_NUMERO_SIN_TIPO = re.compile(r'(\d{1,3}(?:\.\d{3})+|\d+)\s*/\s*(\d{4}|\d{2})\b')
+
+
+def _parte_dispositiva(medida_data):
+    estructura = medida_data.get('estructura_detectada', {}) or {}
+    dispositivo = estructura.get('dispositivo')
+    if isinstance(dispositivo, dict) and dispositivo.get('contenido'):
+        return dispositivo['contenido']
+    texto = medida_data.get('texto_completo_limpio', '') or ''
+    inicio = _INICIO_DISPOSITIVO.search(texto)
+    return texto[inicio.end():] if inicio else ''
+
+
+def relaciones_dispositivas(texto):
+    """{norma: relación} para las normas que la parte dispositiva modifica, deroga o prorroga.
+
+    Se mira la oración que precede a cada cita ("Sustitúyese el artículo 2° del Decreto N° 50/19"),
+    no la que la sigue, para no confundir "y sus modificatorias" con una modificación.
+    """
+    texto = ''.join(c for c in unicodedata.normalize('NFD', texto or '') if unicodedata.category(c) != 'Mn')
+    relaciones = {}
+    cortes = [m.end() for m in _CORTE_ORACION.finditer(texto)]
+    for posicion, norma in referencias_en_texto(texto):
+        inicio = max((c for c in cortes if c <= posicion), default=0)
+        previo = texto[max(inicio, posicion - 200):posicion].lower()
+        for patron, relacion in VERBOS_RELACION:
+            if patron.search(previo):
+                if RELACIONES.index(relacion) > RELACIONES.index(relaciones.get(norma, 'cita')):
+                    relaciones[norma] = relacion
+                break
+    return relaciones
+
+
+def identificador_medida(clave, medida_data):
+    """La medida como norma ('resolucion 1234/2024') si el título la identifica; si no, su clave de archivo"""
+    titulo = medida_data.get('titulo_raw', '') or ''
+    return next((norma for _, norma in referencias_en_texto(titulo) if '/' in norma), f"medida {clave}")
+
+
+class GrafoCitas:
+    """Grafo dirigido de citas entre normas: medida -> normas que cita (y si las modifica, deroga o prorroga).
+
+    Los nodos son identificadores canónicos ('decreto 50/2019'). Las resoluciones de distintos organismos
+    pueden compartir número y año ("Resolución 1/2024" hay muchas) y el nodo es uno solo (las referencias
+    del texto tampoco las distinguen de forma consistente): sus aristas son la unión de las de todas las
+    medidas que lo identifican. Las aristas se guardan además por medida, así re-agregar una medida sólo
+    reemplaza las suyas. En disco se guardan como arreglos de adyacencia CSR; al consultar se arma también
+    el CSR inverso para "qué cita a X".
+    """
+
+    ARCHIVO = 'grafo_citas.npz'
+    VERSION = 2
+
+    def __init__(self):
+        self.nodos = []
+        self.posicion = {}
+        self.claves = []     # clave de la medida del corpus que es este nodo ('' si sólo aparece citado)
+        self.fechas = []
+        self.salientes = {}  # nodo -> {destino: índice de RELACIONES}, unión de las aristas de sus medidas
+        self.medidas = {}    # clave -> (nodo, fecha, {destino: índice de RELACIONES}) aportado por esa medida
+        self.medidas_nodo = {}  # nodo -> claves de las medidas que lo identifican
+        self._csr = None
+
+    def _nodo(self, identificador):
+        posicion = self.posicion.get(identificador)
+        if posicion is None:
+            posicion = self.posicion[identificador] = len(self.nodos)
+            self.nodos.append(identificador)
+            self.claves.append('')
+            self.fechas.append(0)
+        return posicion
+
+    def agregar_medida(self, clave, medida_data, analisis=None):
+        """Agrega (o reemplaza) las citas salientes de una medida. Devuelve la cantidad de aristas."""
+        origen = self._nodo(identificador_medida(clave, medida_data))
+
+        citadas = set()
+        elementos = ((analisis or {}).get('analisis_literal', {}).get('elementos_detectados_ia', {}) or {})
+        referencias = elementos.get('referencias_normativas') or []
+        for referencia in (referencias if isinstance(referencias, list) else []):
+            citadas.update(norma for _, norma in referencias_en_texto(referencia if isinstance(referencia, str) else ''))
+        citadas.update(norma for _, norma in referencias_en_texto(medida_data.get('texto_completo_limpio', '')))
+
+        # Los numeros_referencia del scraper no traen el tipo de norma: se usan sólo si no hay una cita tipada
+        # con el mismo número (quedan como 'norma 50/2019')
+        tipadas = {norma.split(' ', 1)[1] for norma in citadas}
+        metadatos = medida_data.get('metadatos_extraidos', {}) or {}
+        for numero in metadatos.get('numeros_referencia', []) or []:
+            coincidencia = _NUMERO_SIN_TIPO.search(str(numero))
+            if coincidencia:
+                sin_tipo = f"{int(coincidencia.group(1).replace('.', ''))}/{anio_completo(coincidencia.group(2))}"
+                if sin_tipo not in tipadas:
+                    citadas.add(f"norma {sin_tipo}")
+
+        relaciones = relaciones_dispositivas(_parte_dispositiva(medida_data))
+        aristas = {}
+        for norma in citadas:
+            destino = self._nodo(norma)
+            if destino != origen:
+                aristas[destino] = RELACIONES.index(relaciones.get(norma, 'cita'))
+
+        anterior = self.medidas.get(clave)
+        self.medidas[clave] = (origen, fecha_entera(medida_data.get('fecha_boletin')), aristas)
+        self.medidas_nodo.setdefault(origen, set()).add(clave)
+        if anterior and anterior[0] != origen:
+            # Cambió el título: la medida deja de aportar al nodo anterior
+            self.medidas_nodo[anterior[0]].discard(clave)
+            self._unir(anterior[0])
+        self._unir(origen)
+        self._csr = None
+        return len(aristas)
+
+    def _unir(self, nodo):
+        """Recalcula las aristas del nodo como unión de las de sus medidas (gana la relación más fuerte)"""
+        claves = self.medidas_nodo.get(nodo) or set()
+        aristas = {}
+        for clave in claves:
+            for destino, relacion in self.medidas[clave][2].items():
+                if relacion > aristas.get(destino, -1):
+                    aristas[destino] = relacion
+        if aristas:
+            self.salientes[nodo] = aristas
+        else:
+            self.salientes.pop(nodo, None)
+        if claves:
+            # La medida que representa al nodo en las respuestas: la más reciente de las que lo identifican
+            clave = max(claves, key=lambda c: (self.medidas[c][1], c))
+            self.claves[nodo], self.fechas[nodo] = clave, self.medidas[clave][1]
+        else:
+            self.medidas_nodo.pop(nodo, None)
+            self.claves[nodo], self.fechas[nodo] = '', 0
+
+    # --- Consultas ---
+
+    def _compilar(self):
+        """CSR directo (origen -> destinos) e inverso (destino -> origenes) para recorrer el grafo"""
+        if self._csr is None:
+            cantidad = len(self.nodos)
+            origenes = np.fromiter((o for o, aristas in self.salientes.items() for _ in aristas), dtype=np.int64)
+            destinos = np.fromiter((d for aristas in self.salientes.values() for d in aristas), dtype=np.int64)
+            relaciones = np.fromiter((r for aristas in self.salientes.values() for r in aristas.values()),
+                                     dtype=np.uint8)
+            self._csr = {
+                'salientes': self._armar_csr(origenes, destinos, relaciones, cantidad),
+                'entrantes': self._armar_csr(destinos, origenes, relaciones, cantidad),
+            }
+        return self._csr
+
+    @staticmethod
+    def _armar_csr(desde, hacia, relaciones, cantidad):
+        orden = np.argsort(desde, kind='stable')
+        offsets = np.zeros(cantidad + 1, dtype=np.int64)
+        np.cumsum(np.bincount(desde, minlength=cantidad), out=offsets[1:])
+        return offsets, hacia[orden], relaciones[orden]
+
+    def recorrer(self, norma, direccion='entrantes', profundidad=1, relaciones=None, limite=500):
+        """BFS desde una norma.
+
+        direccion='entrantes' responde "qué cita a X" (y, con profundidad > 1, qué cita a esas); 'salientes'
+        responde "qué cita / modifica X". `relaciones` restringe a ciertas aristas (p. ej. ('modifica',)).
+        Devuelve None si la norma no aparece en el grafo.
+        """
+        inicio = next((self.posicion[n] for n in (normalizar_referencia(norma), norma.strip().lower(), f"medida {norma}")
+                       if n in self.posicion), None)
+        if inicio is None:
+            return None
+        offsets, vecinos, tipos = self._compilar()[direccion]
+        permitidas = None if not relaciones else {RELACIONES.index(r) for r in relaciones}
+        profundidad = min(max(profundidad, 1), PROFUNDIDAD_MAXIMA)
+
+        visitados = {inicio: 0}
+        resultados = []
+        cola = deque([inicio])
+        truncado = False
+        while cola and not truncado:
+            actual = cola.popleft()
+            nivel = visitados[actual]
+            if nivel >= profundidad:
+                continue
+            for vecino, tipo in zip(vecinos[offsets[actual]:offsets[actual + 1]].tolist(),
+                                    tipos[offsets[actual]:offsets[actual + 1]].tolist()):
+                if vecino in visitados or (permitidas is not None and tipo not in permitidas):
+                    continue
+                visitados[vecino] = nivel + 1
+                resultados.append(dict(self.describir(vecino), profundidad=nivel + 1, relacion=RELACIONES[tipo],
+                                       via=self.nodos[actual]))
+                cola.append(vecino)
+                if len(resultados) >= limite:
+                    truncado = True
+                    break
+        return {'norma': self.describir(inicio), 'direccion': direccion, 'profundidad': profundidad,
+                'total': len(resultados), 'truncado': truncado, 'resultados': resultados}
+
+    def describir(self, posicion):
+        fecha = str(self.fechas[posicion])
+        return {
+            'norma': self.nodos[posicion],
+            'clave': self.claves[posicion] or None,
+            'fecha_boletin': f"{fecha[:4]}-{fecha[4:6]}-{fecha[6:]}" if len(fecha) == 8 else None,
+        }
+
+    def resumen(self):
+        offsets, _, tipos = self._compilar()['salientes']
+        return {
+            'normas': len(self.nodos),
+            'medidas': len(self.medidas),
+            'aristas': int(offsets[-1]),
+            'aristas_por_relacion': {r: int((tipos == i).sum()) for i, r in enumerate(RELACIONES)}
+        }
+
+    # --- Persistencia ---
+
+    def guardar(self, path):
+        offsets, destinos, relaciones = self._compilar()['salientes']
+        # Aristas por medida, también en CSR (fila = medida), para poder reemplazarlas al re-agregar
+        medidas = sorted(self.medidas)
+        aportes = [self.medidas[clave][2] for clave in medidas]
+        medidas_offsets = np.zeros(len(medidas) + 1, dtype=np.int64)
+        np.cumsum([len(aristas) for aristas in aportes], out=medidas_offsets[1:])
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f, version=np.array([self.VERSION]),
+                nodos=np.array(self.nodos, dtype=str),
+                claves=np.array(self.claves, dtype=str),
+                fechas=np.array(self.fechas, dtype=np.uint32),
+                offsets=offsets,
+                destinos=destinos.astype(np.uint32),
+                relaciones=relaciones,
+                medidas=np.array(medidas, dtype=str),
+                medidas_nodo=np.array([self.medidas[clave][0] for clave in medidas], dtype=np.uint32),
+                medidas_fecha=np.array([self.medidas[clave][1] for clave in medidas], dtype=np.uint32),
+                medidas_offsets=medidas_offsets,
+                medidas_destinos=np.fromiter((d for aristas in aportes for d in aristas), dtype=np.uint32),
+                medidas_relaciones=np.fromiter((r for aristas in aportes for r in aristas.values()), dtype=np.uint8))
+
+    @classmethod
+    def cargar(cls, path):
+        grafo = cls()
+        with np.load(path, allow_pickle=False) as datos:
+            grafo.nodos = [str(n) for n in datos['nodos']]
+            grafo.claves = [str(c) for c in datos['claves']]
+            grafo.fechas = datos['fechas'].tolist()
+            offsets = datos['offsets']
+            destinos = datos['destinos'].astype(np.int64)
+            relaciones = datos['relaciones']
+            if int(datos['version'][0]) >= 2:
+                medidas = [str(c) for c in datos['medidas']]
+                medidas_nodo = datos['medidas_nodo'].tolist()
+                medidas_fecha = datos['medidas_fecha'].tolist()
+                medidas_offsets = datos['medidas_offsets'].tolist()
+                medidas_destinos = datos['medidas_destinos'].tolist()
+                medidas_relaciones = datos['medidas_relaciones'].tolist()
+            else:
+                medidas = None
+        grafo.posicion = {nodo: i for i, nodo in enumerate(grafo.nodos)}
+        for origen in np.flatnonzero(np.diff(offsets)).tolist():
+            inicio, fin = offsets[origen], offsets[origen + 1]
+            grafo.salientes[origen] = dict(zip(destinos[inicio:fin].tolist(), relaciones[inicio:fin].tolist()))
+        if medidas is None:
+            # Versión 1 (sin aristas por medida): se le atribuyen al nodo entero a su medida representativa
+            medidas = [(c, nodo, grafo.fechas[nodo], grafo.salientes.get(nodo, {}))
+                       for nodo, c in enumerate(grafo.claves) if c]
+        else:
+            medidas = [(c, medidas_nodo[i], medidas_fecha[i],
+                        dict(zip(medidas_destinos[medidas_offsets[i]:medidas_offsets[i + 1]],
+                                 medidas_relaciones[medidas_offsets[i]:medidas_offsets[i + 1]])))
+                       for i, c in enumerate(medidas)]
+        for clave, nodo, fecha, aristas in medidas:
+            grafo.medidas[clave] = (nodo, fecha, dict(aristas))
+            grafo.medidas_nodo.setdefault(nodo, set()).add(clave)
+        return grafo
+
+
+def reconstruir():
+    """Re-arma el grafo desde data/raw + data/analyzed (migración inicial o reparación) y lo sube"""
+    from pathlib import Path
+    from analyzer import BatchAnalyzer
+
+    batch = BatchAnalyzer()
+    grafo = GrafoCitas()
+    archivos = [f for f in batch.list_hostinger_files('raw') if f.endswith('.json')]
+    print(f"Armando el grafo de citas con {len(archivos)} medidas...")
+    for i, archivo in enumerate(archivos, 1):
+        stem = Path(archivo).stem
+        medida_data = batch.download_json_from_hostinger(f'raw/{archivo}')
+        if medida_data:
+            grafo.agregar_medida(stem, medida_data,
+                                 batch.download_json_from_hostinger(f'analyzed/{stem}_analysis_agnostic.json'))
+        if i % 1000 == 0:
+            print(f"{i}/{len(archivos)}")
+    batch.guardar_estado(GrafoCitas.ARCHIVO, grafo.guardar)
+    print(f"✓ Grafo de citas reconstruido: {grafo.resumen()}")
+
+
+if __name__ == '__main__':
+    reconstruir()
@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+import multiprocessing
+
+# Configuración de producción de la API (Render): gunicorn -c src/gunicorn.conf.py wsgi:app
+# Workers = procesos (aislamiento, CPU); threads = requests concurrentes por worker mientras esperan FTP.
+# Las cachés compartidas entre workers viven en disco (BORA_API_CACHE_DIR), no en memoria.
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = f"0.0.0.0:{os.getenv('PORT', 10000)}"
+# Pocos workers por defecto: cada uno carga sus propias copias de los índices (búsqueda, entidades, citas).
+# Los re-análisis (Gemini + torch) corren en un proceso aparte que termina con el trabajo. La concurrencia de
+# I/O la dan los threads; subir BORA_API_WORKERS sólo con memoria.
+workers = int(os.getenv('BORA_API_WORKERS', min(multiprocessing.cpu_count(), 2)))
+worker_class = 'gthread'
+threads = int(os.getenv('BORA_API_THREADS', 8))
+
+# Con gthread es sólo el timeout del heartbeat: si el proceso worker deja de avisar al master (p. ej. trabado
+# entero) se lo reinicia, pero un request lento en un thread no lo corta. Lo que acota cada request es el
+# timeout del FTP (BORA_FTP_TIMEOUT); lo que puede tardar minutos (exportaciones, re-análisis) va a la cola
+# de trabajos y el request responde 202 enseguida.
+timeout = int(os.getenv('BORA_API_TIMEOUT', 120))
+# SIGTERM (deploy/redeploy en Render): se dejan terminar los requests y trabajos en curso
+graceful_timeout = int(os.getenv('BORA_API_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+# Reciclar workers de a poco acota la memoria de las cachés en proceso (índices cargados, modelos)
+max_requests = int(os.getenv('BORA_API_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+backlog = 256
+
+accesslog = '-'
+errorlog = '-'
+
+
+def worker_exit(server, worker):
+    from api import cerrar_recursos
+    cerrar_recursos(graceful_timeout)
+
+
+def on_starting(server):
+    # Métricas compartidas entre workers (api.METRICAS_DIR, mismo default de BORA_API_CACHE_DIR): las de un
+    # arranque anterior no son de este servidor; Prometheus ve el reinicio de contadores como tal
+    cache_dir = os.getenv('BORA_API_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'bora_api_cache'))
+    shutil.rmtree(os.path.join(cache_dir, 'metricas'), ignore_errors=True)
+    server.log.info(f"API BORA: {workers} workers x {threads} threads, heartbeat timeout {timeout}s")
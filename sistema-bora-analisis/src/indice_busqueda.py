@@ -0,0 +1,219 @@
+import os
+import re
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import unicodedata
+
+
+def _sin_acentos(texto):
+    return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+
+
+def raiz_palabra(palabra):
+    """Stemming liviano para español: sólo plurales (resoluciones -> resolucion, jueces -> juez)"""
+    if len(palabra) <= 4 or palabra.isdigit():
+        return palabra
+    if palabra.endswith('ces'):
+        return palabra[:-3] + 'z'
+    if palabra.endswith('es') and palabra[-3] not in 'aeiou':
+        return palabra[:-2]
+    if palabra.endswith('s') and palabra[-2] in 'aeiou':
+        return palabra[:-1]
+    return palabra
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y con plurales reducidos; se aplica igual al indexar y al consultar"""
+    palabras = re.findall(r'\w+', _sin_acentos(texto or '').lower())
+    return ' '.join(raiz_palabra(p) for p in palabras)
+
+
+def consulta_fts(consulta):
+    """Convierte la búsqueda del usuario en una expresión FTS5 segura.
+
+    Los términos se combinan con AND, "frases entre comillas" se respetan, `design*` busca por prefijo y
+    se admite OR entre términos. Un término con separadores (p. ej. 50/2019) se busca como frase.
+    """
+    partes = []
+    for frase, termino in re.findall(r'"([^"]*)"|(\S+)', consulta or ''):
+        if termino == 'OR':
+            if partes and partes[-1] != 'OR':
+                partes.append('OR')
+            continue
+        normalizado = normalizar(frase or termino)
+        if normalizado:
+            partes.append(f'"{normalizado}"' + ('*' if termino.endswith('*') else ''))
+    while partes and partes[-1] == 'OR':
+        partes.pop()
+    if partes and partes[0] == 'OR':
+        partes.pop(0)
+    return ' '.join(partes)
+
+
+class IndiceBusqueda:
+    """Índice de texto completo (SQLite FTS5) sobre título, texto y secciones de cada medida.
+
+    La tabla FTS es contentless (sólo el índice, sin copia del texto) para que el archivo que se sube a
+    Hostinger sea chico. Una tabla contentless no puede borrar filas sin los valores originales, así que al
+    re-indexar: con SQLite >= 3.43 (contentless_delete) se borran los postings viejos; con versiones
+    anteriores la medida recibe un rowid que nunca se usó en el índice y los postings viejos quedan
+    huérfanos, descartados en el JOIN con `medidas`. En ningún caso un rowid con postings se reutiliza.
+    """
+
+    ARCHIVO = 'busqueda.sqlite'
+    PESOS_BM25 = (10.0, 1.0, 3.0)  # titulo, texto, secciones
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(tempfile.gettempdir(), 'bora_' + self.ARCHIVO)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        opciones_fts = ", contentless_delete=1" if sqlite3.sqlite_version_info >= (3, 43, 0) else ""
+        self.conn.executescript(f'''
+            CREATE TABLE IF NOT EXISTS medidas (
+                id INTEGER PRIMARY KEY,
+                clave TEXT UNIQUE NOT NULL,
+                numero_medida INTEGER,
+                fecha TEXT,
+                titulo TEXT,
+                url TEXT,
+                resumen TEXT,
+                huella TEXT
+            );
+            CREATE INDEX IF NOT EXISTS medidas_fecha ON medidas(fecha);
+            CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(
+                titulo, texto, secciones, content=''{opciones_fts}, tokenize='unicode61 remove_diacritics 2'
+            );
+        ''')
+        # Un índice creado con otra versión de SQLite puede no admitir DELETE (se decide por el esquema real)
+        esquema = self.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'fts'").fetchone()[0]
+        self.borra_postings = 'contentless_delete' in esquema
+        self.pendientes = 0
+
+    @classmethod
+    def cargar(cls, path):
+        """Toma posesión de un archivo descargado (lo mueve al path de trabajo) y lo abre"""
+        indice = cls.__new__(cls)
+        destino = os.path.join(tempfile.gettempdir(), 'bora_' + cls.ARCHIVO)
+        shutil.move(path, destino)
+        cls.__init__(indice, destino)
+        return indice
+
+    @classmethod
+    def solo_lectura(cls, path):
+        """Conexión de sólo lectura para la API (una por request; sqlite3 no comparte cursores entre hilos)"""
+        return sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+
+    def agregar(self, clave, medida_data):
+        """Indexa (o re-indexa si cambió el texto) una medida raw. Devuelve True si escribió algo."""
+        texto = medida_data.get('texto_completo_limpio', '') or ''
+        titulo = medida_data.get('titulo_raw', '') or ''
+        estructura = medida_data.get('estructura_detectada', {}) or {}
+        secciones = ' '.join(f"{nombre} {datos.get('contenido', '')}" for nombre, datos in estructura.items()
+                             if isinstance(datos, dict))
+        huella = hashlib.sha1(f'{titulo}\x00{texto}\x00{secciones}'.encode('utf-8')).hexdigest()
+
+        fila = self.conn.execute('SELECT id, huella FROM medidas WHERE clave = ?', (clave,)).fetchone()
+        if fila and fila[1] == huella:
+            return False
+        if fila:
+            self.conn.execute('DELETE FROM medidas WHERE clave = ?', (clave,))
+            if self.borra_postings:
+                self.conn.execute('DELETE FROM fts WHERE rowid = ?', (fila[0],))
+
+        # max sobre ambas tablas: el rowid de la medida re-indexada (la última) no se reutiliza aunque sus
+        # postings sigan en el índice
+        nuevo_id = self.conn.execute(
+            'SELECT max(coalesce((SELECT max(id) FROM medidas), 0), coalesce((SELECT max(rowid) FROM fts), 0)) + 1'
+        ).fetchone()[0]
+        self.conn.execute(
+            'INSERT INTO medidas (id, clave, numero_medida, fecha, titulo, url, resumen, huella) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (nuevo_id, clave, medida_data.get('numero_medida'), str(medida_data.get('fecha_boletin') or ''), titulo,
+             medida_data.get('url'), texto[:300], huella))
+        self.conn.execute('INSERT INTO fts (rowid, titulo, texto, secciones) VALUES (?, ?, ?, ?)',
+                          (nuevo_id, normalizar(titulo), normalizar(texto), normalizar(secciones)))
+        self.pendientes += 1
+        if self.pendientes >= 500:
+            self.conn.commit()
+            self.pendientes = 0
+        return True
+
+    def guardar(self, path):
+        """Copia consistente del índice a `path` (para subirlo a Hostinger)"""
+        self.conn.commit()
+        self.pendientes = 0
+        destino = sqlite3.connect(path)
+        try:
+            self.conn.backup(destino)
+        finally:
+            destino.close()
+
+    def cerrar(self):
+        self.conn.commit()
+        self.conn.close()
+
+    @classmethod
+    def buscar(cls, conn, consulta, desde=None, hasta=None, pagina=1, por_pagina=20):
+        """Búsqueda rankeada (bm25 ponderado por campo) con filtro de fechas y paginación"""
+        expresion = consulta_fts(consulta)
+        if not expresion:
+            return {'consulta_fts': '', 'total': 0, 'pagina': pagina, 'por_pagina': por_pagina, 'resultados': []}
+
+        filtros, parametros = ['fts MATCH ?'], [expresion]
+        if desde:
+            filtros.append('m.fecha >= ?')
+            parametros.append(desde)
+        if hasta:
+            filtros.append('m.fecha <= ?')
+            parametros.append(hasta)
+        where = ' AND '.join(filtros)
+
+        total = conn.execute(f'SELECT count(*) FROM fts JOIN medidas m ON m.id = fts.rowid WHERE {where}',
+                             parametros).fetchone()[0]
+        filas = conn.execute(
+            f'''SELECT m.clave, m.numero_medida, m.fecha, m.titulo, m.url, m.resumen, bm25(fts, ?, ?, ?) AS score
+                FROM fts JOIN medidas m ON m.id = fts.rowid
+                WHERE {where}
+                ORDER BY score
+                LIMIT ? OFFSET ?''',
+            (*cls.PESOS_BM25, *parametros, por_pagina, (pagina - 1) * por_pagina)).fetchall()
+        return {
+            'consulta_fts': expresion,
+            'total': total,
+            'pagina': pagina,
+            'por_pagina': por_pagina,
+            'resultados': [
+                {'clave': clave, 'numero_medida': numero, 'fecha_boletin': fecha, 'titulo': titulo, 'url': url,
+                 'resumen': resumen, 'relevancia': round(-score, 4)}
+                for clave, numero, fecha, titulo, url, resumen, score in filas
+            ]
+        }
+
+    def total_medidas(self):
+        return self.conn.execute('SELECT count(*) FROM medidas').fetchone()[0]
+
+
+def reconstruir():
+    """Re-indexa todo data/raw (migración inicial o reparación) y sube el índice a Hostinger"""
+    from pathlib import Path
+    from analyzer import BatchAnalyzer
+
+    batch = BatchAnalyzer()
+    path = os.path.join(tempfile.gettempdir(), 'bora_' + IndiceBusqueda.ARCHIVO)
+    if os.path.exists(path):
+        os.remove(path)
+    indice = IndiceBusqueda(path)
+    archivos = [f for f in batch.list_hostinger_files('raw') if f.endswith('.json')]
+    print(f"Re-indexando {len(archivos)} medidas raw...")
+    for i, archivo in enumerate(archivos, 1):
+        medida_data = batch.download_json_from_hostinger(f'raw/{archivo}')
+        if medida_data:
+            indice.agregar(Path(archivo).stem, medida_data)
+        if i % 1000 == 0:
+            print(f"{i}/{len(archivos)}")
+    batch.guardar_estado(IndiceBusqueda.ARCHIVO, indice.guardar)
+    print(f"✓ Índice de búsqueda reconstruido: {indice.total_medidas()} medidas.")
+
+
+if __name__ == '__main__':
+    reconstruir()
@@ -0,0 +1,263 @@
+import re
+import unicodedata
+
+import numpy as np
+
+
+TIPOS = ('entidad', 'referencia', 'autoridad')
+CAMPOS_IA = {
+    'entidad': 'entidades_mencionadas',
+    'referencia': 'referencias_normativas',
+    'autoridad': 'autoridades_involucradas',
+}
+
+# Tipo de norma canónico; el orden importa (las formas compuestas antes que las simples)
+TIPOS_NORMA = (
+    (r'decretos? de necesidad y urgencia|dnu', 'decreto'),
+    (r'decisi[oó]n(?:es)? administrativas?', 'decision_administrativa'),
+    (r'resoluci[oó]n(?:es)? conjuntas?', 'resolucion_conjunta'),
+    (r'resoluci[oó]n(?:es)? generales?', 'resolucion_general'),
+    (r'resoluci[oó]n(?:es)?', 'resolucion'),
+    (r'decretos?', 'decreto'),
+    (r'leyes|ley', 'ley'),
+    (r'disposici[oó]n(?:es)?', 'disposicion'),
+    (r'comunicaci[oó]n(?:es)?', 'comunicacion'),
+)
+_PATRON_NORMA = re.compile(
+    r'\b(' + '|'.join(p for p, _ in TIPOS_NORMA) + r')\b\.?\s*(?:n(?:ro|[°ºo])?\.?\s*)?'
+    r'(\d{1,3}(?:\.\d{3})+|\d+)(?:\s*/\s*(\d{4}|\d{2})\b)?',
+    re.IGNORECASE)
+
+
+def _sin_acentos(texto):
+    return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+
+
+def _texto(valor):
+    """Gemini a veces devuelve objetos en lugar de strings ({'nombre': ..., 'rol': ...})"""
+    if isinstance(valor, dict):
+        valor = valor.get('nombre') or valor.get('name') or next((v for v in valor.values() if isinstance(v, str)), '')
+    return valor if isinstance(valor, str) else ''
+
+
+def normalizar_nombre(valor):
+    """Clave de búsqueda de un organismo o persona: minúsculas, sin acentos ni puntuación"""
+    return ' '.join(re.findall(r'\w+', _sin_acentos(_texto(valor)).lower()))
+
+
+def anio_completo(anio):
+    if len(anio) == 4:
+        return anio
+    return ('19' if int(anio) >= 50 else '20') + anio
+
+
+def normalizar_referencia(valor):
+    """Identificador canónico de una norma: 'Decreto N° 50/19' -> 'decreto 50/2019', 'Ley 27.541' -> 'ley 27541'.
+
+    Si no se reconoce el tipo de norma se devuelve el texto normalizado, para no perder la referencia.
+    """
+    texto = _texto(valor)
+    coincidencia = _PATRON_NORMA.search(_sin_acentos(texto))
+    if not coincidencia:
+        return normalizar_nombre(texto)
+    return _canonica(coincidencia)
+
+
+def _canonica(coincidencia):
+    tipo_texto, numero, anio = coincidencia.groups()
+    tipo = next(t for p, t in TIPOS_NORMA if re.fullmatch(_sin_acentos(p), tipo_texto.lower()))
+    numero = str(int(numero.replace('.', '')))
+    return f"{tipo} {numero}/{anio_completo(anio)}" if anio else f"{tipo} {numero}"
+
+
+def referencias_en_texto(texto):
+    """(posición, identificador canónico) de cada norma citada en un texto libre"""
+    for coincidencia in _PATRON_NORMA.finditer(_sin_acentos(texto or '')):
+        yield coincidencia.start(), _canonica(coincidencia)
+
+
+NORMALIZADORES = {
+    'entidad': normalizar_nombre,
+    'referencia': normalizar_referencia,
+    'autoridad': normalizar_nombre,
+}
+
+
+def fecha_entera(fecha):
+    """'2024-01-02' -> 20240102 (0 si no hay fecha)"""
+    digitos = re.sub(r'\D', '', str(fecha or ''))[:8]
+    return int(digitos) if len(digitos) == 8 else 0
+
+
+class IndiceEntidades:
+    """Índice invertido término normalizado (entidad, referencia normativa o autoridad) -> medidas.
+
+    Cada medida recibe un id secuencial; las listas de ids por término crecen en orden, así que se
+    guardan como un único arreglo CSR (offsets + ids) con los ids codificados en deltas y comprimidos.
+    Re-indexar una medida le da un id nuevo y marca el anterior como borrado.
+    """
+
+    ARCHIVO = 'indice_entidades.npz'
+    VERSION = 1
+    BORRADA = 0xFFFFFFFF  # fecha de un id reemplazado por una re-indexación (0 = medida sin fecha)
+
+    def __init__(self):
+        self.claves = []
+        self.numeros = []
+        self.fechas = []
+        self.id_por_clave = {}
+        self.terminos = {}  # (tipo, termino) -> posición
+        self.nombres = []   # nombre original (el primero visto) de cada término
+        self.postings = []  # lista de ids de medidas por término
+        self._fechas_np = None
+
+    def agregar_analisis(self, clave, analisis):
+        """Indexa las entidades/referencias/autoridades detectadas por IA. Devuelve la cantidad de términos."""
+        elementos = analisis.get('analisis_literal', {}).get('elementos_detectados_ia', {}) or {}
+        vistos = {}
+        for tipo in TIPOS:
+            valores = elementos.get(CAMPOS_IA[tipo]) or []
+            if not isinstance(valores, list):
+                continue
+            for valor in valores:
+                termino = NORMALIZADORES[tipo](valor)
+                if termino:
+                    vistos.setdefault((tipo, termino), _texto(valor).strip())
+
+        self._fechas_np = None
+        if clave in self.id_por_clave:
+            self.fechas[self.id_por_clave[clave]] = self.BORRADA
+
+        id_medida = len(self.claves)
+        self.claves.append(clave)
+        self.numeros.append(int(analisis.get('numero_medida') or 0))
+        self.fechas.append(fecha_entera(analisis.get('fecha_boletin')))
+        self.id_por_clave[clave] = id_medida
+        for termino, nombre in vistos.items():
+            posicion = self.terminos.get(termino)
+            if posicion is None:
+                posicion = self.terminos[termino] = len(self.nombres)
+                self.nombres.append(nombre)
+                self.postings.append([])
+            self.postings[posicion].append(id_medida)
+        return len(vistos)
+
+    # --- Consultas ---
+
+    def _arreglo_fechas(self):
+        if self._fechas_np is None:
+            self._fechas_np = np.asarray(self.fechas, dtype=np.int64)
+        return self._fechas_np
+
+    def medidas(self, tipo, nombre, desde=None, hasta=None, limite=100, pagina=1):
+        """Medidas que mencionan el término, más recientes primero, filtradas por rango de fechas"""
+        posicion = self.terminos.get((tipo, NORMALIZADORES[tipo](nombre)))
+        if posicion is None:
+            return None
+        ids = np.asarray(self.postings[posicion], dtype=np.int64)
+        fechas = self._arreglo_fechas()[ids]
+        filtro = fechas != self.BORRADA
+        if desde:
+            filtro &= fechas >= fecha_entera(desde)
+        if hasta:
+            filtro &= fechas <= fecha_entera(hasta)
+        ids, fechas = ids[filtro], fechas[filtro]
+        orden = np.lexsort((-ids, -fechas))
+        ids = ids[orden][(pagina - 1) * limite:pagina * limite]
+        return {
+            'tipo': tipo,
+            'termino': self.nombres[posicion],
+            'total': int(filtro.sum()),
+            'pagina': pagina,
+            'medidas': [{'clave': self.claves[i], 'numero_medida': self.numeros[i],
+                         'fecha_boletin': self._fecha_iso(self.fechas[i])} for i in ids.tolist()]
+        }
+
+    def terminos_frecuentes(self, tipo=None, prefijo='', limite=50):
+        """Términos por cantidad de medidas (para autocompletar o explorar); prefijo sobre el término normalizado"""
+        normalizado = NORMALIZADORES.get(tipo, normalizar_nombre)(prefijo) if prefijo else ''
+        candidatos = [(t, p) for (t, termino), p in self.terminos.items()
+                      if (tipo is None or t == tipo) and termino.startswith(normalizado)]
+        fechas = self._arreglo_fechas()
+        conteos = [(t, p, int((fechas[self.postings[p]] != self.BORRADA).sum())) for t, p in candidatos]
+        conteos.sort(key=lambda x: x[2], reverse=True)
+        return [{'tipo': t, 'termino': self.nombres[p], 'medidas': n} for t, p, n in conteos[:limite] if n]
+
+    @staticmethod
+    def _fecha_iso(fecha):
+        fecha = str(fecha)
+        return f"{fecha[:4]}-{fecha[4:6]}-{fecha[6:]}" if len(fecha) == 8 else None
+
+    # --- Persistencia ---
+
+    def guardar(self, path):
+        orden = list(self.terminos.items())
+        largos = np.array([len(self.postings[p]) for _, p in orden], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(largos))).astype(np.int64)
+        if orden:
+            ids = np.concatenate([np.asarray(self.postings[p], dtype=np.int64) for _, p in orden])
+            deltas = np.diff(ids, prepend=0)
+            deltas[offsets[:-1][largos > 0]] = ids[offsets[:-1][largos > 0]]  # cada lista arranca en absoluto
+        else:
+            deltas = np.zeros(0, dtype=np.int64)
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f, version=np.array([self.VERSION]),
+                claves=np.array(self.claves, dtype=str),
+                numeros=np.array(self.numeros, dtype=np.int64),
+                fechas=np.array(self.fechas, dtype=np.uint32),
+                tipos=np.array([TIPOS.index(t) for (t, _), _ in orden], dtype=np.uint8),
+                terminos=np.array([termino for (_, termino), _ in orden], dtype=str),
+                nombres=np.array([self.nombres[p] for _, p in orden], dtype=str),
+                offsets=offsets,
+                deltas=deltas.astype(np.uint32))
+
+    @classmethod
+    def cargar(cls, path):
+        indice = cls()
+        with np.load(path, allow_pickle=False) as datos:
+            indice.claves = [str(c) for c in datos['claves']]
+            indice.numeros = datos['numeros'].tolist()
+            indice.fechas = datos['fechas'].tolist()
+            offsets = datos['offsets']
+            deltas = datos['deltas'].astype(np.int64)
+            tipos, terminos, nombres = datos['tipos'], datos['terminos'], datos['nombres']
+        indice.id_por_clave = {}
+        for id_medida, clave in enumerate(indice.claves):
+            indice.id_por_clave[clave] = id_medida  # el último id de una clave re-indexada es el vigente
+        for posicion in range(len(terminos)):
+            inicio, fin = offsets[posicion], offsets[posicion + 1]
+            indice.terminos[(TIPOS[tipos[posicion]], str(terminos[posicion]))] = posicion
+            indice.nombres.append(str(nombres[posicion]))
+            indice.postings.append(np.cumsum(deltas[inicio:fin]).tolist())
+        return indice
+
+    def resumen(self):
+        return {
+            'medidas_indexadas': len(self.id_por_clave),
+            'terminos': {t: sum(1 for (tipo, _) in self.terminos if tipo == t) for t in TIPOS}
+        }
+
+
+def reconstruir():
+    """Re-indexa todos los análisis de data/analyzed (migración inicial o reparación) y sube el índice"""
+    from pathlib import Path
+    from analyzer import BatchAnalyzer
+
+    batch = BatchAnalyzer()
+    indice = IndiceEntidades()
+    sufijo = '_analysis_agnostic.json'
+    archivos = [f for f in batch.list_hostinger_files('analyzed') if f.endswith(sufijo)]
+    print(f"Re-indexando entidades de {len(archivos)} análisis...")
+    for i, archivo in enumerate(archivos, 1):
+        analisis = batch.download_json_from_hostinger(f'analyzed/{archivo}')
+        if analisis:
+            indice.agregar_analisis(Path(archivo).name[:-len(sufijo)], analisis)
+        if i % 1000 == 0:
+            print(f"{i}/{len(archivos)}")
+    batch.guardar_estado(IndiceEntidades.ARCHIVO, indice.guardar)
+    print(f"✓ Índice de entidades reconstruido: {indice.resumen()}")
+
+
+if __name__ == '__main__':
+    reconstruir()
@@ -0,0 +1,205 @@
+import re
+import ftplib
+
+import serializacion
+from compresion import Descompresor
+
+
+# Lectura selectiva de JSON grandes (las medidas raw cargan decenas de KB de HTML): se recorre el documento
+# por bloques, los valores que no interesan se saltean sin decodificarlos y la lectura termina apenas
+# aparecen todos los campos pedidos. Memoria y CPU dependen de los campos pedidos, no del tamaño del HTML.
+
+BLOQUE = 64 * 1024
+DIRECTORIO_METADATOS = 'data/raw_meta'
+# Lo que el censo de tipos necesita de cada medida; el scraper lo guarda aparte (data/raw_meta/<archivo>)
+CAMPOS_METADATOS = ('numero_medida', 'fecha_boletin', 'titulo_raw', 'tiene_pdf', 'contenido_html_completo.titulo')
+CAMPOS_PESADOS = ('contenido_html_completo',)  # HTML crudo: el análisis usa el texto limpio
+
+_NO_BLANCO = re.compile(rb'\S')
+_CUERPO_STRING = re.compile(rb'(?:[^"\\]++|\\.)*+', re.DOTALL)
+_ESTRUCTURA = re.compile(rb'["{}\[\]]')
+_FIN_ESCALAR = re.compile(rb'[,}\]\s]')
+
+
+class JSONParcialError(ValueError):
+    pass
+
+
+class _Flujo:
+    """Buffer sobre un iterable de bloques de bytes; sólo retiene lo que falta leer (o lo que se está capturando)"""
+
+    def __init__(self, bloques):
+        self.bloques = iter(bloques)
+        self.buffer = b''
+        self.pos = 0
+        self.ancla = None  # inicio del valor que se está capturando
+
+    def cargar(self):
+        """Agrega el próximo bloque descartando lo ya leído; devuelve cuántos bytes se corrieron las posiciones"""
+        bloque = next(self.bloques, None)
+        if bloque is None:
+            raise JSONParcialError('JSON truncado')
+        corte = self.pos if self.ancla is None else min(self.pos, self.ancla)
+        self.buffer = self.buffer[corte:] + bloque
+        self.pos -= corte
+        if self.ancla is not None:
+            self.ancla -= corte
+        return corte
+
+    def buscar(self, patron, desde):
+        """Posición en el buffer del próximo match (de un byte) desde `desde`, cargando bloques si hace falta"""
+        while True:
+            coincidencia = patron.search(self.buffer, desde)
+            if coincidencia:
+                return coincidencia.start()
+            desde = len(self.buffer)
+            desde -= self.cargar()
+
+    def siguiente(self):
+        """Próximo byte no blanco, sin consumirlo"""
+        self.pos = self.buscar(_NO_BLANCO, self.pos)
+        return self.buffer[self.pos:self.pos + 1]
+
+    def esperar(self, caracteres):
+        c = self.siguiente()
+        if c not in caracteres:
+            raise JSONParcialError(f"Se esperaba {caracteres!r} y vino {c!r}")
+        self.pos += 1
+        return c
+
+    def saltear_string(self):
+        """self.pos está en la comilla de apertura; queda después de la de cierre"""
+        i = self.pos + 1
+        while True:
+            # Un solo match en C recorre el string hasta la comilla de cierre o el final del buffer
+            i = _CUERPO_STRING.match(self.buffer, i).end()
+            if self.buffer[i:i + 1] == b'"':
+                self.pos = i + 1
+                return
+            i -= self.cargar()  # el string (o un escape partido) sigue en el próximo bloque
+
+    def saltear_valor(self):
+        c = self.siguiente()
+        if c == b'"':
+            return self.saltear_string()
+        if c not in (b'{', b'['):
+            self.pos = self.buscar(_FIN_ESCALAR, self.pos)  # dentro de un objeto siempre sigue ',' o '}'
+            return
+        profundidad = 0
+        while True:
+            self.pos = self.buscar(_ESTRUCTURA, self.pos)
+            c = self.buffer[self.pos:self.pos + 1]
+            if c == b'"':
+                self.saltear_string()
+                continue
+            self.pos += 1
+            profundidad += 1 if c in (b'{', b'[') else -1
+            if profundidad == 0:
+                return
+
+    def leer_valor(self):
+        self.siguiente()
+        self.ancla = self.pos
+        try:
+            self.saltear_valor()
+            return serializacion.loads(self.buffer[self.ancla:self.pos])
+        finally:
+            self.ancla = None
+
+
+def _objeto(flujo, prefijo, pedidos, encontrados, excluir):
+    """Recorre un objeto; devuelve True si ya están todos los campos pedidos (para cortar la lectura)"""
+    flujo.esperar(b'{')
+    if flujo.siguiente() == b'}':
+        flujo.pos += 1
+        return False
+    while True:
+        if flujo.siguiente() != b'"':
+            raise JSONParcialError('Se esperaba una clave')
+        clave = flujo.leer_valor()
+        ruta = f"{prefijo}{clave}"
+        flujo.esperar(b':')
+        if pedidos is None and not prefijo:
+            if clave in excluir:
+                flujo.saltear_valor()
+            else:
+                encontrados[clave] = flujo.leer_valor()
+        elif pedidos is not None and ruta in pedidos:
+            encontrados[ruta] = flujo.leer_valor()
+            if len(encontrados) == len(pedidos):
+                return True
+        elif pedidos is not None and flujo.siguiente() == b'{' and any(p.startswith(ruta + '.') for p in pedidos):
+            if _objeto(flujo, ruta + '.', pedidos, encontrados, excluir):
+                return True
+        else:
+            flujo.saltear_valor()
+        if flujo.esperar(b',}') == b'}':
+            return False
+
+
+def _descomprimidos(bloques):
+    """Los archivos de Hostinger pueden venir comprimidos (gzip/zstd): se descomprime al vuelo"""
+    salida = []
+    descompresor = Descompresor(salida.append)
+    for bloque in bloques:
+        descompresor(bloque)
+        yield from salida
+        salida.clear()
+    descompresor.cerrar()
+    yield from salida
+
+
+def _bloques_archivo(path):
+    with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(BLOQUE), b'')
+
+
+def leer_campos(fuente, campos=None, excluir=()):
+    """Lee sólo algunos campos de un JSON (path local o iterable de bloques de bytes, comprimido o no).
+
+    `campos` son rutas ('titulo_raw', 'contenido_html_completo.titulo') y el resultado es {ruta: valor} con
+    las que aparecieron; la lectura se corta apenas están todas. Con campos=None se devuelven todas las claves
+    de primer nivel salvo las de `excluir`, que se saltean sin decodificar.
+    """
+    bloques = _bloques_archivo(fuente) if isinstance(fuente, str) else fuente
+    pedidos = set(campos) if campos is not None else None
+    encontrados = {}
+    try:
+        if pedidos != set():
+            _objeto(_Flujo(_descomprimidos(bloques)), '', pedidos, encontrados, set(excluir))
+    finally:
+        if hasattr(bloques, 'close'):
+            bloques.close()
+    return encontrados
+
+
+def bloques_ftp(ftp, remoto):
+    """Bloques de un RETR; si quien lee corta antes del final, se aborta la transferencia y la conexión sigue usable"""
+    ftp.voidcmd('TYPE I')
+    conexion = ftp.transfercmd(f'RETR {remoto}')
+    try:
+        yield from iter(lambda: conexion.recv(BLOQUE), b'')
+    finally:
+        conexion.close()
+        try:
+            ftp.voidresp()
+        except ftplib.all_errors:
+            pass  # 426: transferencia cortada a propósito
+
+
+def leer_campos_ftp(ftp, remoto, campos=None, excluir=()):
+    return leer_campos(bloques_ftp(ftp, remoto), campos, excluir)
+
+
+def metadatos(medida_data):
+    """Sidecar de metadatos de una medida ({ruta: valor} para CAMPOS_METADATOS), como lo devuelve leer_campos"""
+    resultado = {}
+    for ruta in CAMPOS_METADATOS:
+        valor = medida_data
+        for parte in ruta.split('.'):
+            if not isinstance(valor, dict) or parte not in valor:
+                break
+            valor = valor[parte]
+        else:
+            resultado[ruta] = valor
+    return resultado
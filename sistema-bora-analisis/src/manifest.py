@@ -0,0 +1,284 @@
+import io
+import re
+import serializacion
+import ftplib
+from datetime import datetime
+
+
+ESTADOS = ('recibida', 'analizada', 'error')
+_FECHA_ARCHIVO = re.compile(r'_(\d{6})\d{2}\.json$')
+
+
+class WorkManifest:
+    """Journal append-only de trabajo (raw recibida -> analizada) en Hostinger, con compactación.
+
+    - data/manifest/journal.jsonl: una línea por evento, agregada con APPE (scraper y analyzer).
+    - data/manifest/snapshot.json: totales y medidas pendientes, resultado de compactar el journal.
+    - data/manifest/analizadas/<AAAAMM>.txt: medidas analizadas, partidas por mes del boletín (del nombre del
+      archivo). Sólo se leen los meses de las medidas de eventos nuevos, y nunca desde /api/stats.
+
+    Los estados sólo avanzan (recibida -> analizada): un 'recibida' tardío o repetido de una medida ya
+    analizada se ignora y los totales cuentan transiciones, no eventos, así que re-aplicar eventos es inocuo.
+    Descubrir trabajo pendiente cuesta O(pendientes + eventos nuevos), sin listar data/raw ni data/analyzed.
+    """
+
+    DIRECTORIO = 'data/manifest'
+    JOURNAL = 'journal.jsonl'
+    SNAPSHOT = 'snapshot.json'
+    ANALIZADAS = 'analizadas'
+
+    def __init__(self, conectar):
+        # conectar(): devuelve un ftplib.FTP logueado y posicionado en la raíz del sitio
+        self.conectar = conectar
+
+    # --- Helpers FTP ---
+
+    def _ftp_manifest(self):
+        ftp = self.conectar()
+        try:
+            ftp.cwd(self.DIRECTORIO)
+        except ftplib.error_perm:
+            try:
+                ftp.mkd('data')
+            except ftplib.error_perm:
+                pass
+            ftp.mkd(self.DIRECTORIO)
+            ftp.cwd(self.DIRECTORIO)
+        return ftp
+
+    def _leer(self, ftp, nombre):
+        buffer = io.BytesIO()
+        try:
+            ftp.retrbinary(f'RETR {nombre}', buffer.write)
+        except ftplib.error_perm:
+            return None
+        return buffer.getvalue()
+
+    # --- Escritura ---
+
+    def registrar(self, archivo, estado, **extra):
+        """Agrega un evento al journal (archivo = nombre del raw, p. ej. medida_300720_20231211.json)"""
+        self.registrar_varios([dict(archivo=archivo, estado=estado, **extra)])
+
+    def registrar_varios(self, eventos):
+        lineas = []
+        for evento in eventos:
+            if evento['estado'] not in ESTADOS:
+                raise ValueError(f"Estado de manifest desconocido: {evento['estado']}")
+            evento.setdefault('ts', datetime.now().isoformat())
+            lineas.append(serializacion.dumps(evento, pretty=False))
+        if not lineas:
+            return
+        ftp = self._ftp_manifest()
+        try:
+            ftp.storbinary(f'APPE {self.JOURNAL}', io.BytesIO(b'\n'.join(lineas) + b'\n'))
+        finally:
+            ftp.quit()
+
+    # --- Lectura ---
+
+    @staticmethod
+    def snapshot_vacio():
+        return {'version': 3, 'totales': {e: 0 for e in ESTADOS}, 'pendientes': {}, 'compactado': None}
+
+    @classmethod
+    def _cargar_snapshot(cls, contenido):
+        if not contenido:
+            return cls.snapshot_vacio()
+        snapshot = serializacion.loads(contenido)
+        # Un snapshot versión 2 trae todas las analizadas adentro: se usan tal cual y se pasan a las
+        # particiones en la próxima compactación. Uno versión 1 no las trae (se conocen al reconstruir).
+        if 'analizadas' in snapshot:
+            snapshot['analizadas'] = set(snapshot['analizadas'])
+        snapshot['version'] = 3
+        return snapshot
+
+    @staticmethod
+    def particion(archivo):
+        """Mes del boletín ('AAAAMM') según el nombre del raw (medida_<numero>_<AAAAMMDD>.json)"""
+        fecha = _FECHA_ARCHIVO.search(archivo)
+        return fecha.group(1) if fecha else 'otros'
+
+    @staticmethod
+    def aplicar(snapshot, evento, analizadas, completas=True):
+        """Aplica un evento; sólo cuenta transiciones reales (recibida -> analizada, nunca hacia atrás).
+
+        `analizadas` son las medidas ya analizadas que se conocen y se actualiza acá. Con completas=False
+        (lectura rápida) sólo incluye las de los eventos leídos: un 'analizada' de una medida que no estaba
+        pendiente puede ser un re-análisis, y no se cuenta.
+        """
+        archivo, estado = evento['archivo'], evento['estado']
+        pendientes, totales = snapshot['pendientes'], snapshot['totales']
+        if archivo in analizadas:
+            return  # 'recibida' tardío o duplicado, re-análisis o error de un re-análisis: nada cambia
+        if estado == 'recibida':
+            if archivo not in pendientes:
+                totales['recibida'] += 1
+                pendientes[archivo] = evento.get('ts')
+        elif estado == 'analizada':
+            analizadas.add(archivo)
+            if pendientes.pop(archivo, False) is False:
+                if not completas:
+                    return
+                totales['recibida'] += 1  # se analizó sin que llegara su 'recibida' (p. ej. APPE perdido)
+            totales['analizada'] += 1
+        elif estado == 'error':
+            # Sigue pendiente para reintentar; sólo se contabiliza el error
+            totales['error'] += 1
+
+    def _eventos(self, contenido):
+        for linea in (contenido or b'').splitlines():
+            if not linea.strip():
+                continue
+            try:
+                yield serializacion.loads(linea)
+            except ValueError:
+                # Línea truncada por un APPE interrumpido: se ignora
+                continue
+
+    def _journals(self, ftp):
+        """Journal actual + los que quedaron a medio compactar (se aplican en orden)"""
+        nombres = [n for n in ftp.nlst() if n.startswith(self.JOURNAL + '.')]
+        return sorted(nombres) + [self.JOURNAL]
+
+    def _leer_journals(self, ftp, nombres):
+        return [evento for nombre in nombres for evento in self._eventos(self._leer(ftp, nombre))]
+
+    def _leer_particiones(self, ftp, snapshot, archivos):
+        """Analizadas de los meses de `archivos`. Las líneas son '<archivo> <compactación>': las escritas por una
+        compactación que no llegó a guardar su snapshot se descartan (sus journals se vuelven a aplicar)."""
+        if 'analizadas' in snapshot:
+            return set(snapshot['analizadas'])
+        analizadas = set()
+        for particion in sorted({self.particion(a) for a in archivos}):
+            for linea in (self._leer(ftp, f'{self.ANALIZADAS}/{particion}.txt') or b'').decode('utf-8').splitlines():
+                archivo, _, compactado = linea.partition(' ')
+                if archivo and snapshot['compactado'] and compactado <= snapshot['compactado']:
+                    analizadas.add(archivo)
+        return analizadas
+
+    def existe(self):
+        ftp = self._ftp_manifest()
+        try:
+            return self._leer(ftp, self.SNAPSHOT) is not None
+        finally:
+            ftp.quit()
+
+    def leer_estado(self, exacto=False):
+        """Snapshot + eventos del journal aún no compactados.
+
+        La lectura rápida (la de /api/stats) no baja las particiones de analizadas: un 'recibida' repetido de
+        una medida analizada antes de la última compactación figura como pendiente hasta la próxima.
+        Con exacto=True se consultan los meses de esas medidas nuevas y se descartan las ya analizadas.
+        """
+        ftp = self._ftp_manifest()
+        try:
+            snapshot = self._cargar_snapshot(self._leer(ftp, self.SNAPSHOT))
+            previas = set(snapshot['pendientes'])
+            vistas = set(snapshot.pop('analizadas', ()))
+            for evento in self._leer_journals(ftp, self._journals(ftp)):
+                self.aplicar(snapshot, evento, vistas, completas=False)
+            nuevas = [a for a in snapshot['pendientes'] if a not in previas]
+            if exacto and nuevas:
+                for archivo in self._leer_particiones(ftp, snapshot, nuevas) & set(nuevas):
+                    del snapshot['pendientes'][archivo]
+                    snapshot['totales']['recibida'] -= 1
+            return snapshot
+        finally:
+            ftp.quit()
+
+    def pendientes(self):
+        return sorted(self.leer_estado(exacto=True)['pendientes'])
+
+    # --- Mantenimiento ---
+
+    def _escribir(self, ftp, nombre, datos):
+        ftp.storbinary(f'STOR {nombre}.tmp', io.BytesIO(datos))
+        ftp.rename(f'{nombre}.tmp', nombre)
+
+    def _escribir_particiones(self, ftp, snapshot, nuevas, reemplazar=False):
+        """Agrega `nuevas` (analizadas) a sus particiones, marcadas con la compactación en curso.
+        Se escriben antes que el snapshot: ver _leer_particiones."""
+        por_particion = {}
+        for archivo in nuevas:
+            por_particion.setdefault(self.particion(archivo), []).append(archivo)
+        if not por_particion:
+            return
+        try:
+            ftp.mkd(self.ANALIZADAS)
+        except ftplib.error_perm:
+            pass  # Ya existe
+        for particion, archivos in sorted(por_particion.items()):
+            nombre = f'{self.ANALIZADAS}/{particion}.txt'
+            lineas = [] if reemplazar else (self._leer(ftp, nombre) or b'').decode('utf-8').splitlines()
+            lineas.extend(f"{archivo} {snapshot['compactado']}" for archivo in sorted(archivos))
+            self._escribir(ftp, nombre, ('\n'.join(lineas) + '\n').encode('utf-8'))
+
+    def _escribir_snapshot(self, ftp, snapshot):
+        snapshot.pop('analizadas', None)
+        self._escribir(ftp, self.SNAPSHOT, serializacion.dumps(snapshot))
+
+    def _rotar(self, ftp):
+        """Renombra el journal actual y devuelve los rotados pendientes de aplicar, en orden. Los APPE
+        posteriores caen en un journal nuevo: nada de lo que se borre después puede tener eventos sin leer."""
+        rotado = f"{self.JOURNAL}.{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        try:
+            ftp.rename(self.JOURNAL, rotado)
+        except ftplib.error_perm:
+            pass  # No hay journal nuevo; igual se aplican los rotados pendientes
+        return [n for n in self._journals(ftp) if n != self.JOURNAL]
+
+    def _borrar(self, ftp, nombres):
+        for nombre in nombres:
+            try:
+                ftp.delete(nombre)
+            except ftplib.error_perm:
+                pass
+
+    def compactar(self):
+        """Vuelca el journal en el snapshot (rotándolo antes de leerlo, así no se pierden APPE concurrentes).
+        Sólo lee las particiones de analizadas de los meses que aparecen en los eventos."""
+        ftp = self._ftp_manifest()
+        try:
+            rotados = self._rotar(ftp)
+            snapshot = self._cargar_snapshot(self._leer(ftp, self.SNAPSHOT))
+            eventos = self._leer_journals(ftp, rotados)
+            analizadas = self._leer_particiones(ftp, snapshot, [e['archivo'] for e in eventos])
+            conocidas = set(analizadas)
+            for evento in eventos:
+                self.aplicar(snapshot, evento, analizadas)
+            snapshot['compactado'] = datetime.now().isoformat()
+            # Un snapshot versión 2 se migra: todas sus analizadas pasan a las particiones
+            migrar = 'analizadas' in snapshot
+            self._escribir_particiones(ftp, snapshot, analizadas if migrar else analizadas - conocidas,
+                                       reemplazar=migrar)
+            self._escribir_snapshot(ftp, snapshot)
+            self._borrar(ftp, rotados)
+            return len(eventos)
+        finally:
+            ftp.quit()
+
+    def reconstruir(self, raw_files, analyzed_files):
+        """Arma el snapshot desde un listado completo (migración inicial o reparación)"""
+        analyzed_stems = {f.replace('_analysis_agnostic.json', '') for f in analyzed_files
+                          if f.endswith('_analysis_agnostic.json')}
+        raw = [f for f in raw_files if f.endswith('.json')]
+        analizadas = {f for f in raw if f[:-len('.json')] in analyzed_stems}
+        snapshot = self.snapshot_vacio()
+        snapshot['pendientes'] = {f: None for f in raw if f[:-len('.json')] not in analyzed_stems}
+        snapshot['totales']['recibida'] = len(raw)
+        snapshot['totales']['analizada'] = len(analizadas)
+        ftp = self._ftp_manifest()
+        try:
+            # Los journals se rotan antes de borrarlos y sus eventos se aplican sobre el listado: un APPE
+            # concurrente no se pierde, y los eventos que el listado ya refleja no cambian nada (monotonía)
+            rotados = self._rotar(ftp)
+            for evento in self._leer_journals(ftp, rotados):
+                self.aplicar(snapshot, evento, analizadas)
+            snapshot['compactado'] = datetime.now().isoformat()
+            self._escribir_particiones(ftp, snapshot, analizadas, reemplazar=True)
+            self._escribir_snapshot(ftp, snapshot)
+            self._borrar(ftp, rotados)
+        finally:
+            ftp.quit()
+        return snapshot
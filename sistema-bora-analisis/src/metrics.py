@@ -0,0 +1,186 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+# Buckets (segundos) pensados para el rango FTP/Gemini: de milisegundos a un par de minutos
+BUCKETS_DEFAULT = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _clave_labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _formato_labels(labels, extra=None):
+    pares = list(labels) + (list(extra.items()) if extra else [])
+    if not pares:
+        return ''
+    contenido = ','.join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pares)
+    return '{' + contenido + '}'
+
+
+class Histogram:
+    def __init__(self, nombre, descripcion, buckets=BUCKETS_DEFAULT):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observar(self, valor, labels):
+        serie = self.series.setdefault(_clave_labels(labels), {
+            'conteos': [0] * len(self.buckets), 'suma': 0.0, 'total': 0, 'maximo': 0.0})
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                serie['conteos'][i] += 1
+        serie['suma'] += valor
+        serie['total'] += 1
+        serie['maximo'] = max(serie['maximo'], valor)
+
+    def percentil(self, serie, p):
+        """Aproximación por buckets (límite superior del bucket que contiene el percentil)"""
+        objetivo = p * serie['total']
+        for limite, conteo in zip(self.buckets, serie['conteos']):
+            if conteo >= objetivo:
+                return limite
+        return serie['maximo']
+
+    def prometheus(self):
+        lineas = [f'# HELP {self.nombre} {self.descripcion}', f'# TYPE {self.nombre} histogram']
+        for labels, serie in sorted(self.series.items()):
+            for limite, conteo in zip(self.buckets, serie['conteos']):
+                lineas.append(f'{self.nombre}_bucket{_formato_labels(labels, {"le": limite})} {conteo}')
+            lineas.append(f'{self.nombre}_bucket{_formato_labels(labels, {"le": "+Inf"})} {serie["total"]}')
+            lineas.append(f'{self.nombre}_sum{_formato_labels(labels)} {serie["suma"]}')
+            lineas.append(f'{self.nombre}_count{_formato_labels(labels)} {serie["total"]}')
+        return lineas
+
+    def reporte(self):
+        return {
+            _formato_labels(labels) or 'total': {
+                'llamadas': serie['total'],
+                'segundos_total': round(serie['suma'], 4),
+                'segundos_promedio': round(serie['suma'] / serie['total'], 4) if serie['total'] else 0,
+                'p50_aprox': self.percentil(serie, 0.5),
+                'p95_aprox': self.percentil(serie, 0.95),
+                'segundos_max': round(serie['maximo'], 4)
+            }
+            for labels, serie in sorted(self.series.items())
+        }
+
+
+class Counter:
+    def __init__(self, nombre, descripcion):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.series = {}
+
+    def sumar(self, valor, labels):
+        clave = _clave_labels(labels)
+        self.series[clave] = self.series.get(clave, 0) + valor
+
+    def prometheus(self):
+        lineas = [f'# HELP {self.nombre} {self.descripcion}', f'# TYPE {self.nombre} counter']
+        for labels, valor in sorted(self.series.items()):
+            lineas.append(f'{self.nombre}{_formato_labels(labels)} {valor}')
+        return lineas
+
+    def reporte(self):
+        return {_formato_labels(labels) or 'total': valor for labels, valor in sorted(self.series.items())}
+
+
+class MetricsRegistry:
+    """Histogramas y contadores en memoria del proceso, exportables en formato Prometheus o JSON"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metricas = {}
+
+    def histograma(self, nombre, descripcion=''):
+        with self.lock:
+            return self.metricas.setdefault(nombre, Histogram(nombre, descripcion))
+
+    def contador(self, nombre, descripcion=''):
+        with self.lock:
+            return self.metricas.setdefault(nombre, Counter(nombre, descripcion))
+
+    def observar(self, nombre, valor, descripcion='', **labels):
+        metrica = self.histograma(nombre, descripcion)
+        with self.lock:
+            metrica.observar(valor, labels)
+
+    def sumar(self, nombre, valor=1, descripcion='', **labels):
+        metrica = self.contador(nombre, descripcion)
+        with self.lock:
+            metrica.sumar(valor, labels)
+
+    def prometheus(self):
+        with self.lock:
+            lineas = []
+            for nombre in sorted(self.metricas):
+                lineas.extend(self.metricas[nombre].prometheus())
+        return '\n'.join(lineas) + '\n'
+
+    def reporte(self):
+        with self.lock:
+            return {nombre: metrica.reporte() for nombre, metrica in sorted(self.metricas.items())}
+
+    def instantanea(self):
+        """Estado serializable del registry, para combinarlo con el de otros procesos"""
+        with self.lock:
+            return {
+                nombre: {
+                    'tipo': 'histograma' if isinstance(metrica, Histogram) else 'contador',
+                    'descripcion': metrica.descripcion,
+                    'buckets': list(metrica.buckets) if isinstance(metrica, Histogram) else None,
+                    'series': [[[list(par) for par in labels], serie] for labels, serie in metrica.series.items()]
+                }
+                for nombre, metrica in self.metricas.items()
+            }
+
+    def combinar(self, instantanea):
+        """Suma una instantánea (de otro proceso) a este registry: contadores y buckets se suman"""
+        for nombre, datos in instantanea.items():
+            if datos['tipo'] == 'histograma':
+                with self.lock:
+                    metrica = self.metricas.setdefault(nombre, Histogram(nombre, datos['descripcion'], datos['buckets']))
+                    for labels, serie in datos['series']:
+                        actual = metrica.series.setdefault(tuple(tuple(par) for par in labels), {
+                            'conteos': [0] * len(metrica.buckets), 'suma': 0.0, 'total': 0, 'maximo': 0.0})
+                        actual['conteos'] = [a + b for a, b in zip(actual['conteos'], serie['conteos'])]
+                        actual['suma'] += serie['suma']
+                        actual['total'] += serie['total']
+                        actual['maximo'] = max(actual['maximo'], serie['maximo'])
+            else:
+                metrica = self.contador(nombre, datos['descripcion'])
+                with self.lock:
+                    for labels, valor in datos['series']:
+                        metrica.sumar(valor, dict(labels))
+
+    def reiniciar(self):
+        with self.lock:
+            self.metricas = {}
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def medir_etapa(etapa, **labels):
+    """Mide la duración de una etapa en bora_etapa_segundos{etapa=...}; cuenta errores por separado"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        registry.sumar('bora_etapa_errores_total', 1, 'Etapas que terminaron con excepción', etapa=etapa, **labels)
+        raise
+    finally:
+        registry.observar('bora_etapa_segundos', time.perf_counter() - inicio,
+                          'Duración de cada etapa del pipeline', etapa=etapa, **labels)
+
+
+def sumar_bytes(etapa, cantidad):
+    registry.sumar('bora_bytes_total', cantidad, 'Bytes transferidos o serializados por etapa', etapa=etapa)
+
+
+def sumar_tokens(etapa, tipo, cantidad):
+    registry.sumar('bora_gemini_tokens_total', cantidad, 'Tokens Gemini por etapa y tipo', etapa=etapa, tipo=tipo)
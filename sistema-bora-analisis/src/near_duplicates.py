@@ -0,0 +1,154 @@
+import os
+import re
+import zlib
+import difflib
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+from indice_entidades import normalizar_nombre, normalizar_referencia, referencias_en_texto
+
+
+class NearDuplicateIndex:
+    """Índice MinHash/LSH de textos de medidas para detectar casi-duplicados (designaciones, prórrogas, etc.)"""
+
+    PRIMO = np.uint64((1 << 61) - 1)
+    MAX_HASH = np.uint64((1 << 32) - 1)
+
+    def __init__(self, num_perm=128, bandas=16, shingle=3, umbral=None, semilla=1976):
+        if num_perm % bandas != 0:
+            raise ValueError("num_perm debe ser múltiplo de bandas")
+        self.num_perm = num_perm
+        self.bandas = bandas
+        self.filas = num_perm // bandas
+        self.shingle = shingle
+        self.umbral = float(umbral if umbral is not None else os.getenv('BORA_UMBRAL_DUPLICADO', 0.85))
+
+        rng = np.random.RandomState(semilla)
+        self.a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+        self.firmas = {}
+        self.buckets = [defaultdict(list) for _ in range(bandas)]
+
+    # --- Firmas ---
+
+    def normalizar(self, texto):
+        texto = unicodedata.normalize('NFKD', texto.lower())
+        texto = ''.join(c for c in texto if not unicodedata.combining(c))
+        return re.findall(r'\w+', texto)
+
+    def shingles(self, texto):
+        palabras = self.normalizar(texto)
+        if len(palabras) < self.shingle:
+            return {' '.join(palabras)} if palabras else set()
+        return {' '.join(palabras[i:i + self.shingle]) for i in range(len(palabras) - self.shingle + 1)}
+
+    def firma(self, texto):
+        """Firma MinHash (num_perm enteros de 32 bits) del texto"""
+        shingles = self.shingles(texto)
+        if not shingles:
+            return None
+        x = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        hashes = (self.a[:, None] * x[None, :] + self.b[:, None]) % self.PRIMO & self.MAX_HASH
+        return hashes.min(axis=1).astype(np.uint32)
+
+    def _claves_bandas(self, firma):
+        for i in range(self.bandas):
+            yield i, firma[i * self.filas:(i + 1) * self.filas].tobytes()
+
+    # --- Índice ---
+
+    def agregar(self, clave, firma):
+        if firma is None or clave in self.firmas:
+            return
+        self.firmas[clave] = firma
+        for i, banda in self._claves_bandas(firma):
+            self.buckets[i][banda].append(clave)
+
+    def buscar(self, firma, excluir=None):
+        """Devuelve (clave, similitud estimada) del mejor candidato por encima del umbral, o None"""
+        if firma is None:
+            return None
+        candidatos = set()
+        for i, banda in self._claves_bandas(firma):
+            candidatos.update(self.buckets[i].get(banda, ()))
+        candidatos.discard(excluir)
+
+        mejor = None
+        for clave in candidatos:
+            similitud = float(np.mean(self.firmas[clave] == firma))
+            if similitud >= self.umbral and (mejor is None or similitud > mejor[1]):
+                mejor = (clave, similitud)
+        return mejor
+
+    def __len__(self):
+        return len(self.firmas)
+
+    # --- Persistencia ---
+
+    def guardar(self, path):
+        claves = sorted(self.firmas)
+        firmas = np.stack([self.firmas[c] for c in claves]) if claves else np.zeros((0, self.num_perm), dtype=np.uint32)
+        with open(path, 'wb') as f:
+            np.savez(f, claves=np.array(claves, dtype=str), firmas=firmas,
+                     config=np.array([self.num_perm, self.bandas, self.shingle]))
+
+    @classmethod
+    def cargar(cls, path, umbral=None):
+        with np.load(path, allow_pickle=False) as datos:
+            num_perm, bandas, shingle = (int(v) for v in datos['config'])
+            indice = cls(num_perm=num_perm, bandas=bandas, shingle=shingle, umbral=umbral)
+            for clave, firma in zip(datos['claves'], datos['firmas']):
+                indice.agregar(str(clave), firma)
+        return indice
+
+
+def diff_textos(texto_origen, texto_nuevo, max_cambios=20):
+    """Diferencias a nivel palabra entre dos textos casi idénticos (para registrar qué cambió)"""
+    origen = texto_origen.split()
+    nuevo = texto_nuevo.split()
+    cambios = []
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, origen, nuevo, autojunk=False).get_opcodes():
+        if op == 'equal':
+            continue
+        cambios.append({
+            'operacion': op,
+            'antes': ' '.join(origen[i1:i2])[:200],
+            'despues': ' '.join(nuevo[j1:j2])[:200]
+        })
+        if len(cambios) >= max_cambios:
+            break
+    return cambios
+
+
+def elementos_presentes(elementos, texto):
+    """Filtra los elementos IA de una medida casi idéntica a los que aparecen en `texto`.
+
+    Cada valor de lista se conserva si su forma normalizada está en el texto (las referencias normativas
+    también si el texto cita la misma norma con otra escritura). Devuelve (elementos, cantidad descartada).
+    """
+    if not isinstance(elementos, dict):
+        return elementos, 0
+    normalizado = f" {normalizar_nombre(texto)} "
+    normas = {norma for _, norma in referencias_en_texto(texto)}
+    filtrados = {}
+    descartados = 0
+    for campo, valores in elementos.items():
+        if not isinstance(valores, list):
+            filtrados[campo] = valores
+            continue
+        filtrados[campo] = []
+        for valor in valores:
+            termino = normalizar_nombre(valor)
+            presente = bool(termino) and f" {termino} " in normalizado
+            if not presente and campo == 'referencias_normativas':
+                # 'Decreto N° 50 del 19 de diciembre de 2019' se reconoce sin año ('decreto 50')
+                norma = normalizar_referencia(valor)
+                presente = norma in normas or norma.split('/')[0] in normas
+            if presente:
+                filtrados[campo].append(valor)
+            else:
+                descartados += 1
+    return filtrados, descartados
@@ -0,0 +1,90 @@
+import os
+from datetime import datetime
+
+import serializacion
+from rollups import valores_analisis
+
+
+class FeedNovedades:
+    """Feed de las últimas medidas analizadas, con ids de evento correlativos para retomar desde el último visto.
+
+    Lo mantiene el BatchAnalyzer (un evento compacto por análisis subido) y la API lo sirve por SSE. Se guardan
+    sólo los últimos `capacidad` eventos: un cliente que vuelve con un id más viejo que el primero retenido
+    (o de un feed que se reinició) se entera de que perdió eventos y debe resincronizar con /api/medidas.
+    """
+
+    ARCHIVO = 'novedades.json'
+    VERSION = 1
+
+    def __init__(self, capacidad=None):
+        self.capacidad = int(capacidad or os.getenv('BORA_NOVEDADES_CAPACIDAD', 2000))
+        self.eventos = []  # ordenados por id, sin huecos
+        self.ultimo_id = 0
+        self.actualizado = None
+
+    @staticmethod
+    def resumir(clave, analisis):
+        """Lo que el dashboard necesita para mostrar la medida sin descargar el análisis completo"""
+        fecha, riesgo, categoria, transparencia = valores_analisis(analisis)
+        metadatos = analisis.get('metadatos_analisis', {}) or {}
+        return {
+            'clave': clave,
+            'numero_medida': analisis.get('numero_medida'),
+            'fecha_boletin': fecha or None,
+            'titulo': str((analisis.get('analisis_literal', {}) or {}).get('titulo_raw') or '')[:200],
+            'categoria_emergente': categoria,
+            'nivel_riesgo_democratico': riesgo,
+            'nivel_transparencia': transparencia,
+            'modo_analisis': metadatos.get('modo_analisis'),
+            'reutilizado_de': (metadatos.get('duplicado_de') or {}).get('archivo_origen'),
+            'fecha_analisis': analisis.get('fecha_analisis'),
+        }
+
+    def agregar(self, clave, analisis):
+        """Agrega el evento de un análisis nuevo (o re-analizado) y devuelve su id"""
+        self.ultimo_id += 1
+        self.eventos.append(dict(self.resumir(clave, analisis), id=self.ultimo_id))
+        if len(self.eventos) > self.capacidad:
+            del self.eventos[:len(self.eventos) - self.capacidad]
+        self.actualizado = datetime.now().isoformat()
+        return self.ultimo_id
+
+    # --- Consultas ---
+
+    def posteriores(self, ultimo_visto=None, limite=500):
+        """Eventos con id > ultimo_visto, más viejos primero.
+
+        Devuelve (eventos, perdidos): perdidos es True si hubo eventos descartados entre ultimo_visto y el
+        primero retenido, o si ultimo_visto es de un feed anterior (mayor que el último id actual).
+        Sin ultimo_visto se devuelven los `limite` más recientes.
+        """
+        if ultimo_visto is None:
+            return self.eventos[-limite:] if limite else [], False
+        if not self.eventos:
+            return [], ultimo_visto > self.ultimo_id
+        primero = self.eventos[0]['id']
+        if ultimo_visto > self.ultimo_id:
+            return self.eventos[:limite], True
+        inicio = max(ultimo_visto - primero + 1, 0)
+        return self.eventos[inicio:inicio + limite], ultimo_visto < primero - 1
+
+    # --- Persistencia ---
+
+    def to_dict(self):
+        return {'version': self.VERSION, 'ultimo_id': self.ultimo_id, 'actualizado': self.actualizado,
+                'eventos': self.eventos}
+
+    @classmethod
+    def from_dict(cls, datos):
+        feed = cls()
+        feed.ultimo_id = int(datos.get('ultimo_id', 0))
+        feed.actualizado = datos.get('actualizado')
+        feed.eventos = datos.get('eventos', [])[-feed.capacidad:]
+        return feed
+
+    def guardar(self, path):
+        serializacion.guardar(self.to_dict(), path)
+
+    @classmethod
+    def cargar(cls, path):
+        return cls.from_dict(serializacion.cargar(path))
@@ -0,0 +1,236 @@
+import os
+from datetime import date, timedelta
+
+import numpy as np
+
+import serializacion
+
+
+PROMPT_ETIQUETA = """
+Sos un analista del Boletín Oficial argentino. Estas medidas fueron agrupadas automáticamente por similitud
+de contenido. Poné un nombre corto al patrón que comparten y describilo en una oración.
+
+CATEGORÍAS EMERGENTES MÁS FRECUENTES: {categorias}
+NIVELES DE RIESGO DEMOCRÁTICO: {riesgos}
+TÍTULOS DE EJEMPLO:
+{titulos}
+
+Responde SOLO con JSON válido:
+{{"etiqueta": "nombre corto del patrón", "descripcion": "una oración"}}
+"""
+
+
+def _contar(destino, valor, signo=1):
+    destino[valor] = destino.get(valor, 0) + signo
+    if not destino[valor]:
+        del destino[valor]
+
+
+class MotorPatrones:
+    """Clustering incremental (k-means mini-batch esférico) de los embeddings completos de las medidas.
+
+    Las medidas nuevas se acumulan y se procesan de a lotes: cada una se asigna al centroide más cercano
+    (coseno) y el centroide se mueve hacia ella con tasa 1/n (Sculley, 2010). Mientras haya menos de k
+    centroides, los lotes siembran centroides nuevos con muestreo k-means++. Las etiquetas de Gemini son
+    opcionales y quedan cacheadas hasta que el cluster crece lo suficiente como para re-etiquetarlo.
+    """
+
+    ARCHIVO = 'patrones.npz'
+    VERSION = 1
+    CRECIMIENTO_REETIQUETAR = 1.5
+
+    def __init__(self, k=None, tamanio_lote=None, semilla=1976):
+        self.k = int(k or os.getenv('BORA_PATRONES_K', 20))
+        self.tamanio_lote = int(tamanio_lote or os.getenv('BORA_PATRONES_LOTE', 64))
+        self.rng = np.random.RandomState(semilla)
+        self.centroides = None
+        self.actualizaciones = np.zeros(0, dtype=np.int64)
+        self.miembros = {}  # clave -> [cluster, fecha, categoria, riesgo, titulo]
+        self.clusters = []
+        self.etiquetas = {}  # cluster -> {'etiqueta', 'descripcion', 'tamanio_al_etiquetar'}
+        self.pendientes = []
+
+    @staticmethod
+    def _cluster_vacio():
+        return {'tamanio': 0, 'categorias': {}, 'riesgos': {}}
+
+    @staticmethod
+    def describir(analisis):
+        literal = analisis.get('analisis_literal', {}) or {}
+        return [
+            str(analisis.get('fecha_boletin') or ''),
+            str((analisis.get('analisis_semantico', {}) or {}).get('categoria_emergente') or 'sin_clasificar'),
+            str((analisis.get('analisis_abogado_diablo', {}) or {}).get('nivel_riesgo_democratico') or 'sin_dato'),
+            str(literal.get('titulo_raw') or '')[:160],
+        ]
+
+    # --- Actualización ---
+
+    def agregar(self, clave, analisis):
+        """Encola el análisis; cada `tamanio_lote` medidas se procesa un mini-batch. False si no tiene embedding."""
+        vector = (analisis.get('embeddings', {}) or {}).get('embedding_completo')
+        if not vector:
+            return False
+        self.pendientes.append((clave, np.asarray(vector, dtype=np.float32), self.describir(analisis)))
+        if len(self.pendientes) >= self.tamanio_lote:
+            self.procesar_lote()
+        return True
+
+    def procesar_lote(self):
+        """Asigna las medidas pendientes y actualiza los centroides. Devuelve cuántas procesó."""
+        if not self.pendientes:
+            return 0
+        claves = [p[0] for p in self.pendientes]
+        descripciones = [p[2] for p in self.pendientes]
+        X = np.stack([p[1] for p in self.pendientes])
+        X /= np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+        self.pendientes = []
+
+        self._sembrar(X)
+        asignados = np.argmax(X @ self.centroides.T, axis=1)
+        for x, cluster in zip(X, asignados.tolist()):
+            self.actualizaciones[cluster] += 1
+            tasa = 1.0 / self.actualizaciones[cluster]
+            centroide = (1 - tasa) * self.centroides[cluster] + tasa * x
+            self.centroides[cluster] = centroide / max(np.linalg.norm(centroide), 1e-12)
+
+        for clave, cluster, descripcion in zip(claves, asignados.tolist(), descripciones):
+            self._registrar_miembro(clave, cluster, descripcion)
+        return len(claves)
+
+    def _sembrar(self, X):
+        """Completa hasta k centroides eligiendo puntos del lote con probabilidad proporcional a D² (k-means++)"""
+        if self.centroides is None:
+            self.centroides = np.zeros((0, X.shape[1]), dtype=np.float32)
+        disponibles = min(self.k - len(self.centroides), len(X))
+        if disponibles <= 0:
+            return
+        nuevos = []
+        for _ in range(disponibles):
+            if len(self.centroides) + len(nuevos) == 0:
+                nuevos.append(X[self.rng.randint(len(X))])
+                continue
+            semillas = np.vstack([self.centroides] + nuevos) if nuevos else self.centroides
+            distancias = np.maximum(1.0 - (X @ semillas.T).max(axis=1), 0.0) ** 2
+            if distancias.sum() <= 1e-9:
+                break  # el lote ya está cubierto (puntos idénticos a centroides existentes)
+            nuevos.append(X[self.rng.choice(len(X), p=distancias / distancias.sum())])
+        if nuevos:
+            self.centroides = np.vstack([self.centroides] + nuevos).astype(np.float32)
+            self.actualizaciones = np.concatenate([self.actualizaciones, np.zeros(len(nuevos), dtype=np.int64)])
+            self.clusters.extend(self._cluster_vacio() for _ in nuevos)
+
+    def _registrar_miembro(self, clave, cluster, descripcion):
+        anterior = self.miembros.get(clave)
+        if anterior:
+            self._contar_miembro(anterior, -1)
+        self.miembros[clave] = [cluster] + descripcion
+        self._contar_miembro(self.miembros[clave], 1)
+
+    def _contar_miembro(self, miembro, signo):
+        cluster, _, categoria, riesgo, _ = miembro
+        datos = self.clusters[cluster]
+        datos['tamanio'] += signo
+        _contar(datos['categorias'], categoria, signo)
+        _contar(datos['riesgos'], riesgo, signo)
+
+    # --- Etiquetas (opcionales, con Gemini) ---
+
+    def clusters_sin_etiqueta(self, tamanio_minimo=5):
+        """Clusters que nunca se etiquetaron o que crecieron mucho desde la última etiqueta"""
+        return [c for c, datos in enumerate(self.clusters) if datos['tamanio'] >= tamanio_minimo and (
+            c not in self.etiquetas
+            or datos['tamanio'] >= self.etiquetas[c]['tamanio_al_etiquetar'] * self.CRECIMIENTO_REETIQUETAR)]
+
+    def prompt_etiqueta(self, cluster, ejemplos=8):
+        datos = self.clusters[cluster]
+        categorias = sorted(datos['categorias'].items(), key=lambda x: x[1], reverse=True)[:5]
+        titulos = [m[4] for m in self._ordenados(cluster)[:ejemplos] if m[4]]
+        return PROMPT_ETIQUETA.format(
+            categorias=', '.join(f"{c} ({n})" for c, n in categorias),
+            riesgos=', '.join(f"{r} ({n})" for r, n in datos['riesgos'].items()),
+            titulos='\n'.join(f"- {t}" for t in titulos) or '- (sin títulos)')
+
+    def etiquetar(self, cluster, respuesta):
+        """Guarda la etiqueta (dict con 'etiqueta' y 'descripcion') generada para un cluster"""
+        etiqueta = str(respuesta.get('etiqueta', '')).strip()[:80]
+        if not etiqueta:
+            raise ValueError("La respuesta no trae 'etiqueta'")
+        self.etiquetas[cluster] = {
+            'etiqueta': etiqueta,
+            'descripcion': str(respuesta.get('descripcion', '')).strip()[:300],
+            'tamanio_al_etiquetar': self.clusters[cluster]['tamanio']
+        }
+
+    # --- Consultas ---
+
+    def _ordenados(self, cluster):
+        """Miembros del cluster, más recientes primero"""
+        return sorted((m for m in self.miembros.values() if m[0] == cluster), key=lambda m: m[1], reverse=True)
+
+    def resumen(self, tamanio_minimo=1, ejemplos=5, dias_recientes=30):
+        """Patrones (clusters) por tamaño con su composición, actividad reciente y etiqueta si la hay"""
+        por_cluster = {}
+        for clave, miembro in self.miembros.items():
+            por_cluster.setdefault(miembro[0], []).append((clave, miembro))
+        patrones = []
+        for cluster, datos in enumerate(self.clusters):
+            if datos['tamanio'] < tamanio_minimo:
+                continue
+            miembros = sorted(por_cluster.get(cluster, []), key=lambda x: x[1][1], reverse=True)
+            ultima = miembros[0][1][1] if miembros else None
+            recientes = 0
+            try:
+                corte = (date.fromisoformat(ultima[:10]) - timedelta(days=dias_recientes)).isoformat()
+                recientes = sum(1 for _, m in miembros if m[1] >= corte)
+            except (TypeError, ValueError):
+                pass
+            etiqueta = self.etiquetas.get(cluster, {})
+            patrones.append({
+                'patron': cluster,
+                'etiqueta': etiqueta.get('etiqueta'),
+                'descripcion': etiqueta.get('descripcion'),
+                'tamanio': datos['tamanio'],
+                'categorias_principales': dict(sorted(datos['categorias'].items(), key=lambda x: x[1], reverse=True)[:5]),
+                'niveles_riesgo': datos['riesgos'],
+                'primera_fecha': miembros[-1][1][1] if miembros else None,
+                'ultima_fecha': ultima,
+                f'medidas_ultimos_{dias_recientes}_dias': recientes,
+                'ejemplos': [{'clave': c, 'fecha_boletin': m[1], 'titulo': m[4]} for c, m in miembros[:ejemplos]]
+            })
+        patrones.sort(key=lambda p: p['tamanio'], reverse=True)
+        return {'total_patrones': len(patrones), 'medidas_agrupadas': len(self.miembros), 'k': self.k,
+                'patrones': patrones}
+
+    # --- Persistencia ---
+
+    def guardar(self, path):
+        self.procesar_lote()
+        claves = list(self.miembros)
+        miembros = [self.miembros[c] for c in claves]
+        dimension = self.centroides.shape[1] if self.centroides is not None else 0
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f, version=np.array([self.VERSION]), k=np.array([self.k]),
+                centroides=self.centroides if self.centroides is not None else np.zeros((0, dimension), np.float32),
+                actualizaciones=self.actualizaciones,
+                claves=np.array(claves, dtype=str),
+                clusters=np.array([m[0] for m in miembros], dtype=np.int32),
+                descripciones=np.array([m[1:] for m in miembros], dtype=str).reshape(len(miembros), 4),
+                etiquetas=np.frombuffer(serializacion.dumps({str(c): e for c, e in self.etiquetas.items()}),
+                                        dtype=np.uint8))
+
+    @classmethod
+    def cargar(cls, path):
+        with np.load(path, allow_pickle=False) as datos:
+            # BORA_PATRONES_K puede subir k entre corridas; los centroides existentes se conservan
+            motor = cls(k=os.getenv('BORA_PATRONES_K') or int(datos['k'][0]))
+            motor.k = max(motor.k, len(datos['centroides']))
+            motor.centroides = datos['centroides'].astype(np.float32) if len(datos['centroides']) else None
+            motor.actualizaciones = datos['actualizaciones'].astype(np.int64)
+            motor.clusters = [cls._cluster_vacio() for _ in range(len(motor.actualizaciones))]
+            for clave, cluster, descripcion in zip(datos['claves'], datos['clusters'].tolist(),
+                                                   datos['descripciones'].tolist()):
+                motor._registrar_miembro(str(clave), cluster, descripcion)
+            motor.etiquetas = {int(c): e for c, e in serializacion.loads(datos['etiquetas'].tobytes()).items()}
+        return motor
@@ -0,0 +1,191 @@
+import os
+import io
+import time
+import heapq
+import pstats
+import cProfile
+import tempfile
+import tracemalloc
+from datetime import datetime
+from contextlib import contextmanager
+
+import serializacion
+
+
+RANGOS_LONGITUD = ((0, 2000), (2000, 5000), (5000, 10000), (10000, 20000), (20000, None))
+
+
+def perfilado_activo():
+    return os.getenv('BORA_PROFILE') == '1'
+
+
+class MedidaProfiler:
+    """Perfilado opt-in (BORA_PROFILE=1) por medida: cProfile + tracemalloc.
+
+    Se guarda el detalle (.prof, resumen de funciones y de asignaciones) sólo de las top-N medidas más
+    lentas y de las top-N con mayor pico de memoria; del resto queda una fila en el ranking.
+    BORA_PROFILE_TOP=0 guarda el detalle de todas.
+    """
+
+    def __init__(self, componente, directorio=None, top_n=None, memoria=True):
+        self.componente = componente
+        self.directorio = os.path.join(
+            directorio or os.getenv('BORA_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'bora_profiles')),
+            f"{componente}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        self.top_n = int(top_n if top_n is not None else os.getenv('BORA_PROFILE_TOP', 10))
+        self.memoria = memoria
+        self.registros = []
+        self.detalles = {}
+        self.top_tiempo = []
+        self.top_memoria = []
+        self.escritos = set()
+        os.makedirs(self.directorio, exist_ok=True)
+        if self.memoria and not tracemalloc.is_tracing():
+            tracemalloc.start(int(os.getenv('BORA_PROFILE_FRAMES', 1)))
+
+    @staticmethod
+    def describir(medida_data):
+        estructura = medida_data.get('estructura_detectada', {}) or {}
+        return {
+            'numero_medida': medida_data.get('numero_medida'),
+            'fecha_boletin': medida_data.get('fecha_boletin'),
+            'longitud_texto': len(medida_data.get('texto_completo_limpio', '') or ''),
+            'longitud_html': sum(len(v or '') for v in (medida_data.get('contenido_html_completo', {}) or {}).values()),
+            'secciones': len(estructura),
+            'nombres_secciones': sorted(estructura)
+        }
+
+    def iniciar(self, etiqueta):
+        """Empieza a perfilar una medida. El llamador completa contexto['medida'] cuando tiene los datos;
+        si no lo hace (p. ej. número inexistente en el scraper), la medida no se registra."""
+        contexto = {'etiqueta': etiqueta, 'perfil': cProfile.Profile()}
+        if self.memoria:
+            tracemalloc.reset_peak()
+            contexto['memoria_inicial'] = tracemalloc.get_traced_memory()[0]
+        contexto['inicio'] = time.perf_counter()
+        contexto['perfil'].enable()
+        return contexto
+
+    def terminar(self, contexto):
+        contexto['perfil'].disable()
+        segundos = time.perf_counter() - contexto['inicio']
+        if contexto.get('medida') is None:
+            return
+        registro = dict(self.describir(contexto['medida']), etiqueta=contexto['etiqueta'],
+                        segundos=round(segundos, 4), error=contexto.get('error'))
+        if self.memoria:
+            actual, pico = tracemalloc.get_traced_memory()
+            registro['pico_memoria_mb'] = round((pico - contexto['memoria_inicial']) / 2 ** 20, 3)
+            registro['memoria_retenida_mb'] = round((actual - contexto['memoria_inicial']) / 2 ** 20, 3)
+        self._registrar(registro, contexto['perfil'])
+
+    @contextmanager
+    def perfilar(self, etiqueta):
+        contexto = self.iniciar(etiqueta)
+        try:
+            yield contexto
+        finally:
+            self.terminar(contexto)
+
+    def _entra_en_top(self, heap, valor, etiqueta):
+        """Mantiene un min-heap de tamaño top_n; devuelve (entró, etiqueta desplazada)"""
+        if self.top_n <= 0:
+            return True, None
+        if len(heap) < self.top_n:
+            heapq.heappush(heap, (valor, etiqueta))
+            return True, None
+        if valor > heap[0][0]:
+            return True, heapq.heapreplace(heap, (valor, etiqueta))[1]
+        return False, None
+
+    def _registrar(self, registro, perfil):
+        self.registros.append(registro)
+        etiqueta = registro['etiqueta']
+        entra_tiempo, fuera_tiempo = self._entra_en_top(self.top_tiempo, registro['segundos'], etiqueta)
+        entra_memoria, fuera_memoria = False, None
+        if self.memoria:
+            entra_memoria, fuera_memoria = self._entra_en_top(self.top_memoria, registro['pico_memoria_mb'], etiqueta)
+
+        if entra_tiempo or entra_memoria:
+            asignaciones = None
+            if self.memoria:
+                asignaciones = tracemalloc.take_snapshot().filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                )).statistics('lineno')[:25]
+            self.detalles[etiqueta] = (perfil, asignaciones)
+
+        en_top = {e for _, e in self.top_tiempo} | {e for _, e in self.top_memoria}
+        for desplazada in (fuera_tiempo, fuera_memoria):
+            if desplazada and desplazada not in en_top and self.top_n > 0:
+                self.detalles.pop(desplazada, None)
+
+    # --- Salida ---
+
+    def _escribir_detalle(self, etiqueta, perfil, asignaciones):
+        base = os.path.join(self.directorio, etiqueta)
+        perfil.dump_stats(base + '.prof')
+        texto = io.StringIO()
+        pstats.Stats(perfil, stream=texto).sort_stats('cumulative').print_stats(30)
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(texto.getvalue())
+        if asignaciones is not None:
+            with open(base + '.memoria.txt', 'w', encoding='utf-8') as f:
+                f.write(f"Top {len(asignaciones)} asignaciones vivas al terminar la medida (por línea)\n\n")
+                for stat in asignaciones:
+                    f.write(f"{stat}\n")
+
+    @staticmethod
+    def _agrupar(registros, clave, rangos=None):
+        grupos = {}
+        for r in registros:
+            valor = r[clave]
+            if rangos:
+                desde, hasta = next((d, h) for d, h in rangos if valor >= d and (h is None or valor < h))
+                nombre = f"{desde}-{hasta}" if hasta else f"{desde}+"
+            else:
+                nombre = str(valor)
+            grupo = grupos.setdefault(nombre, {'medidas': 0, 'segundos_total': 0.0, 'segundos_max': 0.0})
+            grupo['medidas'] += 1
+            grupo['segundos_total'] += r['segundos']
+            grupo['segundos_max'] = max(grupo['segundos_max'], r['segundos'])
+        for grupo in grupos.values():
+            grupo['segundos_promedio'] = round(grupo['segundos_total'] / grupo['medidas'], 4)
+            grupo['segundos_total'] = round(grupo['segundos_total'], 4)
+        return grupos
+
+    def finalizar(self):
+        """Escribe el ranking y los detalles de las peores medidas. Acumulativo: se puede llamar varias veces."""
+        if not self.registros:
+            return None
+        for etiqueta, (perfil, asignaciones) in self.detalles.items():
+            self._escribir_detalle(etiqueta, perfil, asignaciones)
+        # Medidas desplazadas del top desde la escritura anterior
+        for etiqueta in self.escritos - set(self.detalles):
+            for extension in ('.prof', '.txt', '.memoria.txt'):
+                try:
+                    os.remove(os.path.join(self.directorio, etiqueta + extension))
+                except OSError:
+                    pass
+        self.escritos = set(self.detalles)
+
+        por_tiempo = sorted(self.registros, key=lambda r: r['segundos'], reverse=True)
+        ranking = {
+            'componente': self.componente,
+            'fecha': datetime.now().isoformat(),
+            'total_medidas': len(self.registros),
+            'segundos_total': round(sum(r['segundos'] for r in self.registros), 3),
+            'con_detalle': sorted(self.detalles),
+            'mas_lentas': por_tiempo[:max(self.top_n, 25)],
+            'por_longitud_texto': self._agrupar(self.registros, 'longitud_texto', RANGOS_LONGITUD),
+            'por_cantidad_secciones': self._agrupar(self.registros, 'secciones')
+        }
+        if self.memoria:
+            ranking['mayor_pico_memoria'] = sorted(
+                self.registros, key=lambda r: r['pico_memoria_mb'], reverse=True)[:max(self.top_n, 25)]
+
+        path = os.path.join(self.directorio, 'ranking.json')
+        serializacion.guardar(ranking, path, pretty=True)
+        print(f"✓ Perfilado de {len(self.registros)} medidas en {self.directorio} "
+              f"(detalle de {len(self.detalles)}; ver ranking.json)")
+        return path
@@ -0,0 +1,324 @@
+import os
+import re
+import json
+import threading
+import unicodedata
+
+from metrics import registry
+
+
+# Respuestas JSON de Gemini: se piden en modo JSON con el esquema de cada prompt (response_schema), se validan
+# contra ese esquema y lo que llega casi bien (bloque markdown, coma final, salida cortada, tipos o enums con
+# otra forma) se repara localmente. Sólo si queda algo sin arreglo se repregunta, una vez, con la respuesta
+# anterior y los problemas encontrados.
+
+def _texto(descripcion=None):
+    esquema = {'type': 'STRING'}
+    if descripcion:
+        esquema['description'] = descripcion
+    return esquema
+
+
+def _opciones(*valores):
+    return {'type': 'STRING', 'format': 'enum', 'enum': list(valores)}
+
+
+def _lista(descripcion=None):
+    esquema = {'type': 'ARRAY', 'items': {'type': 'STRING'}}
+    if descripcion:
+        esquema['description'] = descripcion
+    return esquema
+
+
+def _objeto(propiedades):
+    return {'type': 'OBJECT', 'properties': propiedades, 'required': list(propiedades)}
+
+
+ESQUEMAS = {
+    'literal': _objeto({
+        'entidades_mencionadas': _lista('organismos, personas, instituciones mencionadas'),
+        'referencias_normativas': _lista('decretos, leyes, resoluciones citadas'),
+        'elementos_temporales': _lista('fechas, plazos, períodos mencionados'),
+        'elementos_financieros': _lista('montos, presupuestos, costos mencionados'),
+        'acciones_principales': _lista('qué acciones ordena este documento'),
+        'autoridades_involucradas': _lista('quién firma, autoriza, designa'),
+        'ambitos_afectados': _lista('qué áreas/sectores menciona'),
+        'palabras_clave_destacadas': _lista('términos técnicos o significativos repetidos'),
+    }),
+    'critico': _objeto({
+        'proporcionalidad_justificacion_accion': _opciones('alta', 'media', 'baja', 'sin_justificacion'),
+        'excesos_detectados': _texto('descripción específica si el dispositivo excede justificación'),
+        'ambiguedades_detectadas': _lista('ambiguedades que permiten interpretación expansiva'),
+        'concentracion_poder': _texto('poder concentrado y en qué organismo/persona'),
+        'omisiones_significativas': _lista('información importante que se omite'),
+        'eufemismos_detectados': _lista('lenguaje que oculta la verdadera función'),
+        'nivel_transparencia': _opciones('alto', 'medio', 'bajo'),
+        'señales_alerta': _lista('aspectos que requieren escrutinio adicional'),
+    }),
+    'abogado_diablo': _objeto({
+        'usos_no_declarados': _lista(),
+        'perjudicados_omitidos': _lista(),
+        'interpretaciones_abusivas': _lista(),
+        'precedentes_peligrosos': _lista(),
+        'usos_no_previstos': _lista(),
+        'informacion_oculta': _lista(),
+        'beneficiarios_ocultos': _lista(),
+        'nivel_riesgo_democratico': _opciones('bajo', 'medio', 'alto', 'critico'),
+        'red_flags_principales': _lista(),
+    }),
+    'semantico': _objeto({
+        'tema_central_real': _texto('tema real más allá del título oficial'),
+        'subtemas_detectados': _lista(),
+        'patrones_linguisticos': _lista(),
+        'correlaciones_internas': _lista(),
+        'funciones_multiples': _lista(),
+        'intenciones_implicitas': _lista(),
+        'complejidad_semantica': _opciones('baja', 'media', 'alta'),
+        'categoria_emergente': _texto('categoría que emerge del análisis semántico'),
+    }),
+    'patrones': _objeto({
+        'etiqueta': _texto('nombre corto del patrón'),
+        'descripcion': _texto('una oración'),
+    }),
+}
+
+PROMPT_CORRECCION = """{prompt}
+
+Tu respuesta anterior no cumple el formato pedido:
+{problemas}
+
+RESPUESTA ANTERIOR:
+{respuesta}
+
+Devolvé SOLO el objeto JSON corregido, con todas las claves pedidas y los valores permitidos.
+"""
+
+RESULTADOS = ('valida', 'reparada', 'repreguntada', 'incompleta', 'fallida')
+
+_BLOQUE_MARKDOWN = re.compile(r'```(?:json)?\s*(.*?)\s*```', re.DOTALL | re.IGNORECASE)
+_COMA_FINAL = re.compile(r',(\s*[}\]])')
+
+
+class RespuestaJSONInvalida(ValueError):
+    pass
+
+
+def _normalizar_opcion(valor):
+    valor = unicodedata.normalize('NFKD', str(valor)).encode('ascii', 'ignore').decode().strip().lower()
+    return re.sub(r'[\s\-]+', '_', valor)
+
+
+def _cerrar_truncado(texto):
+    """Cierra strings y llaves de una salida cortada (p. ej. por límite de tokens).
+
+    Devuelve dos candidatos: todo lo recibido cerrado tal cual, y lo recibido hasta la última coma
+    (descarta el par clave/valor que quedó a medias).
+    """
+    pila = []
+    en_string = escape = False
+    ultima_coma = None
+    for i, c in enumerate(texto):
+        if en_string:
+            if escape:
+                escape = False
+            elif c == '\\':
+                escape = True
+            elif c == '"':
+                en_string = False
+        elif c == '"':
+            en_string = True
+        elif c in '{[':
+            pila.append('}' if c == '{' else ']')
+        elif c in '}]':
+            if pila:
+                pila.pop()
+        elif c == ',':
+            ultima_coma = (i, list(pila))
+    candidatos = []
+    completo = texto[:-1] if escape else texto
+    if en_string:
+        completo += '"'
+    completo = completo.rstrip()
+    if completo.endswith(':'):
+        completo += ' null'
+    candidatos.append(completo.rstrip(',') + ''.join(reversed(pila)))
+    if ultima_coma is not None:
+        posicion, pila_coma = ultima_coma
+        candidatos.append(texto[:posicion] + ''.join(reversed(pila_coma)))
+    return candidatos
+
+
+def _candidatos(texto):
+    """Variantes del texto a probar con json.loads, de la más fiel a la más reparada"""
+    texto = texto.strip()
+    yield texto
+    bloque = _BLOQUE_MARKDOWN.search(texto)
+    if bloque:
+        texto = bloque.group(1)
+        yield texto
+    elif texto.startswith('```'):
+        # Bloque abierto y nunca cerrado: la salida se cortó
+        texto = texto.split('\n', 1)[1] if '\n' in texto else ''
+    inicio = texto.find('{')
+    if inicio == -1:
+        return
+    fin = texto.rfind('}')
+    if fin > inicio:
+        yield texto[inicio:fin + 1]
+        yield _COMA_FINAL.sub(r'\1', texto[inicio:fin + 1])
+    for cerrado in _cerrar_truncado(texto[inicio:]):
+        yield _COMA_FINAL.sub(r'\1', cerrado)
+
+
+def _valor_vacio(esquema):
+    return [] if esquema.get('type') == 'ARRAY' else ''
+
+
+def _validar(valor, esquema, ruta, problemas):
+    """Valida y normaliza un valor contra el esquema; devuelve (valor, reparado). Anota lo que no se arregla."""
+    tipo = esquema.get('type')
+    if tipo == 'OBJECT':
+        if not isinstance(valor, dict):
+            problemas.append(f"{ruta or 'la respuesta'}: se esperaba un objeto")
+            return valor, False
+        resultado = dict(valor)
+        reparado = False
+        for clave, subesquema in esquema.get('properties', {}).items():
+            if clave not in resultado:
+                if clave in esquema.get('required', ()):
+                    problemas.append(f"falta la clave '{clave}'")
+                continue
+            resultado[clave], cambio = _validar(resultado[clave], subesquema, clave, problemas)
+            reparado = reparado or cambio
+        return resultado, reparado
+    if tipo == 'ARRAY':
+        if valor is None:
+            return [], True
+        if isinstance(valor, str):
+            return ([valor] if valor.strip() else []), True
+        if not isinstance(valor, list):
+            return [valor], True
+        items = esquema.get('items', {})
+        resultado, reparado = [], False
+        for item in valor:
+            item, cambio = _validar(item, items, ruta, problemas)
+            resultado.append(item)
+            reparado = reparado or cambio
+        return resultado, reparado
+    if tipo == 'STRING':
+        if valor is None:
+            return '', True
+        if isinstance(valor, list):
+            return '; '.join(str(v) for v in valor), True
+        if isinstance(valor, dict):
+            return json.dumps(valor, ensure_ascii=False), True
+        if not isinstance(valor, str):
+            return str(valor), True
+        if 'enum' in esquema and valor not in esquema['enum']:
+            normalizado = _normalizar_opcion(valor)
+            if normalizado in esquema['enum']:
+                return normalizado, True
+            problemas.append(f"'{ruta}' vale {valor!r}; valores permitidos: {', '.join(esquema['enum'])}")
+        return valor, False
+    return valor, False
+
+
+def _completar(datos, esquema):
+    """Agrega vacías las claves requeridas que faltan (la sección se guarda con la forma esperada)"""
+    for clave in esquema.get('required', ()):
+        if clave not in datos:
+            datos[clave] = _valor_vacio(esquema['properties'][clave])
+    return datos
+
+
+class ParserRespuestas:
+    """Modo JSON con esquema para las etapas Gemini, reparación local y una repregunta acotada.
+
+    Cada respuesta termina en uno de RESULTADOS: 'valida' (pasó tal cual), 'reparada' (arreglada
+    localmente), 'repreguntada' (hizo falta la repregunta), 'incompleta' (tras la repregunta seguía con claves
+    faltantes o valores fuera de rango: se acepta completada) o 'fallida' (ni siquiera se obtuvo un objeto JSON).
+    """
+
+    def __init__(self, repreguntas=None, esquema_nativo=None):
+        self.repreguntas = int(repreguntas if repreguntas is not None else os.getenv('BORA_GEMINI_REPREGUNTAS', 1))
+        # BORA_GEMINI_JSON_ESQUEMA=0 pide sólo application/json (para modelos sin response_schema)
+        self.esquema_nativo = (esquema_nativo if esquema_nativo is not None
+                               else os.getenv('BORA_GEMINI_JSON_ESQUEMA', '1') != '0')
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def config(self, etapa):
+        """generation_config para generate_content"""
+        config = {'response_mime_type': 'application/json'}
+        if self.esquema_nativo and etapa in ESQUEMAS:
+            config['response_schema'] = ESQUEMAS[etapa]
+        return config
+
+    def interpretar(self, texto, etapa):
+        """Devuelve (datos, problemas, reparada). datos es None si no se pudo leer ningún JSON."""
+        datos = None
+        reparada = False
+        for i, candidato in enumerate(_candidatos(texto or '')):
+            try:
+                datos = json.loads(candidato)
+            except ValueError:
+                continue
+            reparada = i > 0
+            break
+        if datos is None:
+            return None, ['la respuesta no es JSON válido'], False
+        problemas = []
+        esquema = ESQUEMAS.get(etapa, {'type': 'OBJECT'})
+        datos, normalizada = _validar(datos, esquema, '', problemas)
+        if not isinstance(datos, dict):
+            return None, problemas, False
+        return datos, problemas, reparada or normalizada
+
+    def obtener(self, generar, prompt, etapa):
+        """Pide, valida y si hace falta repregunta. `generar(prompt)` devuelve el texto de la respuesta.
+
+        Lanza RespuestaJSONInvalida si ni tras la repregunta se obtiene un objeto JSON.
+        """
+        texto = generar(prompt)
+        datos, problemas, reparada = self.interpretar(texto, etapa)
+        intentos = 0
+        while problemas and intentos < self.repreguntas:
+            intentos += 1
+            print(f"✗ Respuesta JSON de Gemini inválida ({etapa}): {'; '.join(problemas[:3])}. Repreguntando...")
+            texto = generar(PROMPT_CORRECCION.format(prompt=prompt.rstrip(), problemas='\n'.join(
+                f"- {p}" for p in problemas[:10]), respuesta=(texto or '')[:4000]))
+            nuevos, nuevos_problemas, _ = self.interpretar(texto, etapa)
+            # Si la repregunta salió peor que lo que ya había, se conserva lo anterior
+            if nuevos is not None and (datos is None or len(nuevos_problemas) <= len(problemas)):
+                datos, problemas = nuevos, nuevos_problemas
+        if datos is None:
+            self._registrar(etapa, 'fallida')
+            raise RespuestaJSONInvalida(f"Respuesta no JSON tras {intentos + 1} intentos: {'; '.join(problemas)}")
+        if problemas:
+            resultado = 'incompleta'
+            _completar(datos, ESQUEMAS.get(etapa, {}))
+        elif intentos:
+            resultado = 'repreguntada'
+        else:
+            resultado = 'reparada' if reparada else 'valida'
+        self._registrar(etapa, resultado)
+        return datos
+
+    def _registrar(self, etapa, resultado):
+        registry.sumar('bora_gemini_json_total', 1, 'Respuestas JSON de Gemini por etapa y resultado',
+                       etapa=etapa, resultado=resultado)
+        with self._lock:
+            por_etapa = self._stats.setdefault(etapa, dict.fromkeys(RESULTADOS, 0))
+            por_etapa[resultado] += 1
+
+    def estadisticas(self):
+        """Conteos por etapa y resultado, con la tasa de fallo de parseo (respuestas que no llegaron válidas)"""
+        with self._lock:
+            stats = {etapa: dict(conteos) for etapa, conteos in self._stats.items()}
+        for conteos in stats.values():
+            total = sum(conteos.values())
+            conteos['total'] = total
+            # Respuestas que ni reparándolas localmente servían en el primer intento (antes, secciones perdidas)
+            conteos['tasa_fallo_parseo'] = round((total - conteos['valida'] - conteos['reparada']) / total, 4) if total else 0.0
+            conteos['tasa_fallida'] = round(conteos['fallida'] / total, 4) if total else 0.0
+        return stats
@@ -0,0 +1,150 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+
+import serializacion
+
+
+GRANULARIDADES = ('dia', 'semana', 'mes')
+METRICAS = {  # nombre corto (parámetro de la API) -> campo de cada período
+    'riesgo': 'niveles_riesgo',
+    'categoria': 'categorias_emergentes',
+    'transparencia': 'niveles_transparencia',
+}
+
+
+def periodo(fecha, granularidad):
+    """'2024-01-02' -> '2024-01-02' (dia), '2024-W01' (semana ISO) o '2024-01' (mes); None si la fecha no es válida"""
+    try:
+        dia = date.fromisoformat(str(fecha)[:10])
+    except ValueError:
+        return None
+    if granularidad == 'dia':
+        return dia.isoformat()
+    if granularidad == 'semana':
+        anio, semana, _ = dia.isocalendar()
+        return f"{anio}-W{semana:02d}"
+    return dia.strftime('%Y-%m')
+
+
+def valores_analisis(analisis):
+    """Lo que cada análisis aporta a las series: fecha, riesgo, categoría emergente y transparencia"""
+    diablo = analisis.get('analisis_abogado_diablo', {}) or {}
+    riesgo = 'omitido_por_triage' if diablo.get('omitido_por_triage') else diablo.get('nivel_riesgo_democratico') or 'sin_dato'
+    return [
+        str(analisis.get('fecha_boletin') or ''),
+        str(riesgo),
+        str((analisis.get('analisis_semantico', {}) or {}).get('categoria_emergente') or 'sin_clasificar'),
+        str((analisis.get('analisis_critico', {}) or {}).get('nivel_transparencia') or 'sin_dato'),
+    ]
+
+
+class RollupsTemporales:
+    """Series diarias, semanales y mensuales (riesgo, categoría emergente, transparencia) materializadas.
+
+    Se actualizan de a un análisis; como se guarda el aporte de cada medida, re-analizar una medida resta
+    lo que había sumado antes y las series nunca cuentan doble. Una consulta recorre sólo los períodos del
+    rango pedido, sin importar cuántas medidas haya en el corpus.
+    """
+
+    ARCHIVO = 'rollups.json'
+    VERSION = 1
+
+    def __init__(self):
+        self.aportes = {}  # clave -> [fecha, riesgo, categoria, transparencia]
+        self.series = {g: {} for g in GRANULARIDADES}
+        self.actualizado = None
+        self._orden = {}
+
+    @staticmethod
+    def _periodo_vacio():
+        return dict({'total': 0}, **{campo: {} for campo in METRICAS.values()})
+
+    def _aplicar(self, valores, signo):
+        fecha, riesgo, categoria, transparencia = valores
+        for granularidad in GRANULARIDADES:
+            clave_periodo = periodo(fecha, granularidad)
+            if clave_periodo is None:
+                continue
+            serie = self.series[granularidad]
+            if clave_periodo not in serie:
+                serie[clave_periodo] = self._periodo_vacio()
+                self._orden.pop(granularidad, None)
+            datos = serie[clave_periodo]
+            datos['total'] += signo
+            for campo, valor in zip(METRICAS.values(), (riesgo, categoria, transparencia)):
+                datos[campo][valor] = datos[campo].get(valor, 0) + signo
+                if not datos[campo][valor]:
+                    del datos[campo][valor]
+            if not datos['total']:
+                del serie[clave_periodo]
+                self._orden.pop(granularidad, None)
+
+    def agregar_analisis(self, clave, analisis):
+        """Suma (o actualiza) el aporte de un análisis. Devuelve False si no cambió nada."""
+        valores = valores_analisis(analisis)
+        anteriores = self.aportes.get(clave)
+        if anteriores == valores:
+            return False
+        if anteriores:
+            self._aplicar(anteriores, -1)
+        self._aplicar(valores, 1)
+        self.aportes[clave] = valores
+        self.actualizado = datetime.now().isoformat()
+        return True
+
+    # --- Consultas ---
+
+    def serie(self, granularidad='dia', desde=None, hasta=None, metricas=None):
+        """Períodos del rango [desde, hasta] (fechas AAAA-MM-DD) ordenados, con las métricas pedidas"""
+        serie = self.series[granularidad]
+        if granularidad not in self._orden:
+            self._orden[granularidad] = sorted(serie)
+        orden = self._orden[granularidad]
+        inicio = bisect_left(orden, periodo(desde, granularidad)) if desde and periodo(desde, granularidad) else 0
+        fin = bisect_right(orden, periodo(hasta, granularidad)) if hasta and periodo(hasta, granularidad) else len(orden)
+        campos = [METRICAS[m] for m in (metricas or METRICAS)]
+        return [dict({'periodo': p, 'total': serie[p]['total']}, **{c: serie[p][c] for c in campos})
+                for p in orden[inicio:fin]]
+
+    # --- Persistencia ---
+
+    def to_dict(self):
+        return {'version': self.VERSION, 'aportes': self.aportes, 'series': self.series, 'actualizado': self.actualizado}
+
+    @classmethod
+    def from_dict(cls, datos):
+        rollups = cls()
+        rollups.aportes = datos.get('aportes', {})
+        rollups.series.update(datos.get('series', {}))
+        rollups.actualizado = datos.get('actualizado')
+        return rollups
+
+    def guardar(self, path):
+        serializacion.guardar(self.to_dict(), path)
+
+    @classmethod
+    def cargar(cls, path):
+        return cls.from_dict(serializacion.cargar(path))
+
+
+def reconstruir():
+    """Recalcula todas las series desde data/analyzed (p. ej. si cambia la definición de una métrica) y las sube"""
+    from analyzer import BatchAnalyzer
+
+    batch = BatchAnalyzer()
+    rollups = RollupsTemporales()
+    sufijo = '_analysis_agnostic.json'
+    archivos = [f for f in batch.list_hostinger_files('analyzed') if f.endswith(sufijo)]
+    print(f"Recalculando series temporales con {len(archivos)} análisis...")
+    for i, archivo in enumerate(archivos, 1):
+        analisis = batch.download_json_from_hostinger(f'analyzed/{archivo}')
+        if analisis:
+            rollups.agregar_analisis(archivo[:-len(sufijo)], analisis)
+        if i % 1000 == 0:
+            print(f"{i}/{len(archivos)}")
+    batch.guardar_estado(RollupsTemporales.ARCHIVO, rollups.guardar)
+    print(f"✓ Series temporales recalculadas: {len(rollups.series['dia'])} días, {len(rollups.aportes)} medidas.")
+
+
+if __name__ == '__main__':
+    reconstruir()
@@ -9,12 +9,25 @@ import time
 from datetime import datetime, date, timedelta
 import re
 from pathlib import Path
+from contextlib import contextmanager
+from manifest import WorkManifest
+from profiling import MedidaProfiler, perfilado_activo
+from compresion import leer_para_subir
+from lectura_parcial import DIRECTORIO_METADATOS, metadatos
+import serializacion
 
 class BoraScraperCore:
+    NUMERO_INICIAL = 300720
+    MAX_404_CONSECUTIVOS = 50
+
     def __init__(self):
         self.session = self.setup_session()
         self.data_dir = Path("data")
         self.data_dir.mkdir(exist_ok=True)
+        self.manifest = WorkManifest(self.conectar_ftp)
+        # Perfilado opt-in por medida (BORA_PROFILE=1): fetch + parseo + guardado
+        self.profiler = MedidaProfiler('scraper') if perfilado_activo() else None
+        self.pipeline = None
         
     def setup_session(self):
         """Configurar sesión HTTP con retry"""
@@ -31,98 +44,105 @@ class BoraScraperCore:
 
     def get_text_from_measure_page(self, numero_medida, fecha_str):
         """Extraer contenido de una medida específica - ENFOQUE AGNÓSTICO"""
-        url = f"https://www.boletinoficial.gob.ar/detalleAviso/primera/{numero_medida}/{fecha_str.replace('-', '')}"
-        
         try:
-            response = self.session.get(url, timeout=30)
-            
-            if response.status_code == 404:
+            descarga = self.descargar_pagina(numero_medida, fecha_str)
+            if descarga is None:
                 return None
-                
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Detectar fecha REAL del HTML
-            fecha_real = self.extraer_fecha_real_del_html(soup)
-            
-            if not fecha_real:
-                fecha_real = fecha_str
-                advertencia_fecha = f"Fecha no detectada, usando fecha del loop: {fecha_str}"
-            else:
-                advertencia_fecha = None
-            
-            # Estructura agnóstica - guardamos todo raw para análisis posterior
-            data = {
-                'numero_medida': numero_medida,
-                'fecha_boletin': fecha_real,
-                'url': url,
-                'titulo_raw': '',
-                'contenido_html_completo': self.extract_relevant_content_only(soup),
-                'texto_completo_limpio': '',
-                'estructura_detectada': {},
-                'metadatos_extraidos': {},
-                'elementos_detectados': [],
-                'pdf_urls': [],
-                'tiene_pdf': False,
-                'timestamp_scraping': datetime.now().isoformat()
-            }
-            
-            # Extraer título sin categorizar
-            titulo_elem = soup.find('h1') or soup.find('h2', class_='titulo') or soup.find('h2')
-            if titulo_elem:
-                data['titulo_raw'] = titulo_elem.get_text(strip=True)
-            
-            # Extraer TODOS los elementos de navegación/breadcrumb sin asumir estructura
-            navegacion_elementos = []
-            breadcrumb = soup.find('nav', {'aria-label': 'breadcrumb'})
-            if breadcrumb:
-                links = breadcrumb.find_all('a')
-                for link in links:
-                    navegacion_elementos.append({
-                        'texto': link.get_text(strip=True),
-                        'href': link.get('href', ''),
-                        'posicion': len(navegacion_elementos)
-                    })
-            data['metadatos_extraidos']['navegacion'] = navegacion_elementos
-            
-            cuerpo_div = soup.find('div', id='cuerpoDetalleAviso')
-            if cuerpo_div:
-                # Texto completo limpio del cuerpo
-                data['texto_completo_limpio'] = cuerpo_div.get_text(separator='\n', strip=True)
-                
-                # Detectar estructura en el cuerpo
-                data['estructura_detectada'] = self.detect_document_structure_flexible(cuerpo_div)
-            
-            # Extraer TODOS los elementos que parezcan firmantes/autoridades
-            data['elementos_detectados'] = self.extract_all_potential_signers(soup)
-            
-            # Extraer PDFs
-            pdf_links = soup.find_all('a', href=re.compile(r'\.pdf', re.IGNORECASE))
-            for link in pdf_links:
-                pdf_url = link.get('href')
-                if pdf_url:
-                    if not pdf_url.startswith('http'):
-                        pdf_url = 'https://www.boletinoficial.gob.ar' + pdf_url
-                    data['pdf_urls'].append({
-                        'url': pdf_url,
-                        'texto_enlace': link.get_text(strip=True),
-                        'contexto': self.get_link_context(link)
-                    })
-            
-            data['tiene_pdf'] = len(data['pdf_urls']) > 0
-            
-            # Extraer metadatos adicionales sin categorizar
-            data['metadatos_extraidos'].update(self.extract_all_metadata(soup))
-            
-            if advertencia_fecha:
-                data['advertencia_fecha'] = advertencia_fecha
-            
-            return data
-            
+            return self.parsear_pagina(numero_medida, fecha_str, *descarga)
         except Exception as e:
             print(f"Error procesando medida {numero_medida}: {str(e)}")
             return None
 
+    def descargar_pagina(self, numero_medida, fecha_str, session=None):
+        """(url, html) de la medida, o None si no existe (404). Es la parte de red del scraping."""
+        url = f"https://www.boletinoficial.gob.ar/detalleAviso/primera/{numero_medida}/{fecha_str.replace('-', '')}"
+        response = (session or self.session).get(url, timeout=30)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return url, response.content
+
+    def parsear_pagina(self, numero_medida, fecha_str, url, contenido):
+        """Estructura agnóstica de la medida a partir del HTML. Sólo CPU (BeautifulSoup): no usa red ni estado del scraper."""
+        soup = BeautifulSoup(contenido, 'html.parser')
+        
+        # Detectar fecha REAL del HTML
+        fecha_real = self.extraer_fecha_real_del_html(soup)
+        
+        if not fecha_real:
+            fecha_real = fecha_str
+            advertencia_fecha = f"Fecha no detectada, usando fecha del loop: {fecha_str}"
+        else:
+            advertencia_fecha = None
+        
+        # Estructura agnóstica - guardamos todo raw para análisis posterior
+        data = {
+            'numero_medida': numero_medida,
+            'fecha_boletin': fecha_real,
+            'url': url,
+            'titulo_raw': '',
+            'contenido_html_completo': self.extract_relevant_content_only(soup),
+            'texto_completo_limpio': '',
+            'estructura_detectada': {},
+            'metadatos_extraidos': {},
+            'elementos_detectados': [],
+            'pdf_urls': [],
+            'tiene_pdf': False,
+            'timestamp_scraping': datetime.now().isoformat()
+        }
+        
+        # Extraer título sin categorizar
+        titulo_elem = soup.find('h1') or soup.find('h2', class_='titulo') or soup.find('h2')
+        if titulo_elem:
+            data['titulo_raw'] = titulo_elem.get_text(strip=True)
+        
+        # Extraer TODOS los elementos de navegación/breadcrumb sin asumir estructura
+        navegacion_elementos = []
+        breadcrumb = soup.find('nav', {'aria-label': 'breadcrumb'})
+        if breadcrumb:
+            links = breadcrumb.find_all('a')
+            for link in links:
+                navegacion_elementos.append({
+                    'texto': link.get_text(strip=True),
+                    'href': link.get('href', ''),
+                    'posicion': len(navegacion_elementos)
+                })
+        data['metadatos_extraidos']['navegacion'] = navegacion_elementos
+        
+        cuerpo_div = soup.find('div', id='cuerpoDetalleAviso')
+        if cuerpo_div:
+            # Texto completo limpio del cuerpo
+            data['texto_completo_limpio'] = cuerpo_div.get_text(separator='\n', strip=True)
+            
+            # Detectar estructura en el cuerpo
+            data['estructura_detectada'] = self.detect_document_structure_flexible(cuerpo_div)
+        
+        # Extraer TODOS los elementos que parezcan firmantes/autoridades
+        data['elementos_detectados'] = self.extract_all_potential_signers(soup)
+        
+        # Extraer PDFs
+        pdf_links = soup.find_all('a', href=re.compile(r'\.pdf', re.IGNORECASE))
+        for link in pdf_links:
+            pdf_url = link.get('href')
+            if pdf_url:
+                if not pdf_url.startswith('http'):
+                    pdf_url = 'https://www.boletinoficial.gob.ar' + pdf_url
+                data['pdf_urls'].append({
+                    'url': pdf_url,
+                    'texto_enlace': link.get_text(strip=True),
+                    'contexto': self.get_link_context(link)
+                })
+        
+        data['tiene_pdf'] = len(data['pdf_urls']) > 0
+        
+        # Extraer metadatos adicionales sin categorizar
+        data['metadatos_extraidos'].update(self.extract_all_metadata(soup))
+        
+        if advertencia_fecha:
+            data['advertencia_fecha'] = advertencia_fecha
+        
+        return data
+
     def detect_document_structure_flexible(self, content_div):
         """Detectar estructura del documento de manera flexible"""
         texto_completo = content_div.get_text()
@@ -291,14 +311,38 @@ class BoraScraperCore:
         
         return None
 
+    def pipeline_activo(self):
+        """Pipeline (BORA_SCRAPER_PIPELINE=0 lo desactiva); el perfilado por medida necesita el recorrido secuencial"""
+        return os.getenv('BORA_SCRAPER_PIPELINE', '1') != '0' and not self.profiler
+
+    @contextmanager
+    def abrir_pipeline(self):
+        """Pipeline de scraping abierto para todas las fechas del bloque (None si está desactivado)"""
+        if self.pipeline is not None or not self.pipeline_activo():
+            yield self.pipeline
+            return
+        from scraper_pipeline import PipelineScraper
+        self.pipeline = PipelineScraper(self)
+        try:
+            yield self.pipeline
+        finally:
+            self.pipeline.cerrar()
+            self.pipeline = None
+
     def scrape_fecha_especifica(self, fecha_str, limit=None):
         """Scraper medidas de una fecha específica - AGNÓSTICO"""
+        if self.pipeline is None and self.pipeline_activo():
+            with self.abrir_pipeline():
+                return self.scrape_fecha_especifica(fecha_str, limit)
+        if self.pipeline is not None:
+            return self.pipeline.scrape_fecha(fecha_str, limit)
+        
         print(f"Scraping fecha: {fecha_str} (modo agnóstico)")
         
-        numero_actual = 300720
+        numero_actual = self.NUMERO_INICIAL
         medidas_encontradas = 0
         medidas_consecutivas_404 = 0
-        max_404_consecutivos = 50
+        max_404_consecutivos = self.MAX_404_CONSECUTIVOS
         
         while True:
             if limit and medidas_encontradas >= limit:
@@ -310,7 +354,16 @@ class BoraScraperCore:
             
             print(f"Probando medida {numero_actual}...")
             
-            medida_data = self.get_text_from_measure_page(numero_actual, fecha_str)
+            perfil = self.profiler.iniciar(f"medida_{numero_actual}_{fecha_str.replace('-', '')}") if self.profiler else None
+            try:
+                medida_data = self.get_text_from_measure_page(numero_actual, fecha_str)
+                if medida_data is not None:
+                    if perfil:
+                        perfil['medida'] = medida_data
+                    self.save_medida(medida_data)
+            finally:
+                if perfil:
+                    self.profiler.terminar(perfil)
             
             if medida_data is None:
                 medidas_consecutivas_404 += 1
@@ -319,7 +372,6 @@ class BoraScraperCore:
             
             medidas_consecutivas_404 = 0
             
-            self.save_medida(medida_data)
             medidas_encontradas += 1
             print(f"✓ Medida {numero_actual} guardada (total: {medidas_encontradas})")
             
@@ -327,6 +379,8 @@ class BoraScraperCore:
             time.sleep(0.5)
         
         print(f"Scraping completado. {medidas_encontradas} medidas encontradas.")
+        if self.profiler:
+            self.profiler.finalizar()
         return medidas_encontradas
 
     def scrape_sistematico(self, fecha_inicio, fecha_fin):
@@ -339,18 +393,20 @@ class BoraScraperCore:
         
         total_medidas = 0
         
-        while fecha_actual <= fecha_limite:
-            fecha_str = fecha_actual.strftime("%Y-%m-%d")
-            print(f"\n--- Procesando {fecha_str} ---")
-            
-            medidas_del_dia = self.scrape_fecha_especifica(fecha_str)
-            total_medidas += medidas_del_dia
-            
-            print(f"Día {fecha_str}: {medidas_del_dia} medidas")
-            print(f"Total acumulado: {total_medidas} medidas")
-            
-            fecha_actual += timedelta(days=1)
-            time.sleep(2)
+        # Un solo pipeline para todo el rango: el parseo y las subidas de un día se solapan con las descargas del siguiente
+        with self.abrir_pipeline():
+            while fecha_actual <= fecha_limite:
+                fecha_str = fecha_actual.strftime("%Y-%m-%d")
+                print(f"\n--- Procesando {fecha_str} ---")
+                
+                medidas_del_dia = self.scrape_fecha_especifica(fecha_str)
+                total_medidas += medidas_del_dia
+                
+                print(f"Día {fecha_str}: {medidas_del_dia} medidas")
+                print(f"Total acumulado: {total_medidas} medidas")
+                
+                fecha_actual += timedelta(days=1)
+                time.sleep(2)
         
         print(f"\n=== SCRAPING COMPLETADO ===")
         print(f"Total de medidas scrapeadas: {total_medidas}")
@@ -364,13 +420,43 @@ class BoraScraperCore:
         temp_dir = tempfile.gettempdir()
         filepath = os.path.join(temp_dir, filename)
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(medida_data, f, ensure_ascii=False, indent=2)
+        serializacion.guardar(medida_data, filepath)
         
         print(f"Guardado localmente en: {filepath}")
-        self.upload_to_hostinger(filepath)
+        if self.upload_to_hostinger(filepath):
+            self.save_metadatos(medida_data, filename)
+            # Aviso al analyzer vía manifest: no necesita listar data/raw para encontrar trabajo
+            try:
+                self.manifest.registrar(filename, 'recibida')
+            except Exception as e:
+                print(f"✗ Error registrando '{filename}' en el manifest: {e}")
+
+    def save_metadatos(self, medida_data, filename):
+        """Sidecar con los campos chicos de la medida (data/raw_meta/<archivo>): el censo de tipos no baja el HTML"""
+        import tempfile
+        directorio = os.path.join(tempfile.gettempdir(), 'raw_meta')
+        os.makedirs(directorio, exist_ok=True)
+        filepath = os.path.join(directorio, filename)
+        try:
+            serializacion.guardar(metadatos(medida_data), filepath)
+            self.upload_to_hostinger(filepath, DIRECTORIO_METADATOS)
+        finally:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+    def conectar_ftp(self):
+        """Conexión FTP logueada a Hostinger, en la raíz del sitio."""
+        import ftplib
+
+        FTP_HOST = "ftp.agoraenlared.com"
+        FTP_USER = "u112219758.boria"
+        FTP_PASS = os.getenv('HOSTINGER_FTP_PASSWORD', "Marta1664?")
+
+        ftp = ftplib.FTP(FTP_HOST)
+        ftp.login(FTP_USER, FTP_PASS)
+        return ftp
 
-    def upload_to_hostinger(self, local_filepath):
+    def upload_to_hostinger(self, local_filepath, target_dir='data/raw'):
         """Subir archivo a Hostinger vía FTP."""
         import ftplib
         from pathlib import Path
@@ -387,7 +473,6 @@ class BoraScraperCore:
             ftp = ftplib.FTP(FTP_HOST)
             ftp.login(FTP_USER, FTP_PASS)
 
-            target_dir = 'data/raw'
             try:
                 ftp.cwd(target_dir)
             except ftplib.error_perm:
@@ -401,8 +486,9 @@ class BoraScraperCore:
                 ftp.cwd(target_dir)
 
             filename = Path(local_filepath).name
-            with open(local_filepath, 'rb') as f:
-                ftp.storbinary(f'STOR {filename}', f)
+            # Se sube comprimido (BORA_COMPRESION); el nombre no cambia y los lectores detectan el formato
+            import io
+            ftp.storbinary(f'STOR {filename}', io.BytesIO(leer_para_subir(local_filepath)))
             
             ftp.quit()
             print(f"✓ Archivo '{filename}' subido a Hostinger exitosamente.")
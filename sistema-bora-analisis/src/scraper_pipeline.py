@@ -0,0 +1,235 @@
+import io
+import os
+import time
+import queue
+import ftplib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import serializacion
+from compresion import comprimir
+from lectura_parcial import DIRECTORIO_METADATOS, metadatos
+from metrics import medir_etapa, sumar_bytes, registry
+
+_FIN = object()
+
+
+def _parsear(numero_medida, fecha_str, url, contenido):
+    """Corre en el pool de procesos: parseo, serialización y compresión (todo CPU). Devuelve lo listo para subir."""
+    from scraper_VIEJO_suspendido import BoraScraperCore
+    # Los métodos de parseo no usan el estado del scraper (sesión HTTP, FTP, manifest): no hace falta __init__
+    parser = BoraScraperCore.__new__(BoraScraperCore)
+    medida_data = parser.parsear_pagina(numero_medida, fecha_str, url, contenido)
+    filename = f"medida_{medida_data['numero_medida']}_{medida_data['fecha_boletin'].replace('-', '')}.json"
+    return filename, comprimir(serializacion.dumps(medida_data)), comprimir(serializacion.dumps(metadatos(medida_data)))
+
+
+class PipelineScraper:
+    """Scraping en etapas solapadas: descargas (threads) -> parseo (procesos) -> subida por lotes (una conexión FTP).
+
+    Las colas entre etapas son acotadas: si el parseo o la subida se atrasan, las descargas se frenan solas en
+    lugar de acumular HTML en memoria, y mientras BeautifulSoup parsea no se deja de descargar. Un coordinador
+    procesa las descargas en orden de número, así el corte por 404 consecutivos y el `limit` son los mismos
+    que en el scraping secuencial.
+    """
+
+    def __init__(self, scraper, fetchers=None, procesos=None, lote=None):
+        self.scraper = scraper
+        self.fetchers = int(fetchers or os.getenv('BORA_SCRAPER_FETCHERS', 4))
+        self.procesos = int(procesos or os.getenv('BORA_SCRAPER_PROCESOS', os.cpu_count() or 2))
+        self.lote = int(lote or os.getenv('BORA_SCRAPER_LOTE', 20))
+        # Separación mínima entre requests al Boletín, sumando todas las descargas: por defecto el mismo ritmo
+        # (~2 requests/s) que el scraping secuencial con su pausa de 0.5 s. Bajarlo es una decisión explícita.
+        self.intervalo = float(os.getenv('BORA_SCRAPER_INTERVALO', 0.5))
+        # spawn: los procesos del pool se crean a demanda, cuando los threads de descarga ya corren, y un fork
+        # con threads vivos puede heredar locks tomados
+        self.pool = ProcessPoolExecutor(max_workers=self.procesos, mp_context=multiprocessing.get_context('spawn'))
+        self.cola_numeros = queue.Queue()  # acotada por la ventana de descargas en vuelo del coordinador
+        self.cola_descargas = queue.Queue()
+        self.cola_parseo = queue.Queue(maxsize=2 * self.procesos)
+        self.cola_subida = queue.Queue(maxsize=2 * self.lote)
+        self.ritmo_lock = threading.Lock()
+        self.proximo_request = 0.0
+        self.local = threading.local()
+        self.subidas = 0
+        self.errores = 0
+        self.hilos = [threading.Thread(target=self._descargar, name=f'scraper-descarga-{i}', daemon=True)
+                      for i in range(self.fetchers)]
+        self.recolector = threading.Thread(target=self._recolectar, name='scraper-parseo', daemon=True)
+        self.subidor = threading.Thread(target=self._subir, name='scraper-subida', daemon=True)
+        for hilo in self.hilos + [self.recolector, self.subidor]:
+            hilo.start()
+        print(f"✓ Pipeline de scraping: {self.fetchers} descargas, {self.procesos} procesos de parseo, "
+              f"lotes de {self.lote} subidas")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    # --- Coordinador ---
+
+    def scrape_fecha(self, fecha_str, limit=None):
+        """Recorre los números de una fecha como scrape_fecha_especifica, con `2 * fetchers` descargas en vuelo"""
+        print(f"Scraping fecha: {fecha_str} (modo agnóstico, pipeline)")
+        ventana = 2 * self.fetchers
+        siguiente = frontera = self.scraper.NUMERO_INICIAL
+        llegadas = {}  # número -> descarga (o None) llegada antes que las de números menores
+        en_vuelo = encontradas = consecutivas_404 = 0
+        cortar = False
+        while True:
+            while not cortar and en_vuelo < ventana:
+                self.cola_numeros.put((fecha_str, siguiente))
+                siguiente += 1
+                en_vuelo += 1
+            if en_vuelo == 0:
+                break
+            numero, descarga = self.cola_descargas.get()
+            en_vuelo -= 1
+            llegadas[numero] = descarga
+            while not cortar and frontera in llegadas:
+                descarga = llegadas.pop(frontera)
+                if descarga is None:
+                    consecutivas_404 += 1
+                else:
+                    consecutivas_404 = 0
+                    encontradas += 1
+                    # Bloquea si el parseo va atrasado: el coordinador deja de pedir números (backpressure)
+                    self.cola_parseo.put(self.pool.submit(_parsear, frontera, fecha_str, *descarga))
+                    print(f"✓ Medida {frontera} descargada (total: {encontradas})")
+                frontera += 1
+                if consecutivas_404 >= self.scraper.MAX_404_CONSECUTIVOS:
+                    print(f"Se encontraron {consecutivas_404} medidas consecutivas inexistentes. Terminando scraping.")
+                    cortar = True
+                elif limit and encontradas >= limit:
+                    cortar = True
+            # Con el corte decidido, las descargas que siguen en vuelo se esperan y se descartan
+
+        print(f"Scraping completado. {encontradas} medidas encontradas.")
+        return encontradas
+
+    # --- Etapas ---
+
+    def _esperar_turno(self):
+        with self.ritmo_lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self.proximo_request)
+            self.proximo_request = turno + self.intervalo
+        time.sleep(turno - ahora)
+
+    def _descargar(self):
+        # requests.Session no es thread-safe: una por hilo de descarga
+        self.local.session = self.scraper.setup_session()
+        while True:
+            tarea = self.cola_numeros.get()
+            if tarea is _FIN:
+                return
+            fecha_str, numero = tarea
+            self._esperar_turno()
+            try:
+                with medir_etapa('scraper_descarga'):
+                    descarga = self.scraper.descargar_pagina(numero, fecha_str, self.local.session)
+            except Exception as e:
+                print(f"Error procesando medida {numero}: {str(e)}")
+                descarga = None
+            self.cola_descargas.put((numero, descarga))
+
+    def _recolectar(self):
+        """Resultados del pool en orden; bloquea en la cola de subida si el FTP va atrasado"""
+        while True:
+            futuro = self.cola_parseo.get()
+            if futuro is _FIN:
+                self.cola_subida.put(_FIN)
+                return
+            try:
+                self.cola_subida.put(futuro.result())
+            except Exception as e:
+                self.errores += 1
+                registry.sumar('bora_scraper_errores_total', 1, 'Medidas del scraper perdidas por etapa', etapa='parseo')
+                print(f"✗ Error parseando una medida: {e}")
+
+    def _subir(self):
+        """Sube de a lotes (lo que ya esté parseado, hasta `lote`) reutilizando la conexión FTP entre lotes"""
+        ftp = None
+        terminar = False
+        while not terminar:
+            lote = [self.cola_subida.get()]
+            while len(lote) < self.lote and lote[-1] is not _FIN:
+                try:
+                    lote.append(self.cola_subida.get_nowait())
+                except queue.Empty:
+                    break
+            if lote[-1] is _FIN:
+                terminar = True
+                lote.pop()
+            if lote:
+                ftp = self._subir_lote(ftp, lote)
+        if ftp is not None:
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                pass
+
+    @staticmethod
+    def _entrar(ftp, raiz, directorio):
+        ftp.cwd(raiz)
+        for parte in directorio.split('/'):
+            try:
+                ftp.cwd(parte)
+            except ftplib.error_perm:
+                ftp.mkd(parte)
+                ftp.cwd(parte)
+
+    def _subir_lote(self, ftp, lote):
+        """Sube el lote (raw + sidecars) y lo registra en el manifest con un solo APPE. Devuelve la conexión viva."""
+        for intento in (1, 2):
+            try:
+                if ftp is None:
+                    ftp = self.scraper.conectar_ftp()
+                raiz = ftp.pwd()
+                with medir_etapa('scraper_subida'):
+                    self._entrar(ftp, raiz, 'data/raw')
+                    for filename, datos, _ in lote:
+                        ftp.storbinary(f'STOR {filename}', io.BytesIO(datos))
+                    self._entrar(ftp, raiz, DIRECTORIO_METADATOS)
+                    for filename, _, sidecar in lote:
+                        ftp.storbinary(f'STOR {filename}', io.BytesIO(sidecar))
+                    ftp.cwd(raiz)
+                sumar_bytes('scraper_subida', sum(len(datos) + len(sidecar) for _, datos, sidecar in lote))
+                break
+            except ftplib.all_errors as e:
+                # Conexión vencida o caída: se reintenta una vez con una nueva (STOR es idempotente)
+                try:
+                    ftp.close()
+                except Exception:
+                    pass
+                ftp = None
+                if intento == 2:
+                    self.errores += len(lote)
+                    registry.sumar('bora_scraper_errores_total', len(lote), 'Medidas del scraper perdidas por etapa',
+                                   etapa='subida')
+                    print(f"✗ ERROR al subir un lote de {len(lote)} medidas a Hostinger: {e}")
+                    return ftp
+        self.subidas += len(lote)
+        print(f"✓ Lote de {len(lote)} medidas subido a Hostinger (total: {self.subidas}).")
+        # Aviso al analyzer vía manifest: no necesita listar data/raw para encontrar trabajo
+        try:
+            self.scraper.manifest.registrar_varios([{'archivo': filename, 'estado': 'recibida'}
+                                                    for filename, _, _ in lote])
+        except Exception as e:
+            print(f"✗ Error registrando {len(lote)} medidas en el manifest: {e}")
+        return ftp
+
+    def cerrar(self):
+        """Termina las descargas y espera a que se parsee y suba todo lo encolado"""
+        for _ in self.hilos:
+            self.cola_numeros.put(_FIN)
+        for hilo in self.hilos:
+            hilo.join()
+        self.cola_parseo.put(_FIN)
+        self.recolector.join()
+        self.subidor.join()
+        self.pool.shutdown()
+        print(f"✓ Pipeline de scraping cerrado: {self.subidas} medidas subidas, {self.errores} con error.")
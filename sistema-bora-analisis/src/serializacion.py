@@ -0,0 +1,66 @@
+import os
+import json
+
+from compresion import descomprimir
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Compacto por defecto: los embeddings con indent=2 duplican el tamaño y el tiempo de escritura.
+# BORA_JSON_PRETTY=1 vuelve a indentar todo (depuración); BORA_JSON_BACKEND=stdlib fuerza el json estándar.
+
+
+def backend():
+    if orjson is not None and os.getenv('BORA_JSON_BACKEND', 'orjson') != 'stdlib':
+        return 'orjson'
+    return 'stdlib'
+
+
+def _pretty(pretty):
+    return pretty if pretty is not None else os.getenv('BORA_JSON_PRETTY') == '1'
+
+
+def _default(obj):
+    """Tipos que aparecen en nuestros documentos y ninguno de los dos backends serializa solo"""
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, 'item'):
+        return obj.item()
+    raise TypeError(f"Tipo no serializable a JSON: {type(obj).__name__}")
+
+
+def dumps(obj, pretty=None):
+    """Serializa a bytes UTF-8 (sin escapar acentos, como ensure_ascii=False)"""
+    if backend() == 'orjson':
+        opciones = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if _pretty(pretty):
+            opciones |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=opciones)
+    if _pretty(pretty):
+        return json.dumps(obj, ensure_ascii=False, indent=2, default=_default).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def loads(datos):
+    """Parsea bytes o str; los bytes pueden venir comprimidos (gzip/zstd)"""
+    if isinstance(datos, (bytes, bytearray, memoryview)):
+        datos = descomprimir(bytes(datos))
+    if backend() == 'orjson':
+        return orjson.loads(datos)
+    return json.loads(datos)
+
+
+def guardar(obj, path, pretty=None):
+    datos = dumps(obj, pretty)
+    with open(path, 'wb') as f:
+        f.write(datos)
+    return len(datos)
+
+
+def cargar(path):
+    with open(path, 'rb') as f:
+        return loads(f.read())
@@ -1,7 +1,8 @@
 import ftplib
-import json
 from datetime import datetime
 
+import serializacion
+
 FTP_HOST = 'ftp.agoraenlared.com'
 FTP_USER = 'u112219758.boria'
 FTP_PASS = 'Marta1664?'
@@ -23,8 +24,7 @@ archivos = [f for f in ftp.nlst() if f.endswith('.json')][:10]
 for i, archivo in enumerate(archivos, 1):
     with open('temp.json', 'wb') as f:
         ftp.retrbinary(f'RETR {archivo}', f.write)
-    with open('temp.json', 'r') as f:
-        data = json.load(f)
+    data = serializacion.cargar('temp.json')  # puede venir comprimido (gzip/zstd)
     print(f"  {i}/10 - {data.get('numero_medida')}")
 
 print("\nSubiendo archivo de prueba...")
@@ -0,0 +1,191 @@
+import os
+import time
+import uuid
+import sqlite3
+import tempfile
+import threading
+import traceback
+
+import serializacion
+from metrics import medir_etapa, registry
+
+
+ESTADOS = ('pendiente', 'en_curso', 'completado', 'error')
+
+
+class ColaTrabajos:
+    """Cola de trabajos en SQLite con workers en hilos del mismo proceso.
+
+    El archivo es local (BORA_TRABAJOS_DB) y puede compartirse entre varios procesos de la API: tomar un
+    trabajo es un único UPDATE atómico, así que cada trabajo lo ejecuta un solo worker. Los workers
+    actualizan un latido mientras trabajan; un trabajo 'en_curso' sin latido durante BORA_TRABAJOS_ABANDONO
+    segundos (proceso muerto o reiniciado) vuelve a la cola, hasta MAX_INTENTOS veces.
+    """
+
+    MAX_INTENTOS = 3
+    ESPERA_SIN_TRABAJO = 1.0
+    DIAS_RETENCION = 7
+
+    def __init__(self, path=None, workers=None, abandono=None):
+        self.path = path or os.getenv('BORA_TRABAJOS_DB', os.path.join(tempfile.gettempdir(), 'bora_trabajos.sqlite'))
+        self.cantidad_workers = int(workers or os.getenv('BORA_TRABAJOS_WORKERS', 2))
+        self.abandono = float(abandono or os.getenv('BORA_TRABAJOS_ABANDONO', 900))
+        self.manejadores = {}
+        self.hilos = []
+        self.detener = threading.Event()
+        self.hay_trabajo = threading.Condition()
+        self.local = threading.local()
+        with self._conexion() as conn:
+            conn.executescript('''
+                PRAGMA journal_mode = WAL;
+                CREATE TABLE IF NOT EXISTS trabajos (
+                    id TEXT PRIMARY KEY,
+                    tipo TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    parametros BLOB,
+                    resultado BLOB,
+                    error TEXT,
+                    progreso REAL DEFAULT 0,
+                    mensaje TEXT,
+                    intentos INTEGER DEFAULT 0,
+                    creado REAL NOT NULL,
+                    iniciado REAL,
+                    terminado REAL,
+                    latido REAL
+                );
+                CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos(estado, creado);
+            ''')
+
+    def _conexion(self):
+        """Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+        return conn
+
+    def registrar(self, tipo, manejador):
+        """manejador(parametros, avance) -> resultado serializable; avance(fraccion, mensaje=None) reporta progreso"""
+        self.manejadores[tipo] = manejador
+
+    # --- Productor ---
+
+    def encolar(self, tipo, parametros=None):
+        if tipo not in self.manejadores:
+            raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+        id_trabajo = uuid.uuid4().hex
+        self._conexion().execute(
+            'INSERT INTO trabajos (id, tipo, estado, parametros, creado) VALUES (?, ?, ?, ?, ?)',
+            (id_trabajo, tipo, 'pendiente', serializacion.dumps(parametros or {}), time.time()))
+        registry.sumar('bora_trabajos_total', 1, 'Trabajos encolados por tipo', tipo=tipo)
+        with self.hay_trabajo:
+            self.hay_trabajo.notify()
+        return id_trabajo
+
+    def estado(self, id_trabajo, con_resultado=False):
+        fila = self._conexion().execute('SELECT * FROM trabajos WHERE id = ?', (id_trabajo,)).fetchone()
+        return self._describir(fila, con_resultado) if fila else None
+
+    def listar(self, estado=None, limite=50):
+        consulta, parametros = 'SELECT * FROM trabajos', []
+        if estado:
+            consulta += ' WHERE estado = ?'
+            parametros.append(estado)
+        consulta += ' ORDER BY creado DESC LIMIT ?'
+        return [self._describir(f) for f in self._conexion().execute(consulta, parametros + [limite])]
+
+    @staticmethod
+    def _describir(fila, con_resultado=False):
+        descripcion = {
+            'id': fila['id'],
+            'tipo': fila['tipo'],
+            'estado': fila['estado'],
+            'parametros': serializacion.loads(fila['parametros']) if fila['parametros'] else {},
+            'progreso': round(fila['progreso'] or 0, 3),
+            'mensaje': fila['mensaje'],
+            'error': fila['error'],
+            'intentos': fila['intentos'],
+            'creado': fila['creado'],
+            'iniciado': fila['iniciado'],
+            'terminado': fila['terminado'],
+        }
+        if con_resultado:
+            descripcion['resultado'] = serializacion.loads(fila['resultado']) if fila['resultado'] else None
+        return descripcion
+
+    # --- Workers ---
+
+    def iniciar(self):
+        """Arranca los hilos worker (idempotente)"""
+        if self.hilos:
+            return self
+        self.limpiar()
+        for i in range(self.cantidad_workers):
+            hilo = threading.Thread(target=self._bucle, name=f'bora-trabajos-{i}', daemon=True)
+            hilo.start()
+            self.hilos.append(hilo)
+        print(f"✓ Cola de trabajos iniciada ({self.cantidad_workers} workers, {self.path})")
+        return self
+
+    def cerrar(self, espera=30):
+        """Apagado ordenado: los workers terminan el trabajo en curso y no toman otros"""
+        self.detener.set()
+        with self.hay_trabajo:
+            self.hay_trabajo.notify_all()
+        limite = time.monotonic() + espera
+        for hilo in self.hilos:
+            hilo.join(max(limite - time.monotonic(), 0))
+        self.hilos = []
+
+    def _tomar(self):
+        """Marca como 'en_curso' el trabajo pendiente (o abandonado) más antiguo y lo devuelve"""
+        ahora = time.time()
+        conn = self._conexion()
+        conn.execute(
+            "UPDATE trabajos SET estado = 'error', error = 'Se agotaron los intentos', terminado = ? "
+            "WHERE estado = 'en_curso' AND latido < ? AND intentos >= ?",
+            (ahora, ahora - self.abandono, self.MAX_INTENTOS))
+        return conn.execute(
+            '''UPDATE trabajos SET estado = 'en_curso', iniciado = ?, latido = ?, intentos = intentos + 1
+               WHERE id = (SELECT id FROM trabajos
+                           WHERE estado = 'pendiente' OR (estado = 'en_curso' AND latido < ?)
+                           ORDER BY creado LIMIT 1)
+               RETURNING id, tipo, parametros''',
+            (ahora, ahora, ahora - self.abandono)).fetchone()
+
+    def _bucle(self):
+        while not self.detener.is_set():
+            try:
+                trabajo = self._tomar()
+            except sqlite3.OperationalError as e:
+                print(f"✗ Cola de trabajos: no se pudo tomar un trabajo: {e}")
+                trabajo = None
+            if trabajo is None:
+                with self.hay_trabajo:
+                    self.hay_trabajo.wait(self.ESPERA_SIN_TRABAJO)
+                continue
+            self._ejecutar(trabajo['id'], trabajo['tipo'], serializacion.loads(trabajo['parametros']))
+
+    def _ejecutar(self, id_trabajo, tipo, parametros):
+        conn = self._conexion()
+
+        def avance(fraccion, mensaje=None):
+            conn.execute('UPDATE trabajos SET progreso = ?, mensaje = COALESCE(?, mensaje), latido = ? WHERE id = ?',
+                         (min(max(float(fraccion), 0.0), 1.0), mensaje, time.time(), id_trabajo))
+
+        try:
+            with medir_etapa(f'trabajo_{tipo}'):
+                resultado = self.manejadores[tipo](parametros, avance)
+            conn.execute(
+                "UPDATE trabajos SET estado = 'completado', resultado = ?, progreso = 1, terminado = ? WHERE id = ?",
+                (serializacion.dumps(resultado), time.time(), id_trabajo))
+        except Exception as e:
+            print(f"✗ Trabajo {tipo} {id_trabajo} falló: {e}\n{traceback.format_exc(limit=5)}")
+            conn.execute("UPDATE trabajos SET estado = 'error', error = ?, terminado = ? WHERE id = ?",
+                         (str(e)[:500], time.time(), id_trabajo))
+
+    def limpiar(self, dias=None):
+        """Borra los trabajos terminados hace más de `dias` días"""
+        limite = time.time() - 86400 * (dias if dias is not None else self.DIAS_RETENCION)
+        return self._conexion().execute(
+            "DELETE FROM trabajos WHERE estado IN ('completado', 'error') AND terminado < ?", (limite,)).rowcount
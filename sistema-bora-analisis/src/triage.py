@@ -0,0 +1,114 @@
+import os
+import math
+import random
+
+import numpy as np
+
+
+NIVELES_RIESGO = ('bajo', 'medio', 'alto', 'critico')
+
+
+class TriageModel:
+    """Triage local (kNN sobre embeddings + estadísticas de texto) entrenado con niveles de riesgo pasados.
+
+    Decide si una medida merece el análisis completo (4 llamadas a Gemini) o uno reducido.
+    Mientras no haya historial suficiente, todo va al análisis completo.
+    """
+
+    PESO_ESTADISTICAS = 0.5
+
+    def __init__(self, k=15, min_ejemplos=None, umbral_riesgo=None, exploracion=None):
+        self.k = k
+        self.min_ejemplos = int(min_ejemplos or os.getenv('BORA_TRIAGE_MIN_EJEMPLOS', 200))
+        # Probabilidad (según vecinos) de riesgo alto/crítico por debajo de la cual se usa el análisis reducido
+        self.umbral_riesgo = float(umbral_riesgo if umbral_riesgo is not None else os.getenv('BORA_TRIAGE_UMBRAL', 0.1))
+        # Fracción de medidas "reducibles" que igual van al completo para seguir generando etiquetas
+        self.exploracion = float(exploracion if exploracion is not None else os.getenv('BORA_TRIAGE_EXPLORACION', 0.05))
+        self.features = []
+        self.etiquetas = []
+        self._matriz = None
+
+    def vector_estadisticas(self, stats):
+        return np.array([
+            math.log1p(stats.get('longitud_total_caracteres', 0)),
+            math.log1p(stats.get('longitud_total_palabras', 0)),
+            stats.get('secciones_detectadas', 0),
+            1.0 if stats.get('tiene_considerandos') else 0.0,
+            math.log1p(stats.get('longitud_considerandos', 0)),
+            math.log1p(stats.get('longitud_dispositivo', 0)),
+            min(stats.get('ratio_justificacion_accion', 0.0), 10.0)
+        ], dtype=np.float32)
+
+    def vector(self, embeddings, stats):
+        """Vector de features: embedding completo normalizado + estadísticas escaladas; None si no hay embedding"""
+        embedding = embeddings.get('embedding_completo') if isinstance(embeddings, dict) else None
+        if not embedding:
+            return None
+        emb = np.asarray(embedding, dtype=np.float32)
+        norma = np.linalg.norm(emb)
+        if norma > 0:
+            emb = emb / norma
+        # Escala fija (log-longitudes ~ 0-12) para que las estadísticas no dominen la distancia
+        est = self.vector_estadisticas(stats) / 12.0 * self.PESO_ESTADISTICAS
+        return np.concatenate([emb, est])
+
+    def registrar(self, embeddings, stats, analisis):
+        """Agrega un análisis completo (con nivel de riesgo válido) al historial de entrenamiento"""
+        nivel = analisis.get('analisis_abogado_diablo', {}).get('nivel_riesgo_democratico')
+        vector = self.vector(embeddings, stats)
+        if nivel not in NIVELES_RIESGO or vector is None:
+            return
+        self.features.append(vector)
+        self.etiquetas.append(NIVELES_RIESGO.index(nivel))
+        self._matriz = None
+
+    def predecir(self, vector):
+        """Distribución de niveles de riesgo ponderada por similitud entre los k vecinos más cercanos"""
+        if self._matriz is None:
+            self._matriz = np.stack(self.features)
+        distancias = np.linalg.norm(self._matriz - vector, axis=1)
+        k = min(self.k, len(distancias))
+        vecinos = np.argpartition(distancias, k - 1)[:k]
+        pesos = 1.0 / (distancias[vecinos] + 1e-6)
+        distribucion = np.zeros(len(NIVELES_RIESGO))
+        for idx, peso in zip(vecinos, pesos):
+            distribucion[self.etiquetas[idx]] += peso
+        return distribucion / distribucion.sum()
+
+    def decidir(self, embeddings, stats):
+        """Devuelve {'modo': 'completo'|'reducido', ...} con la justificación de la decisión"""
+        if len(self.etiquetas) < self.min_ejemplos:
+            return {'modo': 'completo', 'razon': 'historial_insuficiente', 'ejemplos': len(self.etiquetas)}
+        vector = self.vector(embeddings, stats)
+        if vector is None:
+            return {'modo': 'completo', 'razon': 'sin_embedding'}
+
+        distribucion = self.predecir(vector)
+        prob_alto = float(distribucion[2] + distribucion[3])
+        decision = {
+            'prob_riesgo_alto_o_critico': round(prob_alto, 4),
+            'nivel_riesgo_estimado': NIVELES_RIESGO[int(np.argmax(distribucion))],
+            'k': min(self.k, len(self.etiquetas))
+        }
+        if prob_alto >= self.umbral_riesgo:
+            decision.update({'modo': 'completo', 'razon': 'riesgo_estimado'})
+        elif random.random() < self.exploracion:
+            decision.update({'modo': 'completo', 'razon': 'exploracion'})
+        else:
+            decision.update({'modo': 'reducido', 'razon': 'riesgo_bajo_estimado'})
+        return decision
+
+    # --- Persistencia ---
+
+    def guardar(self, path):
+        features = np.stack(self.features).astype(np.float16) if self.features else np.zeros((0, 0), dtype=np.float16)
+        with open(path, 'wb') as f:
+            np.savez(f, features=features, etiquetas=np.array(self.etiquetas, dtype=np.int8))
+
+    @classmethod
+    def cargar(cls, path):
+        modelo = cls()
+        with np.load(path, allow_pickle=False) as datos:
+            modelo.features = [fila.astype(np.float32) for fila in datos['features']]
+            modelo.etiquetas = [int(e) for e in datos['etiquetas']]
+        return modelo
@@ -0,0 +1,5 @@
+"""Punto de entrada WSGI de la API para producción: gunicorn -c src/gunicorn.conf.py wsgi:app"""
+from api import app, arranque
+
+# Se importa una vez por worker (sin preload_app): cada worker precarga y loguea su tiempo de arranque
+arranque()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+import ftplib
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+os.environ.setdefault('GEMINI_API_KEY', 'test')
+
+from analyzer import BatchAnalyzer, EstadoNoDisponible
+from aggregate_stats import AggregateStats
+import serializacion
+
+
+class BatchSinHostinger(BatchAnalyzer):
+    """BatchAnalyzer con las descargas reemplazadas: `archivos` (ruta remota -> bytes o excepción)"""
+
+    def __init__(self, archivos=None, pendientes=()):
+        super().__init__()
+        self.usar_manifest = False
+        self.archivos = dict(archivos or {})
+        self.pendientes = list(pendientes)
+        self.descargados = []
+        self.subidos = []
+
+    def descubrir_pendientes(self):
+        return list(self.pendientes)
+
+    def download_from_hostinger(self, remote_path):
+        self.descargados.append(remote_path)
+        contenido = self.archivos.get(remote_path, ftplib.error_perm(f'550 {remote_path}: No such file'))
+        if isinstance(contenido, Exception):
+            raise contenido
+        local_path = os.path.join(tempfile.gettempdir(), Path(remote_path).name)
+        with open(local_path, 'wb') as f:
+            f.write(contenido)
+        return local_path
+
+    def upload_to_hostinger(self, local_filepath, target_dir):
+        self.subidos.append(f'{target_dir}/{Path(local_filepath).name}')
+
+
+def test_estado_inexistente_crea_uno_vacio():
+    batch = BatchSinHostinger()
+    estado = batch.cargar_estado(BatchAnalyzer.AGREGADOS, AggregateStats.cargar, AggregateStats)
+    assert isinstance(estado, AggregateStats) and estado.total_medidas == 0
+
+
+@pytest.mark.parametrize('error', [
+    EOFError('conexión cerrada'),
+    TimeoutError('timed out'),
+    ftplib.error_temp('421 Too many connections'),
+    ftplib.error_perm('530 Login incorrect'),
+])
+def test_fallo_de_ftp_no_se_confunde_con_estado_inexistente(error):
+    batch = BatchSinHostinger({f'estado/{BatchAnalyzer.AGREGADOS}': error})
+    with pytest.raises(EstadoNoDisponible):
+        batch.cargar_estado(BatchAnalyzer.AGREGADOS, AggregateStats.cargar, AggregateStats)
+
+
+def test_estado_ilegible_no_se_reemplaza_por_uno_vacio():
+    batch = BatchSinHostinger({f'estado/{BatchAnalyzer.AGREGADOS}': b'{"version": 1, "claves": '})
+    with pytest.raises(EstadoNoDisponible):
+        batch.cargar_estado(BatchAnalyzer.AGREGADOS, AggregateStats.cargar, AggregateStats)
+
+
+def test_batch_abortado_no_analiza_ni_sube_estado():
+    batch = BatchSinHostinger({f'estado/{BatchAnalyzer.INDICE_BUSQUEDA}': TimeoutError('timed out')},
+                              pendientes=['medida_1_20240102.json'])
+    resultado = batch.analyze_all_measures_in_directory()
+    assert resultado['total_analizadas'] == 0 and resultado['total_errores'] == 1
+    assert not any(ruta.startswith('raw/') for ruta in batch.descargados)
+    assert batch.subidos == []
+
+
+class BatchConCorte(BatchSinHostinger):
+    """Análisis sin Gemini ni encoder; la corrida se corta (KeyboardInterrupt) al llegar a `corte`"""
+
+    def __init__(self, pendientes, corte=None):
+        archivos = {f'raw/{f}': serializacion.dumps(_medida(f)) for f in pendientes}
+        super().__init__(archivos, pendientes)
+        self.corte = corte
+        self.eventos = []
+
+    def analizar_con_triage(self, medida_data):
+        if medida_data['numero_medida'] == self.corte:
+            raise KeyboardInterrupt
+        return {'numero_medida': medida_data['numero_medida'], 'fecha_boletin': medida_data['fecha_boletin'],
+                'analisis_literal': {}, 'analisis_semantico': {'categoria_emergente': 'prueba'},
+                'analisis_abogado_diablo': {}, 'embeddings': {},
+                'metadatos_analisis': {'modo_analisis': 'completo'}}
+
+    def guardar_estado(self, nombre, guardador):
+        self.eventos.append(('estado', nombre, self.agregados.total_medidas))
+        return super().guardar_estado(nombre, guardador)
+
+    def registrar_en_manifest(self, filename, estado, **extra):
+        self.eventos.append(('manifest', filename, estado))
+
+
+def _medida(filename):
+    numero = int(filename.split('_')[1])
+    return {'numero_medida': numero, 'fecha_boletin': '2024-01-02', 'titulo_raw': f'Resolución {numero}/2024',
+            'texto_completo_limpio': f'Texto de la resolución número {numero} con contenido distinto {numero * 7}.',
+            'url': f'https://example.org/{numero}'}
+
+
+def test_corte_a_mitad_de_batch_no_marca_analizadas_sin_estado(monkeypatch, tmp_path):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    monkeypatch.setenv('BORA_ESTADO_CADA', '2')
+    pendientes = [f'medida_{n}_20240102.json' for n in (1, 2, 3, 4)]
+    batch = BatchConCorte(pendientes, corte=4)
+    batch.usar_manifest = True
+
+    with pytest.raises(KeyboardInterrupt):
+        batch.analyze_all_measures_in_directory()
+
+    registradas = [e[1] for e in batch.eventos if e[0] == 'manifest' and e[2] == 'analizada']
+    assert registradas == pendientes[:3]
+    # Cada medida se marca 'analizada' recién después de un guardado de agregados que ya la cuenta
+    for filename in registradas:
+        posicion = batch.eventos.index(('manifest', filename, 'analizada'))
+        guardados = [e[2] for e in batch.eventos[:posicion] if e[:2] == ('estado', BatchAnalyzer.AGREGADOS)]
+        assert guardados and guardados[-1] >= pendientes.index(filename) + 1
+    assert f'data/estado/{BatchAnalyzer.INDICE_BUSQUEDA}' in batch.subidos
+
+
+def test_estado_sin_subir_deja_las_medidas_pendientes(monkeypatch, tmp_path):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    pendientes = [f'medida_{n}_20240102.json' for n in (1, 2)]
+    batch = BatchConCorte(pendientes)
+    batch.usar_manifest = True
+
+    def subir(local_filepath, target_dir):
+        if target_dir == 'data/estado':
+            raise EOFError('conexión cerrada')
+    batch.upload_to_hostinger = subir
+
+    resultado = batch.analyze_all_measures_in_directory()
+    assert resultado['total_analizadas'] == 2
+    assert not [e for e in batch.eventos if e[0] == 'manifest' and e[2] == 'analizada']
+
+
+def _analisis(medida, categoria, riesgo):
+    return {'numero_medida': medida['numero_medida'], 'fecha_boletin': medida['fecha_boletin'],
+            'analisis_literal': {'elementos_detectados_ia': {'entidades_mencionadas': ['MINISTERIO DE SALUD']}},
+            'analisis_critico': {}, 'analisis_semantico': {'categoria_emergente': categoria},
+            'analisis_abogado_diablo': {'nivel_riesgo_democratico': riesgo}, 'embeddings': {},
+            'metadatos_analisis': {'modo_analisis': 'completo'}}
+
+
+def test_reanalisis_reemplaza_el_aporte_en_los_estados(monkeypatch, tmp_path):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    filename = 'medida_1_20240102.json'
+    medida = _medida(filename)
+    anterior = _analisis(medida, 'designaciones', 'bajo')
+    agregados = AggregateStats()
+    agregados.agregar_analisis(anterior)
+    batch = BatchConCorte([filename])
+    batch.usar_manifest = True
+    batch.archivos[f'estado/{BatchAnalyzer.AGREGADOS}'] = serializacion.dumps(agregados.to_dict())
+    batch.archivos['analyzed/medida_1_20240102_analysis_agnostic.json'] = serializacion.dumps(anterior)
+    batch.analyzer.analyze_medida = lambda medida_data, modo='completo': _analisis(medida_data, 'contrataciones', 'alto')
+
+    batch.reanalizar_medida('medida_1_20240102')
+
+    assert batch.agregados.total_medidas == 1
+    assert batch.agregados.categorias_emergentes == {'contrataciones': 1}
+    assert batch.agregados.niveles_riesgo['alto'] == 1 and batch.agregados.niveles_riesgo['bajo'] == 0
+    assert batch.agregados.organismos == {'MINISTERIO DE SALUD': 1}
+    assert batch.rollups.aportes['medida_1_20240102']
+    assert ('manifest', filename, 'analizada') in batch.eventos
+    assert 'data/analyzed/medida_1_20240102_analysis_agnostic.json' in batch.subidos
+    assert f'data/estado/{BatchAnalyzer.INDICE_ENTIDADES}' in batch.subidos
+
+
+def test_casi_duplicado_no_hereda_entidades_ausentes_del_texto(monkeypatch, tmp_path):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    from test_near_duplicates import ORIGEN, NUEVO
+    pendientes = ['medida_1_20240102.json', 'medida_2_20240103.json']
+    batch = BatchConCorte(pendientes)
+    for filename, texto in zip(pendientes, (ORIGEN, NUEVO)):
+        medida = dict(_medida(filename), texto_completo_limpio=texto, contenido_html_completo='<html>' * 1000)
+        batch.archivos[f'raw/{filename}'] = serializacion.dumps(medida)
+
+    def analizar(medida_data):
+        analisis = _analisis(medida_data, 'designaciones', 'bajo')
+        analisis['analisis_literal']['elementos_detectados_ia'] = {
+            'entidades_mencionadas': ['MINISTERIO DE SALUD', 'Juan Carlos PÉREZ'],
+            'referencias_normativas': ['Decreto 50/2019']}
+        return analisis
+    batch.analizar_con_triage = analizar
+    batch.analyzer.generate_embeddings_agnostic = lambda medida_data: {}
+
+    resultado = batch.analyze_all_measures_in_directory()
+
+    assert resultado['total_reutilizadas_por_duplicado'] == 1
+    reutilizado = batch.analisis_por_archivo['medida_2_20240103']
+    assert reutilizado['analisis_literal']['elementos_detectados_ia']['entidades_mencionadas'] == ['MINISTERIO DE SALUD']
+    duplicado = reutilizado['metadatos_analisis']['duplicado_de']
+    assert duplicado['elementos_ia_descartados'] == 1 and duplicado['diferencias_texto']
+    medidas = batch.indice_entidades.medidas('entidad', 'Juan Carlos PÉREZ')['medidas']
+    assert [m['clave'] for m in medidas] == ['medida_1_20240102']
+    assert len(batch.indice_entidades.medidas('entidad', 'MINISTERIO DE SALUD')['medidas']) == 2
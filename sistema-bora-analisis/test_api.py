@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+os.environ.setdefault('BORA_API_CACHE_DIR', tempfile.mkdtemp(prefix='bora_api_test_'))
+
+import api
+
+
+def test_limit_de_medidas_acotado_en_la_clave_de_cache(monkeypatch):
+    listados = []
+    monkeypatch.setattr(api, 'list_hostinger_files', lambda directorio: listados.append(directorio) or [])
+    cliente = api.app.test_client()
+    for limit in ('100000', '501', '999999999'):
+        assert cliente.get(f'/api/medidas?limit={limit}').status_code == 200
+    assert os.path.exists(os.path.join(api.CACHE_DIR, 'respuestas', 'medidas_500.json'))
+    assert not [f for f in os.listdir(os.path.join(api.CACHE_DIR, 'respuestas'))
+                if f.startswith('medidas_') and f != 'medidas_500.json']
+    assert len(listados) == 1
+
+
+def test_limit_invalido(monkeypatch):
+    assert api.app.test_client().get('/api/medidas?limit=muchas').status_code == 400
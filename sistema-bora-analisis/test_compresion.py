@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import serializacion
+from compresion import Descompresor, comprimir, descomprimir, detectar_formato, leer_para_subir, zstandard
+
+FORMATOS = ['none', 'gzip'] + (['zstd'] if zstandard is not None else [])
+MEDIDA = {'numero_medida': 300720, 'texto_completo_limpio': 'Desígnase al titular de la Dirección. ' * 200}
+
+
+def _por_bloques(datos, tamanio):
+    salida = []
+    descompresor = Descompresor(salida.append)
+    for i in range(0, len(datos), tamanio):
+        descompresor(datos[i:i + tamanio])
+    descompresor.cerrar()
+    return b''.join(salida)
+
+
+@pytest.mark.parametrize('formato', FORMATOS)
+@pytest.mark.parametrize('tamanio', [1, 3, 8192])
+def test_descompresor_en_bloques(formato, tamanio):
+    original = serializacion.dumps(MEDIDA)
+    assert _por_bloques(comprimir(original, formato), tamanio) == original
+
+
+def test_archivos_chicos_y_vacios_pasan_tal_cual():
+    assert _por_bloques(b'{}', 8192) == b'{}'
+    assert _por_bloques(b'', 8192) == b''
+
+
+@pytest.mark.parametrize('formato', FORMATOS)
+def test_conviven_archivos_viejos_planos_y_nuevos_comprimidos(tmp_path, formato, monkeypatch):
+    monkeypatch.setenv('BORA_COMPRESION', formato)
+    viejo = tmp_path / 'viejo.json'
+    serializacion.guardar(MEDIDA, str(viejo))
+    nuevo = tmp_path / 'nuevo.json'
+    nuevo.write_bytes(leer_para_subir(str(viejo)))
+    assert detectar_formato(nuevo.read_bytes()) == formato
+    assert serializacion.cargar(str(viejo)) == serializacion.cargar(str(nuevo)) == MEDIDA
+    # Lo ya comprimido no se vuelve a comprimir
+    assert leer_para_subir(str(nuevo)) == nuevo.read_bytes()
+
+
+def test_reportes_y_exportaciones_se_suben_planos(tmp_path, monkeypatch):
+    monkeypatch.setenv('BORA_COMPRESION', 'gzip')
+    csv = tmp_path / 'tipos_desde_h2.csv'
+    csv.write_bytes(b'Tipo,Cantidad\nResolucion,10\n')
+    assert leer_para_subir(str(csv)) == csv.read_bytes()
+    jsonl = tmp_path / 'exportacion_1.jsonl'
+    jsonl.write_bytes(b'{"clave":"medida_1"}\n')
+    assert leer_para_subir(str(jsonl), formato='none') == jsonl.read_bytes()
+
+
+def test_descomprimir_sin_compresion_devuelve_los_mismos_bytes():
+    assert descomprimir(b'{"a":1}') == b'{"a":1}'
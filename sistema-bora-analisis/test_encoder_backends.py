@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from encoder_backends import crear_encoder, modelo_exportado, MODELO_DEFAULT
+
+pytest.importorskip('onnxruntime')
+pytest.importorskip('tokenizers')
+
+
+def test_onnx_rechaza_un_modelo_distinto_al_exportado(tmp_path):
+    # Exportación previa a MODELO: se asume el modelo default
+    assert modelo_exportado(str(tmp_path)) == MODELO_DEFAULT
+    with pytest.raises(ValueError, match='otro-modelo'):
+        crear_encoder('onnx', 'otro-modelo', directorio=str(tmp_path))
+
+
+def test_onnx_usa_el_modelo_registrado_en_la_exportacion(tmp_path):
+    (tmp_path / 'MODELO').write_text('otro-modelo\n', encoding='utf-8')
+    assert modelo_exportado(str(tmp_path)) == 'otro-modelo'
+    with pytest.raises(ValueError, match=MODELO_DEFAULT):
+        crear_encoder('onnx', directorio=str(tmp_path))
+
+
+def test_backend_desconocido():
+    with pytest.raises(ValueError):
+        crear_encoder('tensorflow')
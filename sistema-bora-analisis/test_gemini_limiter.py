@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import gemini_limiter
+from gemini_limiter import GeminiRateLimiter, GeminiReintentosAgotados
+
+
+class Reloj:
+    """Reemplaza al módulo time del limitador: sleep avanza el reloj en lugar de dormir"""
+
+    def __init__(self):
+        self.ahora = 1_000_000.0
+        self.esperas = []
+
+    def time(self):
+        return self.ahora
+
+    monotonic = time
+
+    def sleep(self, segundos):
+        self.esperas.append(segundos)
+        self.ahora += segundos
+
+
+class ErrorGemini(Exception):
+    def __init__(self, code, mensaje=''):
+        super().__init__(mensaje or f'{code} error')
+        self.code = code
+
+
+class Modelo:
+    """Devuelve las respuestas (o lanza los errores) en orden"""
+
+    def __init__(self, *resultados):
+        self.resultados = list(resultados)
+        self.llamadas = 0
+
+    def generate_content(self, prompt, **kwargs):
+        self.llamadas += 1
+        resultado = self.resultados.pop(0) if self.resultados else Respuesta()
+        if isinstance(resultado, Exception):
+            raise resultado
+        return resultado
+
+
+class Respuesta:
+    def __init__(self, total_tokens=None):
+        self.usage_metadata = type('Uso', (), {'total_token_count': total_tokens})()
+
+
+@pytest.fixture
+def reloj(monkeypatch, tmp_path):
+    reloj = Reloj()
+    monkeypatch.setattr(gemini_limiter, 'time', reloj)
+    monkeypatch.setattr(gemini_limiter.random, 'uniform', lambda a, b: b)
+    monkeypatch.setenv('GEMINI_LIMITE_DB', str(tmp_path / 'limite.sqlite'))
+    return reloj
+
+
+def test_dos_procesos_comparten_el_saldo_de_requests(reloj):
+    uno = GeminiRateLimiter(rpm=2, tpm=10 ** 9)
+    otro = GeminiRateLimiter(rpm=2, tpm=10 ** 9)
+    uno.generate_content(Modelo(), 'a')
+    uno.generate_content(Modelo(), 'b')
+    assert reloj.esperas == []
+
+    # El balde es uno solo: el otro limitador espera la recarga de un request (2 por minuto)
+    otro.generate_content(Modelo(), 'c')
+    assert sum(reloj.esperas) == pytest.approx(30.0)
+    assert otro.estadisticas()['segundos_espera_limite'] == pytest.approx(30.0)
+    assert otro.estadisticas()['limites']['compartido_entre_procesos'] is True
+
+
+def test_sin_estado_compartido_cada_limitador_tiene_su_balde(reloj):
+    uno = GeminiRateLimiter(rpm=1, tpm=10 ** 9, compartido=False)
+    otro = GeminiRateLimiter(rpm=1, tpm=10 ** 9, compartido=False)
+    uno.generate_content(Modelo(), 'a')
+    otro.generate_content(Modelo(), 'b')
+    assert reloj.esperas == []
+
+
+def test_429_pausa_tambien_a_los_otros_procesos(reloj):
+    limitador = GeminiRateLimiter(rpm=60, tpm=10 ** 9, backoff_base=4)
+    otro = GeminiRateLimiter(rpm=60, tpm=10 ** 9)
+    modelo = Modelo(ErrorGemini(429, 'Resource has been exhausted (quota)'), Respuesta())
+    inicio = reloj.ahora
+
+    limitador.generate_content(modelo, 'a')
+    assert modelo.llamadas == 2
+    assert limitador.estadisticas()['reintentos'] == 1
+    assert otro._pausa_global() == pytest.approx(inicio + 4)
+    assert reloj.ahora >= inicio + 4
+
+
+def test_backoff_exponencial_hasta_agotar_los_reintentos(reloj):
+    limitador = GeminiRateLimiter(rpm=10 ** 6, tpm=10 ** 9, max_reintentos=3, backoff_base=2, backoff_max=5,
+                                  compartido=False)
+    modelo = Modelo(*[ErrorGemini(503)] * 4)
+    with pytest.raises(GeminiReintentosAgotados):
+        limitador.generate_content(modelo, 'a')
+    assert modelo.llamadas == 4
+    assert reloj.esperas == [2, 4, 5]
+    stats = limitador.estadisticas()
+    assert stats['reintentos_agotados'] == 1 and stats['errores_transitorios'] == 4
+
+
+def test_error_no_transitorio_no_se_reintenta(reloj):
+    limitador = GeminiRateLimiter(compartido=False)
+    modelo = Modelo(ErrorGemini(400, 'API key not valid'))
+    with pytest.raises(ErrorGemini):
+        limitador.generate_content(modelo, 'a')
+    assert modelo.llamadas == 1 and limitador.estadisticas()['reintentos'] == 0
+
+
+def test_tokens_reales_corrigen_la_estimacion(reloj):
+    limitador = GeminiRateLimiter(rpm=10 ** 6, tpm=6000)
+    estimados = limitador.estimar_tokens('x' * 400)
+    limitador.generate_content(Modelo(Respuesta(total_tokens=5000)), 'x' * 400)
+    assert limitador.estadisticas()['tokens_reales'] == 5000
+    # Se descontaron 5000 (no la estimación): pedir 2000 más obliga a esperar la recarga de 1000
+    limitador.bucket_tokens.consumir(2000)
+    assert estimados < 5000 and sum(reloj.esperas) == pytest.approx(10.0)
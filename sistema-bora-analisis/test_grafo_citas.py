@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from grafo_citas import GrafoCitas, identificador_medida, relaciones_dispositivas
+
+
+def _medida(titulo, texto, fecha='2024-01-02', numeros_referencia=()):
+    return {'titulo_raw': titulo, 'texto_completo_limpio': texto, 'fecha_boletin': fecha,
+            'metadatos_extraidos': {'numeros_referencia': list(numeros_referencia)}}
+
+
+MODIFICATORIA = _medida(
+    'Decreto 100/2024', 'VISTO el Decreto N° 50/19 y la Ley N° 27.541, CONSIDERANDO: Que corresponde adecuar '
+    'el régimen. Por ello, EL PRESIDENTE DECRETA: ARTICULO 1°.- Sustitúyese el artículo 2° del Decreto N° 50/19 '
+    'y sus modificatorias. ARTICULO 2°.- Derógase la Resolución N° 8/2020. ARTICULO 3°.- Comuníquese.')
+CITANTE = _medida('Resolución 5/2024', 'VISTO el Decreto 100/2024, EL MINISTRO RESUELVE: ARTICULO 1°.- Apruébase '
+                  'el procedimiento previsto en el Decreto 100/2024.', fecha='2024-02-01', numeros_referencia=['7/2023'])
+
+
+@pytest.fixture
+def grafo():
+    grafo = GrafoCitas()
+    grafo.agregar_medida('medida_1_20240102', MODIFICATORIA)
+    grafo.agregar_medida('medida_2_20240201', CITANTE)
+    return grafo
+
+
+def test_relaciones_de_la_parte_dispositiva():
+    relaciones = relaciones_dispositivas('ARTICULO 1°.- Sustitúyese el artículo 2° del Decreto N° 50/19 y sus '
+                                         'modificatorias. ARTICULO 2°.- Prorrógase la Ley 27.541. Visto el Decreto 1/2020.')
+    assert relaciones == {'decreto 50/2019': 'modifica', 'ley 27541': 'prorroga'}
+
+
+def test_identificador_por_titulo_o_por_clave():
+    assert identificador_medida('medida_1_20240102', MODIFICATORIA) == 'decreto 100/2024'
+    assert identificador_medida('medida_9_20240102', _medida('Aviso oficial', '')) == 'medida medida_9_20240102'
+
+
+def test_salientes_distingue_cita_de_modificacion(grafo):
+    salientes = grafo.recorrer('Decreto 100/2024', direccion='salientes')
+    relaciones = {r['norma']: r['relacion'] for r in salientes['resultados']}
+    # "y sus modificatorias" no convierte la cita del VISTO en una modificación de la ley
+    assert relaciones == {'decreto 50/2019': 'modifica', 'ley 27541': 'cita', 'resolucion 8/2020': 'deroga'}
+    assert salientes['norma']['clave'] == 'medida_1_20240102'
+
+    modificaciones = grafo.recorrer('decreto 100/2024', direccion='salientes', relaciones=('modifica',))
+    assert [r['norma'] for r in modificaciones['resultados']] == ['decreto 50/2019']
+
+
+def test_entrantes_con_profundidad(grafo):
+    directo = grafo.recorrer('Decreto N° 50/19')
+    assert [r['norma'] for r in directo['resultados']] == ['decreto 100/2024']
+
+    dos_niveles = grafo.recorrer('Decreto N° 50/19', profundidad=2)
+    assert [(r['norma'], r['profundidad'], r['via']) for r in dos_niveles['resultados']] == [
+        ('decreto 100/2024', 1, 'decreto 50/2019'), ('resolucion 5/2024', 2, 'decreto 100/2024')]
+    assert grafo.recorrer('Decreto N° 50/19', profundidad=2, limite=1)['truncado'] is True
+    assert grafo.recorrer('Ley 99999') is None
+
+
+def test_numeros_sin_tipo_solo_si_no_hay_cita_tipada(grafo):
+    salientes = grafo.recorrer('Resolución 5/2024', direccion='salientes')
+    assert {r['norma'] for r in salientes['resultados']} == {'decreto 100/2024', 'norma 7/2023'}
+
+
+def test_reagregar_una_medida_reemplaza_sus_aristas(grafo):
+    grafo.agregar_medida('medida_1_20240102', _medida('Decreto 100/2024', 'VISTO la Ley 27.541.'))
+    assert grafo.recorrer('decreto 50/2019')['total'] == 0
+    assert grafo.resumen()['aristas_por_relacion'] == {'cita': 3, 'modifica': 0, 'deroga': 0, 'prorroga': 0}
+
+
+def test_misma_norma_en_dos_medidas_une_sus_aristas(grafo):
+    # Otra "Resolución 5/2024" (de otro organismo): el nodo es uno solo y acumula las citas de ambas
+    grafo.agregar_medida('medida_3_20240301', _medida('Resolución 5/2024', 'VISTO la Ley 27.541.', fecha='2024-03-01'))
+    salientes = grafo.recorrer('resolucion 5/2024', direccion='salientes')
+    assert {r['norma'] for r in salientes['resultados']} == {'decreto 100/2024', 'norma 7/2023', 'ley 27541'}
+    assert salientes['norma']['clave'] == 'medida_3_20240301'
+
+
+def test_guardar_y_cargar_permite_seguir_reemplazando(grafo, tmp_path):
+    grafo.guardar(str(tmp_path / 'grafo.npz'))
+    cargado = GrafoCitas.cargar(str(tmp_path / 'grafo.npz'))
+    assert cargado.resumen() == grafo.resumen()
+    assert cargado.recorrer('decreto 50/2019', profundidad=2) == grafo.recorrer('decreto 50/2019', profundidad=2)
+
+    cargado.agregar_medida('medida_1_20240102', _medida('Decreto 100/2024', 'VISTO la Ley 27.541.'))
+    assert cargado.recorrer('decreto 50/2019')['total'] == 0
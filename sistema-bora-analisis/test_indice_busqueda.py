@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from indice_busqueda import IndiceBusqueda
+
+
+def _medida(numero, texto):
+    return {'numero_medida': numero, 'fecha_boletin': '2024-01-02', 'titulo_raw': f'Resolución {numero}/2024',
+            'texto_completo_limpio': texto, 'url': f'https://example.org/{numero}'}
+
+
+def _claves(indice, consulta):
+    return [r['clave'] for r in IndiceBusqueda.buscar(indice.conn, consulta)['resultados']]
+
+
+def test_reindexar_ultima_medida_no_deja_texto_viejo():
+    """Re-indexar la medida con el rowid más alto: el texto viejo ya no tiene que encontrarse"""
+    with tempfile.TemporaryDirectory() as directorio:
+        indice = IndiceBusqueda(os.path.join(directorio, 'busqueda.sqlite'))
+        indice.agregar('medida_1', _medida(1, 'Otorgase una licencia al agente.'))
+        indice.agregar('medida_2', _medida(2, 'Dispónese la designacion transitoria del director.'))
+        assert _claves(indice, 'designacion') == ['medida_2']
+
+        assert indice.agregar('medida_2', _medida(2, 'Dispónese la prorroga del plazo.'))
+        assert _claves(indice, 'designacion') == []
+        assert _claves(indice, 'prorroga') == ['medida_2']
+        assert indice.total_medidas() == 2
+
+        # Y de nuevo, para que un rowid re-asignado tampoco arrastre postings de la versión anterior
+        assert indice.agregar('medida_2', _medida(2, 'Dispónese la designacion del director.'))
+        assert _claves(indice, 'prorroga') == []
+        assert _claves(indice, 'designacion') == ['medida_2']
+        indice.cerrar()
+
+
+if __name__ == '__main__':
+    test_reindexar_ultima_medida_no_deja_texto_viejo()
+    print("✓ Re-indexado del índice de búsqueda OK")
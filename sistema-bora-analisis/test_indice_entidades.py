@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from indice_entidades import IndiceEntidades, normalizar_nombre, normalizar_referencia
+
+
+def _analisis(numero, fecha, entidades=(), referencias=(), autoridades=()):
+    return {'numero_medida': numero, 'fecha_boletin': fecha,
+            'analisis_literal': {'elementos_detectados_ia': {
+                'entidades_mencionadas': list(entidades),
+                'referencias_normativas': list(referencias),
+                'autoridades_involucradas': list(autoridades)}}}
+
+
+@pytest.fixture
+def indice():
+    indice = IndiceEntidades()
+    indice.agregar_analisis('medida_1_20240102', _analisis(1, '2024-01-02', ['MINISTERIO DE ECONOMÍA'], ['Decreto N° 50/19']))
+    indice.agregar_analisis('medida_2_20240215', _analisis(2, '2024-02-15', ['Ministerio de Economia', 'ANSES'],
+                                                           ['Ley 27.541'], [{'nombre': 'Luis Caputo', 'rol': 'Ministro'}]))
+    indice.agregar_analisis('medida_3_20240301', _analisis(3, '2024-03-01', ['ANSES'], ['DECRETO 50/2019']))
+    return indice
+
+
+@pytest.mark.parametrize('valor,esperado', [
+    ('Decreto N° 50/19', 'decreto 50/2019'),
+    ('DNU 70/2023', 'decreto 70/2023'),
+    ('Ley 27.541', 'ley 27541'),
+    ('Resolución Conjunta 3/2024', 'resolucion_conjunta 3/2024'),
+    ('Decisión Administrativa Nº 12/98', 'decision_administrativa 12/1998'),
+    ('el régimen de teletrabajo', 'el regimen de teletrabajo'),
+])
+def test_normalizar_referencia(valor, esperado):
+    assert normalizar_referencia(valor) == esperado
+
+
+def test_normalizar_nombre_acepta_objetos_de_gemini():
+    assert normalizar_nombre({'nombre': 'Ministerio de Economía', 'rol': 'emisor'}) == 'ministerio de economia'
+    assert normalizar_nombre(None) == ''
+
+
+def test_mismas_entidades_con_distinta_escritura_comparten_termino(indice):
+    resultado = indice.medidas('entidad', 'ministerio de economia')
+    assert resultado['termino'] == 'MINISTERIO DE ECONOMÍA' and resultado['total'] == 2
+    # Más recientes primero
+    assert [m['clave'] for m in resultado['medidas']] == ['medida_2_20240215', 'medida_1_20240102']
+    assert [m['clave'] for m in indice.medidas('referencia', 'Decreto 50/2019')['medidas']] == [
+        'medida_3_20240301', 'medida_1_20240102']
+    assert indice.medidas('autoridad', 'LUIS CAPUTO')['total'] == 1
+    assert indice.medidas('entidad', 'inexistente') is None
+
+
+def test_filtros_de_fecha_y_paginas(indice):
+    assert [m['numero_medida'] for m in indice.medidas('entidad', 'ANSES', desde='2024-03-01')['medidas']] == [3]
+    assert [m['numero_medida'] for m in indice.medidas('entidad', 'ANSES', hasta='2024-02-28')['medidas']] == [2]
+    segunda = indice.medidas('referencia', 'decreto 50/2019', limite=1, pagina=2)
+    assert segunda['total'] == 2 and [m['numero_medida'] for m in segunda['medidas']] == [1]
+
+
+def test_reindexar_reemplaza_los_terminos_de_la_medida(indice):
+    indice.agregar_analisis('medida_2_20240215', _analisis(2, '2024-02-15', ['ANSES']))
+    assert indice.medidas('entidad', 'ministerio de economia')['total'] == 1
+    assert indice.medidas('entidad', 'ANSES')['total'] == 2
+    assert indice.resumen()['medidas_indexadas'] == 3
+    frecuentes = indice.terminos_frecuentes('entidad')
+    assert frecuentes[0] == {'tipo': 'entidad', 'termino': 'ANSES', 'medidas': 2}
+
+
+def test_terminos_frecuentes_por_prefijo(indice):
+    assert indice.terminos_frecuentes('referencia', prefijo='Decreto') == [
+        {'tipo': 'referencia', 'termino': 'Decreto N° 50/19', 'medidas': 2}]
+
+
+def test_guardar_y_cargar(indice, tmp_path):
+    indice.agregar_analisis('medida_2_20240215', _analisis(2, '2024-02-15', ['ANSES']))
+    indice.guardar(str(tmp_path / 'indice.npz'))
+    cargado = IndiceEntidades.cargar(str(tmp_path / 'indice.npz'))
+
+    for tipo, termino in [('entidad', 'ANSES'), ('entidad', 'ministerio de economia'), ('referencia', 'ley 27541')]:
+        assert cargado.medidas(tipo, termino) == indice.medidas(tipo, termino)
+    assert cargado.resumen() == indice.resumen()
+    # Se puede seguir indexando sobre el índice cargado
+    cargado.agregar_analisis('medida_4_20240402', _analisis(4, '2024-04-02', ['ANSES']))
+    assert cargado.medidas('entidad', 'ANSES')['medidas'][0]['fecha_boletin'] == '2024-04-02'
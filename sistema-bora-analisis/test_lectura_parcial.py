@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+import os
+import sys
+from pathlib import Path
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import serializacion
+from benchmark_pipeline import LocalFTP
+from lectura_parcial import CAMPOS_METADATOS, leer_campos, leer_campos_ftp
+
+
+def _medida():
+    return {'numero_medida': 300720, 'fecha_boletin': '2023-12-11', 'titulo_raw': 'Resolución 1/2023',
+            'tiene_pdf': True, 'texto_completo_limpio': 'Artículo 1°.- Desígnase...',
+            'contenido_html_completo': {'titulo': '<h2>Resolución 1/2023</h2>', 'cuerpo': '<p>' + 'x' * 200000 + '</p>'}}
+
+
+def test_leer_campos_corta_en_los_pedidos(tmp_path):
+    path = tmp_path / 'medida.json'
+    serializacion.guardar(_medida(), str(path))
+    datos = leer_campos(str(path), CAMPOS_METADATOS)
+    assert datos == {'numero_medida': 300720, 'fecha_boletin': '2023-12-11', 'titulo_raw': 'Resolución 1/2023',
+                     'tiene_pdf': True, 'contenido_html_completo.titulo': '<h2>Resolución 1/2023</h2>'}
+
+
+def test_leer_campos_ftp_sobre_local_ftp(tmp_path):
+    """El doble de FTP del benchmark tiene que soportar la lectura en streaming del censo"""
+    os.makedirs(tmp_path / 'data' / 'raw')
+    serializacion.guardar(_medida(), str(tmp_path / 'data' / 'raw' / 'medida_300720_20231211.json'))
+    LocalFTP.raiz = str(tmp_path)
+    ftp = LocalFTP()
+    ftp.cwd('data/raw')
+    datos = leer_campos_ftp(ftp, 'medida_300720_20231211.json', CAMPOS_METADATOS)
+    assert datos['contenido_html_completo.titulo'] == '<h2>Resolución 1/2023</h2>'
+    # La conexión sigue usable después de cortar una transferencia a mitad
+    assert leer_campos_ftp(ftp, 'medida_300720_20231211.json', ['numero_medida']) == {'numero_medida': 300720}
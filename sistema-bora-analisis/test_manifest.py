@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import serializacion
+from benchmark_pipeline import LocalFTP
+from manifest import WorkManifest
+
+
+class FTPRegistrado(LocalFTP):
+    leidos = []
+
+    def retrbinary(self, cmd, callback, blocksize=8192, rest=None):
+        FTPRegistrado.leidos.append(cmd.split(' ', 1)[1])
+        return super().retrbinary(cmd, callback, blocksize, rest)
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    FTPRegistrado.raiz = str(tmp_path)
+    FTPRegistrado.leidos = []
+    return WorkManifest(FTPRegistrado)
+
+
+def _evento(archivo, estado):
+    return {'archivo': archivo, 'estado': estado}
+
+
+A, B, C = 'medida_1_20240102.json', 'medida_2_20240215.json', 'medida_3_20240216.json'
+
+
+def test_recibida_tardia_no_vuelve_a_pendiente(manifest):
+    manifest.registrar_varios([_evento(A, 'recibida'), _evento(B, 'recibida'), _evento(A, 'analizada'),
+                               _evento(A, 'recibida'), _evento(A, 'analizada'), _evento(B, 'recibida')])
+    estado = manifest.leer_estado()
+    assert estado['totales'] == {'recibida': 2, 'analizada': 1, 'error': 0}
+    assert manifest.pendientes() == [B]
+
+    assert manifest.compactar() == 6
+    manifest.registrar(A, 'recibida')
+    assert manifest.pendientes() == [B]
+    manifest.compactar()
+    assert manifest.leer_estado()['totales'] == {'recibida': 2, 'analizada': 1, 'error': 0}
+
+
+def test_snapshot_no_guarda_las_analizadas_y_stats_no_las_lee(manifest, tmp_path):
+    manifest.reconstruir([A, B, C], ['medida_1_20240102_analysis_agnostic.json',
+                                     'medida_2_20240215_analysis_agnostic.json'])
+    snapshot = serializacion.cargar(str(tmp_path / 'data' / 'manifest' / 'snapshot.json'))
+    assert 'analizadas' not in snapshot and list(snapshot['pendientes']) == [C]
+    assert sorted(os.listdir(tmp_path / 'data' / 'manifest' / 'analizadas')) == ['202401.txt', '202402.txt']
+
+    FTPRegistrado.leidos = []
+    manifest.registrar('medida_4_20240301.json', 'recibida')
+    estado = manifest.leer_estado()
+    assert estado['totales']['recibida'] == 4
+    assert not [r for r in FTPRegistrado.leidos if r.startswith('analizadas/')]
+
+    # La consulta exacta (la del batch) sólo baja el mes de la medida nueva
+    FTPRegistrado.leidos = []
+    assert manifest.pendientes() == [C, 'medida_4_20240301.json']
+    assert [r for r in FTPRegistrado.leidos if r.startswith('analizadas/')] == ['analizadas/202403.txt']
+
+
+def test_recibida_repetida_de_medida_compactada(manifest):
+    manifest.registrar_varios([_evento(A, 'recibida'), _evento(A, 'analizada')])
+    manifest.compactar()
+    manifest.registrar(A, 'recibida')
+    # La lectura rápida no sabe que ya se analizó; la exacta y la compactación sí
+    assert list(manifest.leer_estado()['pendientes']) == [A]
+    assert manifest.pendientes() == []
+    manifest.compactar()
+    estado = manifest.leer_estado()
+    assert estado['pendientes'] == {} and estado['totales'] == {'recibida': 1, 'analizada': 1, 'error': 0}
+
+
+def test_compactacion_cortada_antes_del_snapshot(manifest, monkeypatch):
+    manifest.registrar_varios([_evento(A, 'recibida'), _evento(B, 'recibida')])
+    manifest.compactar()
+    manifest.registrar_varios([_evento(C, 'recibida'), _evento(C, 'analizada'), _evento(A, 'analizada')])
+
+    def cortar(ftp, snapshot):
+        raise ConnectionError('conexión cerrada')
+    monkeypatch.setattr(manifest, '_escribir_snapshot', cortar)
+    with pytest.raises(ConnectionError):
+        manifest.compactar()
+    monkeypatch.undo()
+
+    # Las particiones ya tienen A y C, pero de una compactación sin snapshot: los journals se re-aplican
+    manifest.compactar()
+    estado = manifest.leer_estado()
+    assert estado['totales'] == {'recibida': 3, 'analizada': 2, 'error': 0}
+    assert manifest.pendientes() == [B]
+
+
+def test_snapshot_version_2_se_migra_a_particiones(manifest, tmp_path):
+    directorio = tmp_path / 'data' / 'manifest'
+    os.makedirs(directorio)
+    serializacion.guardar({'version': 2, 'totales': {'recibida': 2, 'analizada': 1, 'error': 0},
+                           'pendientes': {B: None}, 'analizadas': [A], 'compactado': '2024-01-01T00:00:00'},
+                          str(directorio / 'snapshot.json'))
+    manifest.registrar(A, 'recibida')
+    assert manifest.pendientes() == [B]
+    manifest.compactar()
+    assert 'analizadas' not in serializacion.cargar(str(directorio / 'snapshot.json'))
+    manifest.registrar(A, 'recibida')
+    assert manifest.pendientes() == [B]
+    assert manifest.leer_estado(exacto=True)['totales'] == {'recibida': 2, 'analizada': 1, 'error': 0}
+
+
+def test_reconstruir_aplica_eventos_que_el_listado_no_refleja(manifest):
+    manifest.registrar_varios([_evento(C, 'recibida'), _evento(A, 'recibida')])
+    snapshot = manifest.reconstruir([A, B], ['medida_1_20240102_analysis_agnostic.json'])
+    assert sorted(snapshot['pendientes']) == [B, C]
+    assert snapshot['totales'] == {'recibida': 3, 'analizada': 1, 'error': 0}
+    assert manifest.pendientes() == [B, C]
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from near_duplicates import NearDuplicateIndex, diff_textos, elementos_presentes
+
+
+def _designacion(nombre, dni):
+    return ("VISTO el Expediente N° EX-2024-00012345 y el Decreto N° 50 del 19 de diciembre de 2019 y sus "
+            "modificatorios, CONSIDERANDO: Que resulta necesario cubrir transitoriamente el cargo de Director "
+            "de Asuntos Jurídicos del MINISTERIO DE SALUD. Que la Dirección General de Recursos Humanos ha "
+            "tomado la intervención de su competencia. Que el SERVICIO JURÍDICO PERMANENTE ha tomado la intervención "
+            "que le compete. Que la presente medida se dicta en uso de las facultades conferidas por el artículo 2° "
+            "del Decreto N° 50 del 19 de diciembre de 2019. Por ello, EL MINISTRO DE SALUD RESUELVE: ARTÍCULO 1°.- "
+            f"Desígnase con carácter transitorio, a partir del dictado de la presente, a {nombre} (D.N.I. N° "
+            f"{dni}) en el cargo de Director de Asuntos Jurídicos. ARTÍCULO 2°.- El gasto que demande el cumplimiento "
+            "de la presente medida será atendido con cargo a las partidas presupuestarias específicas de la "
+            "Jurisdicción. ARTÍCULO 3°.- Comuníquese, publíquese, dése a la DIRECCIÓN NACIONAL DEL REGISTRO "
+            "OFICIAL y archívese.")
+
+
+ORIGEN = _designacion('Juan Carlos PÉREZ', '20.111.222')
+NUEVO = _designacion('María Laura GÓMEZ', '27.333.444')
+
+
+def test_casi_duplicado_se_encuentra_y_uno_distinto_no():
+    indice = NearDuplicateIndex()
+    indice.agregar('medida_1_20240102', indice.firma(ORIGEN))
+    indice.agregar('medida_2_20240102', indice.firma("Apruébase el Reglamento General de Contrataciones "
+                                                     "de la Administración Pública Nacional y sus anexos."))
+
+    clave, similitud = indice.buscar(indice.firma(NUEVO))
+    assert clave == 'medida_1_20240102' and similitud >= indice.umbral
+    assert indice.buscar(indice.firma(NUEVO), excluir='medida_1_20240102') is None
+    assert indice.buscar(indice.firma('')) is None
+
+
+def test_firma_ignora_mayusculas_y_acentos():
+    indice = NearDuplicateIndex()
+    assert (indice.firma(ORIGEN) == indice.firma(ORIGEN.upper().replace('É', 'E'))).all()
+
+
+def test_guardar_y_cargar_conserva_las_firmas(tmp_path):
+    indice = NearDuplicateIndex(num_perm=64, bandas=8)
+    indice.agregar('medida_1_20240102', indice.firma(ORIGEN))
+    indice.guardar(str(tmp_path / 'indice.npz'))
+
+    cargado = NearDuplicateIndex.cargar(str(tmp_path / 'indice.npz'))
+    assert (cargado.num_perm, cargado.bandas, len(cargado)) == (64, 8, 1)
+    assert cargado.buscar(cargado.firma(NUEVO))[0] == 'medida_1_20240102'
+
+
+def test_diff_textos_registra_el_cambio_de_designado():
+    cambios = diff_textos(ORIGEN, NUEVO)
+    assert cambios and all(c['operacion'] == 'replace' for c in cambios)
+    assert 'PÉREZ' in cambios[0]['antes'] and 'GÓMEZ' in cambios[0]['despues']
+
+
+def test_elementos_presentes_descarta_lo_que_no_esta_en_el_texto():
+    elementos = {
+        'entidades_mencionadas': ['Ministerio de Salud', 'Juan Carlos Pérez', {'nombre': 'Dirección General de Recursos Humanos'}],
+        'referencias_normativas': ['Decreto 50/2019', 'Ley 27.541'],
+        'autoridades_involucradas': ['Ministro de Salud'],
+        'confianza': 'alta',
+    }
+    filtrados, descartados = elementos_presentes(elementos, NUEVO)
+    assert filtrados['entidades_mencionadas'] == ['Ministerio de Salud', {'nombre': 'Dirección General de Recursos Humanos'}]
+    # El texto cita "Decreto N° 50 del 19 de diciembre de 2019": la misma norma, sin el año en la cita
+    assert filtrados['referencias_normativas'] == ['Decreto 50/2019']
+    assert filtrados['autoridades_involucradas'] == ['Ministro de Salud']
+    assert filtrados['confianza'] == 'alta'
+    assert descartados == 2
+
+    filtrados, _ = elementos_presentes({'referencias_normativas': ['Decreto N° 50/19']}, 'según el DECRETO 50/2019')
+    assert filtrados['referencias_normativas'] == ['Decreto N° 50/19']
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+os.environ.setdefault('BORA_API_CACHE_DIR', tempfile.mkdtemp(prefix='bora_api_test_'))
+
+import api
+from novedades import FeedNovedades
+
+
+def _analisis(numero, riesgo='bajo', **metadatos):
+    return {'numero_medida': numero, 'fecha_boletin': '2024-01-02', 'fecha_analisis': '2024-01-02T10:00:00',
+            'analisis_literal': {'titulo_raw': f'Resolución {numero}/2024'},
+            'analisis_semantico': {'categoria_emergente': 'designaciones'},
+            'analisis_abogado_diablo': {'nivel_riesgo_democratico': riesgo},
+            'metadatos_analisis': dict({'modo_analisis': 'completo'}, **metadatos)}
+
+
+def _feed(cantidad, capacidad=5):
+    feed = FeedNovedades(capacidad=capacidad)
+    for n in range(1, cantidad + 1):
+        feed.agregar(f'medida_{n}_20240102', _analisis(n))
+    return feed
+
+
+def test_resumen_compacto_del_analisis():
+    feed = FeedNovedades()
+    feed.agregar('medida_7_20240102', _analisis(7, 'alto', duplicado_de={'archivo_origen': 'medida_3_analysis_agnostic.json'}))
+    evento = feed.eventos[0]
+    assert evento['id'] == 1 and evento['clave'] == 'medida_7_20240102'
+    assert evento['titulo'] == 'Resolución 7/2024' and evento['nivel_riesgo_democratico'] == 'alto'
+    assert evento['reutilizado_de'] == 'medida_3_analysis_agnostic.json'
+    assert 'embeddings' not in evento
+
+
+def test_posteriores_retoma_desde_el_ultimo_visto():
+    feed = _feed(4)
+    eventos, perdidos = feed.posteriores(2)
+    assert [e['id'] for e in eventos] == [3, 4] and not perdidos
+    assert feed.posteriores(4) == ([], False)
+    assert [e['id'] for e in feed.posteriores(None, limite=2)[0]] == [3, 4]
+    assert [e['id'] for e in feed.posteriores(0, limite=2)[0]] == [1, 2]
+
+
+def test_cliente_atrasado_se_entera_de_que_perdio_eventos():
+    feed = _feed(8, capacidad=5)
+    assert [e['id'] for e in feed.eventos] == [4, 5, 6, 7, 8]
+    eventos, perdidos = feed.posteriores(1)
+    assert [e['id'] for e in eventos] == [4, 5, 6, 7, 8] and perdidos
+    # Justo antes del primero retenido no se perdió nada
+    assert feed.posteriores(3)[1] is False
+
+
+def test_id_de_un_feed_anterior():
+    eventos, perdidos = _feed(2).posteriores(40)
+    assert [e['id'] for e in eventos] == [1, 2] and perdidos
+    assert FeedNovedades().posteriores(3) == ([], True)
+
+
+def test_guardar_y_cargar_conserva_los_ids(tmp_path):
+    feed = _feed(3)
+    feed.guardar(str(tmp_path / 'novedades.json'))
+    cargado = FeedNovedades.cargar(str(tmp_path / 'novedades.json'))
+    assert cargado.agregar('medida_9_20240102', _analisis(9)) == 4
+    assert [e['id'] for e in cargado.posteriores(2)[0]] == [3, 4]
+
+
+def test_api_novedades(monkeypatch):
+    feed = _feed(8, capacidad=5)
+    monkeypatch.setattr(api, '_feed_novedades', lambda: feed)
+    cliente = api.app.test_client()
+
+    datos = cliente.get('/api/novedades?ultimo_id=6').get_json()
+    assert datos['ultimo_id'] == 8 and not datos['perdidos']
+    assert [e['id'] for e in datos['eventos']] == [7, 8]
+    assert cliente.get('/api/novedades?ultimo_id=1').get_json()['perdidos'] is True
+    assert cliente.get('/api/novedades?ultimo_id=x').status_code == 400
+
+
+@pytest.fixture
+def sse_corto(monkeypatch):
+    monkeypatch.setattr(api, 'SSE_DURACION', 0.01)
+    monkeypatch.setattr(api, 'SSE_SONDEO', 0.05)
+
+
+def test_stream_reenvia_lo_que_falto_desde_last_event_id(monkeypatch, sse_corto):
+    monkeypatch.setattr(api, '_feed_novedades', lambda: _feed(8, capacidad=5))
+    cuerpo = api.app.test_client().get('/api/novedades/stream', headers={'Last-Event-ID': '2'}).get_data(as_text=True)
+    assert cuerpo.index('event: resincronizar') < cuerpo.index('id: 4\nevent: medida')
+    assert [linea for linea in cuerpo.splitlines() if linea.startswith('id: ')] == [f'id: {n}' for n in range(4, 9)]
+
+
+def test_stream_conexion_nueva_arranca_desde_el_presente(monkeypatch, sse_corto):
+    monkeypatch.setattr(api, '_feed_novedades', lambda: _feed(3))
+    cuerpo = api.app.test_client().get('/api/novedades/stream').get_data(as_text=True)
+    assert 'id: 3\nevent: conectado' in cuerpo and 'event: medida' not in cuerpo
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from respuestas_json import ESQUEMAS, ParserRespuestas, RespuestaJSONInvalida
+
+PATRON = {'etiqueta': 'Designaciones transitorias', 'descripcion': 'Cargos cubiertos sin concurso.'}
+DIABLO = {clave: [] for clave in ESQUEMAS['abogado_diablo']['properties']}
+DIABLO['nivel_riesgo_democratico'] = 'medio'
+
+
+class Gemini:
+    """generar(prompt) que devuelve las respuestas en orden y guarda los prompts recibidos"""
+
+    def __init__(self, *respuestas):
+        self.respuestas = list(respuestas)
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return self.respuestas.pop(0)
+
+
+@pytest.fixture
+def parser():
+    return ParserRespuestas(repreguntas=1, esquema_nativo=True)
+
+
+def test_config_pide_el_esquema_de_la_etapa(parser):
+    assert parser.config('patrones') == {'response_mime_type': 'application/json', 'response_schema': ESQUEMAS['patrones']}
+    assert 'response_schema' not in ParserRespuestas(esquema_nativo=False).config('patrones')
+
+
+@pytest.mark.parametrize('texto', [
+    '```json\n{"etiqueta": "Designaciones transitorias", "descripcion": "Cargos cubiertos sin concurso."}\n```',
+    'Aquí está el análisis: {"etiqueta": "Designaciones transitorias", "descripcion": "Cargos cubiertos sin concurso.",}',
+    '{"etiqueta": "Designaciones transitorias", "descripcion": "Cargos cubiertos sin concurso.',
+])
+def test_reparaciones_locales(parser, texto):
+    gemini = Gemini(texto)
+    assert parser.obtener(gemini, 'prompt', 'patrones') == PATRON
+    assert len(gemini.prompts) == 1
+    assert parser.estadisticas()['patrones']['reparada'] == 1
+
+
+def test_salida_cortada_descarta_el_par_a_medias(parser):
+    texto = json.dumps(DIABLO)[:-1].replace('"red_flags_principales": []', '"red_flags_principales": ["concentra')
+    datos, problemas, reparada = parser.interpretar(texto, 'abogado_diablo')
+    assert reparada and not problemas
+    assert datos['red_flags_principales'] == ['concentra'] and datos['nivel_riesgo_democratico'] == 'medio'
+
+
+def test_tipos_y_opciones_con_otra_forma_se_normalizan(parser):
+    respuesta = dict(DIABLO, nivel_riesgo_democratico='Crítico', usos_no_declarados='uno solo', red_flags_principales=None)
+    datos = parser.obtener(Gemini(json.dumps(respuesta)), 'prompt', 'abogado_diablo')
+    assert datos['nivel_riesgo_democratico'] == 'critico'
+    assert datos['usos_no_declarados'] == ['uno solo'] and datos['red_flags_principales'] == []
+
+
+def test_repregunta_con_los_problemas_y_la_respuesta_anterior(parser):
+    mala = json.dumps(dict(DIABLO, nivel_riesgo_democratico='gravísimo'))
+    gemini = Gemini(mala, json.dumps(DIABLO))
+    assert parser.obtener(gemini, 'PROMPT ORIGINAL', 'abogado_diablo') == DIABLO
+    correccion = gemini.prompts[1]
+    assert correccion.startswith('PROMPT ORIGINAL') and 'gravísimo' in correccion
+    assert "valores permitidos: bajo, medio, alto, critico" in correccion
+    assert parser.estadisticas()['abogado_diablo']['repreguntada'] == 1
+
+
+def test_repregunta_peor_conserva_la_primera_y_completa_lo_que_falta(parser):
+    incompleta = {k: v for k, v in DIABLO.items() if k != 'beneficiarios_ocultos'}
+    gemini = Gemini(json.dumps(incompleta), 'no puedo responder eso')
+    datos = parser.obtener(gemini, 'prompt', 'abogado_diablo')
+    assert datos == DIABLO and len(gemini.prompts) == 2
+    stats = parser.estadisticas()['abogado_diablo']
+    assert stats['incompleta'] == 1 and stats['tasa_fallo_parseo'] == 1.0 and stats['tasa_fallida'] == 0.0
+
+
+def test_sin_json_tras_la_repregunta(parser):
+    with pytest.raises(RespuestaJSONInvalida):
+        parser.obtener(Gemini('Lo siento, no puedo.', 'Tampoco ahora.'), 'prompt', 'patrones')
+    assert parser.estadisticas()['patrones']['fallida'] == 1
+
+
+def test_sin_repreguntas_no_se_vuelve_a_llamar():
+    parser = ParserRespuestas(repreguntas=0)
+    gemini = Gemini(json.dumps({'etiqueta': 'x'}))
+    assert parser.obtener(gemini, 'prompt', 'patrones') == {'etiqueta': 'x', 'descripcion': ''}
+    assert len(gemini.prompts) == 1
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import serializacion
+from compresion import comprimir
+
+BACKENDS = ['stdlib'] + (['orjson'] if serializacion.orjson is not None else [])
+ANALISIS = {
+    'numero_medida': 300720,
+    'titulo_raw': 'Resolución 1234/2024 - MINISTERIO DE ECONOMÍA',
+    'embeddings': {'embedding_completo': np.linspace(-1, 1, 8, dtype=np.float32)},
+    'etiquetas': {'designación', 'prórroga'},
+    'nivel': np.int64(2),
+    'vacio': None,
+}
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    monkeypatch.setenv('BORA_JSON_BACKEND', request.param)
+    monkeypatch.delenv('BORA_JSON_PRETTY', raising=False)
+    return request.param
+
+
+def test_tipos_de_numpy_y_conjuntos(backend):
+    assert serializacion.backend() == backend
+    datos = serializacion.loads(serializacion.dumps(ANALISIS))
+    assert datos['embeddings']['embedding_completo'] == pytest.approx(np.linspace(-1, 1, 8).tolist(), abs=1e-6)
+    assert datos['etiquetas'] == ['designación', 'prórroga']
+    assert datos['nivel'] == 2 and datos['vacio'] is None
+
+
+def test_salida_compacta_y_sin_escapar_acentos(backend):
+    datos = serializacion.dumps({'titulo': 'Economía', 'lista': [1, 2]})
+    assert datos == '{"titulo":"Economía","lista":[1,2]}'.encode('utf-8')
+
+
+def test_pretty_por_variable_de_entorno(backend, monkeypatch):
+    monkeypatch.setenv('BORA_JSON_PRETTY', '1')
+    assert b'\n  "a": 1' in serializacion.dumps({'a': 1})
+    assert serializacion.dumps({'a': 1}, pretty=False) == b'{"a":1}'
+
+
+def test_claves_no_string(backend):
+    assert serializacion.loads(serializacion.dumps({1: 'uno'})) == {'1': 'uno'}
+
+
+def test_tipo_desconocido(backend):
+    with pytest.raises(TypeError):
+        serializacion.dumps({'objeto': object()})
+
+
+def test_los_backends_son_intercambiables(monkeypatch):
+    escritos = {}
+    for nombre in BACKENDS:
+        monkeypatch.setenv('BORA_JSON_BACKEND', nombre)
+        escritos[nombre] = serializacion.dumps(ANALISIS)
+    referencia = json.loads(escritos['stdlib'])
+    for datos in escritos.values():
+        leido = json.loads(datos)
+        # orjson escribe los float32 con la precisión de float32, el json estándar como float64
+        assert leido.pop('embeddings')['embedding_completo'] == pytest.approx(
+            referencia['embeddings']['embedding_completo'], abs=1e-6)
+        assert leido == {k: v for k, v in referencia.items() if k != 'embeddings'}
+
+
+@pytest.mark.parametrize('formato', ['none', 'gzip'])
+def test_cargar_archivos_comprimidos_y_viejos_indentados(backend, tmp_path, formato):
+    comprimido = tmp_path / 'nuevo.json'
+    comprimido.write_bytes(comprimir(serializacion.dumps(ANALISIS), formato))
+    viejo = tmp_path / 'viejo.json'
+    viejo.write_text(json.dumps({'titulo_raw': ANALISIS['titulo_raw']}, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    assert serializacion.cargar(str(comprimido))['titulo_raw'] == ANALISIS['titulo_raw']
+    assert serializacion.cargar(str(viejo)) == {'titulo_raw': ANALISIS['titulo_raw']}
+    assert serializacion.loads(viejo.read_text(encoding='utf-8')) == {'titulo_raw': ANALISIS['titulo_raw']}
+
+
+def test_guardar_devuelve_los_bytes_escritos(backend, tmp_path):
+    path = tmp_path / 'analisis.json'
+    tamanio = serializacion.guardar(ANALISIS, str(path))
+    assert tamanio == path.stat().st_size
+    assert serializacion.cargar(str(path))['numero_medida'] == 300720
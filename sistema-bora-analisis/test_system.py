@@ -13,7 +13,7 @@ def test_complete_system():
     # Test 1: Scraping básico
     print("\n1. Testing scraping...")
     try:
-        from scraper import BoraScraperCore
+        from scraper_VIEJO_suspendido import BoraScraperCore
         scraper = BoraScraperCore()
         
         # Test con 2 medidas del primer día
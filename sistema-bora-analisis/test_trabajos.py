@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import serializacion
+from trabajos import ColaTrabajos
+
+
+def _sumar(parametros, avance):
+    avance(0.5, 'sumando')
+    return {'total': sum(parametros['valores'])}
+
+
+def _fallar(parametros, avance):
+    raise RuntimeError('FTP caído')
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / 'trabajos.sqlite')
+
+
+def _cola(db, **kwargs):
+    cola = ColaTrabajos(db, workers=1, **kwargs)
+    cola.registrar('sumar', _sumar)
+    cola.registrar('fallar', _fallar)
+    return cola
+
+
+def _ejecutar_siguiente(cola):
+    trabajo = cola._tomar()
+    if trabajo:
+        cola._ejecutar(trabajo['id'], trabajo['tipo'], serializacion.loads(trabajo['parametros']))
+    return trabajo
+
+
+def test_trabajo_completado_con_resultado(db):
+    cola = _cola(db)
+    id_trabajo = cola.encolar('sumar', {'valores': [1, 2, 3]})
+    assert cola.estado(id_trabajo)['estado'] == 'pendiente'
+
+    _ejecutar_siguiente(cola)
+    estado = cola.estado(id_trabajo, con_resultado=True)
+    assert estado['estado'] == 'completado' and estado['resultado'] == {'total': 6}
+    assert estado['progreso'] == 1 and estado['mensaje'] == 'sumando' and estado['intentos'] == 1
+    assert 'resultado' not in cola.estado(id_trabajo)
+
+
+def test_error_del_manejador_queda_registrado(db):
+    cola = _cola(db)
+    id_trabajo = cola.encolar('fallar')
+    _ejecutar_siguiente(cola)
+    estado = cola.estado(id_trabajo)
+    assert estado['estado'] == 'error' and estado['error'] == 'FTP caído'
+    assert [t['id'] for t in cola.listar('error')] == [id_trabajo]
+
+
+def test_tipo_desconocido(db):
+    with pytest.raises(ValueError):
+        _cola(db).encolar('reindexar')
+
+
+def test_dos_procesos_no_toman_el_mismo_trabajo(db):
+    una, otra = _cola(db), _cola(db)
+    primero = una.encolar('sumar', {'valores': [1]})
+    segundo = una.encolar('sumar', {'valores': [2]})
+    assert una._tomar()['id'] == primero
+    assert otra._tomar()['id'] == segundo
+    assert una._tomar() is None and otra._tomar() is None
+
+
+def test_trabajo_abandonado_vuelve_a_la_cola_hasta_agotar_intentos(db):
+    cola = _cola(db, abandono=60)
+    id_trabajo = cola.encolar('sumar', {'valores': [1]})
+    for intento in range(1, ColaTrabajos.MAX_INTENTOS + 1):
+        assert cola._tomar()['id'] == id_trabajo
+        assert cola._tomar() is None  # con latido reciente no se considera abandonado
+        # El proceso muere: el latido queda viejo
+        cola._conexion().execute('UPDATE trabajos SET latido = ? WHERE id = ?', (time.time() - 120, id_trabajo))
+        assert cola.estado(id_trabajo)['intentos'] == intento
+
+    assert cola._tomar() is None
+    estado = cola.estado(id_trabajo)
+    assert estado['estado'] == 'error' and estado['error'] == 'Se agotaron los intentos'
+
+
+def test_limpiar_borra_solo_los_terminados_viejos(db):
+    cola = _cola(db)
+    viejo = cola.encolar('sumar', {'valores': [1]})
+    _ejecutar_siguiente(cola)
+    pendiente = cola.encolar('sumar', {'valores': [2]})
+    cola._conexion().execute('UPDATE trabajos SET terminado = ?, creado = ? WHERE id = ?',
+                             (time.time() - 8 * 86400, time.time() - 8 * 86400, viejo))
+    assert cola.limpiar() == 1
+    assert cola.estado(viejo) is None and cola.estado(pendiente)['estado'] == 'pendiente'
+
+
+def test_workers_en_hilos(db):
+    cola = _cola(db).iniciar()
+    try:
+        ids = [cola.encolar('sumar', {'valores': [n, n]}) for n in range(5)]
+        limite = time.monotonic() + 10
+        while time.monotonic() < limite and any(cola.estado(i)['estado'] != 'completado' for i in ids):
+            time.sleep(0.02)
+        assert [cola.estado(i, con_resultado=True)['resultado'] for i in ids] == [{'total': 2 * n} for n in range(5)]
+    finally:
+        cola.cerrar()
+    assert cola.hilos == []
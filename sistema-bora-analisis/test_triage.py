@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Agregar src al path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import triage
+from triage import TriageModel
+
+STATS = {'longitud_total_caracteres': 3000, 'longitud_total_palabras': 500, 'secciones_detectadas': 3,
+         'tiene_considerandos': True, 'longitud_considerandos': 1500, 'longitud_dispositivo': 800,
+         'ratio_justificacion_accion': 1.8}
+
+
+def _embeddings(direccion, ruido, rng):
+    vector = np.zeros(16, dtype=np.float32)
+    vector[direccion] = 1.0
+    return {'embedding_completo': (vector + rng.normal(0, ruido, 16)).tolist()}
+
+
+def _analisis(nivel):
+    return {'analisis_abogado_diablo': {'nivel_riesgo_democratico': nivel}}
+
+
+@pytest.fixture
+def modelo():
+    """Historial con dos grupos separados: designaciones (bajo) y emergencias (alto/crítico)"""
+    rng = np.random.RandomState(7)
+    modelo = TriageModel(k=5, min_ejemplos=20, umbral_riesgo=0.1, exploracion=0.0)
+    for i in range(15):
+        modelo.registrar(_embeddings(0, 0.05, rng), STATS, _analisis('bajo'))
+        modelo.registrar(_embeddings(1, 0.05, rng), STATS, _analisis('alto' if i % 2 else 'critico'))
+    return modelo
+
+
+def test_sin_historial_suficiente_todo_va_al_completo():
+    modelo = TriageModel(min_ejemplos=3)
+    modelo.registrar({'embedding_completo': [1.0, 0.0]}, STATS, _analisis('bajo'))
+    assert modelo.decidir({'embedding_completo': [1.0, 0.0]}, STATS) == {
+        'modo': 'completo', 'razon': 'historial_insuficiente', 'ejemplos': 1}
+
+
+def test_vecinos_de_riesgo_bajo_dan_el_analisis_reducido(modelo):
+    rng = np.random.RandomState(1)
+    decision = modelo.decidir(_embeddings(0, 0.05, rng), STATS)
+    assert decision['modo'] == 'reducido' and decision['nivel_riesgo_estimado'] == 'bajo'
+    assert decision['prob_riesgo_alto_o_critico'] < 0.1 and decision['k'] == 5
+
+
+def test_vecinos_de_riesgo_alto_van_al_completo(modelo):
+    rng = np.random.RandomState(1)
+    decision = modelo.decidir(_embeddings(1, 0.05, rng), STATS)
+    assert decision['modo'] == 'completo' and decision['razon'] == 'riesgo_estimado'
+    assert decision['nivel_riesgo_estimado'] in ('alto', 'critico')
+    assert decision['prob_riesgo_alto_o_critico'] > 0.9
+
+
+def test_exploracion_manda_reducibles_al_completo(modelo, monkeypatch):
+    modelo.exploracion = 0.05
+    monkeypatch.setattr(triage.random, 'random', lambda: 0.01)
+    decision = modelo.decidir(_embeddings(0, 0.05, np.random.RandomState(1)), STATS)
+    assert decision['modo'] == 'completo' and decision['razon'] == 'exploracion'
+
+
+def test_sin_embedding_o_sin_nivel_no_se_registra_ni_reduce(modelo):
+    ejemplos = len(modelo.etiquetas)
+    modelo.registrar({}, STATS, _analisis('bajo'))
+    modelo.registrar({'embedding_completo': [1.0] * 16}, STATS, {'analisis_abogado_diablo': {'omitido_por_triage': True}})
+    assert len(modelo.etiquetas) == ejemplos
+    assert modelo.decidir({'error': 'sin encoder'}, STATS) == {'modo': 'completo', 'razon': 'sin_embedding'}
+
+
+def test_guardar_y_cargar_conserva_las_decisiones(modelo, tmp_path):
+    modelo.guardar(str(tmp_path / 'triage.npz'))
+    cargado = TriageModel.cargar(str(tmp_path / 'triage.npz'))
+    cargado.k, cargado.min_ejemplos, cargado.exploracion = 5, 20, 0.0
+    assert cargado.etiquetas == modelo.etiquetas
+    rng = np.random.RandomState(1)
+    consulta = _embeddings(0, 0.05, rng)
+    assert cargado.decidir(consulta, STATS)['modo'] == modelo.decidir(consulta, STATS)['modo'] == 'reducido'